@@ -0,0 +1,170 @@
+"""
+Load test of the sync (WSGI) and async (ASGI) statistics endpoints.
+
+Sends the same number of requests to /statistics/ through the WSGI handler
+from a pool of threads (one thread per WSGI worker) and to /async/statistics/
+through the ASGI handler from concurrent coroutines on a single event loop,
+for several levels of concurrency, and reports throughput and latency percentiles.
+
+The database is a temporary SQLite file shared by all threads and the cache is disabled,
+so that every request computes the statistics.
+
+Usage:
+    python benchmarks/async_load.py
+    python benchmarks/async_load.py --concurrency 1 16 64 --requests 500 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+DATABASE_DIRECTORY = tempfile.TemporaryDirectory()
+
+import django
+from django.conf import settings
+from finance import settings as project_settings
+
+settings.configure(**{
+    **{name: getattr(project_settings, name) for name in dir(project_settings) if name.isupper()},
+    'SECRET_KEY': 'benchmark',
+    'ALLOWED_HOSTS': ['testserver'],
+    'DATABASES': {'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(DATABASE_DIRECTORY.name, 'db.sqlite3'),
+        'CONN_MAX_AGE': project_settings.DATABASES['default']['CONN_MAX_AGE'],
+    }},
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+})
+django.setup()
+
+from dateutil.relativedelta import relativedelta
+from django.core.management import call_command
+from django.test import AsyncClient, Client
+from finance_api.models import Contract, Frequency, RecurringSaving, Saving, User
+
+CONCURRENCY = [1, 8, 32]
+REQUESTS = 200
+ITEMS = 300
+SEED = 20221018
+
+
+def seed_user():
+    randomizer = random.Random(SEED)
+    user = User.objects.create(username="load_test")
+    frequencies = [choice for choice, _ in Frequency.choices]
+
+    def random_day(min_years, max_years):
+        return date.today() + relativedelta(days=randomizer.randint(min_years * 365, max_years * 365))
+
+    Contract.objects.bulk_create([
+        Contract(
+            name=f"contract_{number}",
+            user=user,
+            amount=randomizer.randint(1, 100000) / 100,
+            first_billing_day=random_day(-10, 0),
+            billing_frequency=randomizer.choice(frequencies)
+        ) for number in range(ITEMS // 2)
+    ])
+    Saving.objects.bulk_create([
+        Saving(name=f"saving_{number}", user=user, amount=randomizer.randint(1, 100000) / 100)
+        for number in range(ITEMS // 4)
+    ])
+    RecurringSaving.objects.bulk_create([
+        RecurringSaving(
+            name=f"recurring_saving_{number}",
+            user=user,
+            amount=randomizer.randint(1, 100000) / 100,
+            start_date=random_day(-10, 0),
+            frequency=randomizer.choice(frequencies)
+        ) for number in range(ITEMS // 4)
+    ])
+    return user
+
+
+def summary(latencies, seconds):
+    latencies = sorted(latencies)
+    return {
+        "requests_per_second": len(latencies) / seconds,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+def run_wsgi(user, concurrency, requests):
+    clients = []
+    for _ in range(concurrency):
+        client = Client()
+        client.force_login(user)
+        clients.append(client)
+
+    def worker(client, count):
+        latencies = []
+        for _ in range(count):
+            start = time.perf_counter()
+            response = client.post("/statistics/", {"balance": 10000}, content_type="application/json")
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 202, response.status_code
+        return latencies
+
+    counts = [requests // concurrency + (worker_number < requests % concurrency) for worker_number in range(concurrency)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, clients, counts))
+    return summary([latency for latencies in results for latency in latencies], time.perf_counter() - start)
+
+
+async def run_asgi(client, concurrency, requests):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def request():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/async/statistics/", {"balance": 10000}, content_type="application/json")
+            assert response.status_code == 202, response.status_code
+            return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*[request() for _ in range(requests)])
+    return summary(latencies, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the sync and async statistics endpoints.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=CONCURRENCY, help="numbers of concurrent requests")
+    parser.add_argument("--requests", type=int, default=REQUESTS, help="number of requests per level of concurrency")
+    parser.add_argument("--output", help="JSON file for the results")
+    arguments = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    user = seed_user()
+    async_client = AsyncClient()
+    async_client.force_login(user)
+
+    results = {"items": ITEMS, "requests": arguments.requests, "wsgi": {}, "asgi": {}}
+    print(f"{'concurrency':>11} {'path':>5} {'requests/s':>11} {'p50 (ms)':>9} {'p95 (ms)':>9} {'max (ms)':>9}")
+    for concurrency in arguments.concurrency:
+        results["wsgi"][concurrency] = run_wsgi(user, concurrency, arguments.requests)
+        results["asgi"][concurrency] = asyncio.run(run_asgi(async_client, concurrency, arguments.requests))
+        for path in ["wsgi", "asgi"]:
+            result = results[path][concurrency]
+            print(
+                f"{concurrency:>11} {path:>5} {result['requests_per_second']:>11.1f} "
+                f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['max_ms']:>9.1f}"
+            )
+
+    if arguments.output:
+        with open(arguments.output, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark of the cash-flow prognose.
+
+Measures prognose.compute_prognose for a 10 year horizon (120 months)
+and 500 randomly generated contracts, savings and recurring savings.
+The target is less than 50 ms per prognose.
+
+Usage:
+    python benchmarks/prognose.py
+"""
+import os
+import random
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# the amounts of the prognose are converted with settings.CURRENCY_DECIMAL_PLACES (see finance_api/money.py)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finance.settings')
+
+from finance_api.prognose import compute_prognose
+
+REFERENCE_DATE = date(2022, 10, 18)
+MONTHS = 120
+ITEMS = 500
+CALLS = 20
+
+
+def random_items(randomizer):
+    first_possible_day = date(2000, 1, 1).toordinal()
+    last_possible_day = date(2030, 12, 31).toordinal()
+
+    def random_day():
+        return date.fromordinal(randomizer.randint(first_possible_day, last_possible_day))
+
+    contracts, savings, recurring_savings = [], [], []
+    for _ in range(ITEMS):
+        kind = randomizer.random()
+        frequency = randomizer.choice([1, 3, 12])
+        # amounts in cents (see finance_api/money.py)
+        amount = randomizer.randint(1, 100000)
+        if kind < 0.6:
+            contracts.append((amount, random_day(), randomizer.choice([None, random_day()]), frequency))
+        elif kind < 0.8:
+            savings.append((amount, randomizer.choice([None, random_day()])))
+        else:
+            recurring_savings.append(
+                (amount, random_day(), randomizer.choice([None, random_day()]), randomizer.choice([None, random_day()]), frequency)
+            )
+    return contracts, savings, recurring_savings
+
+
+def main():
+    contracts, savings, recurring_savings = random_items(random.Random(20221018))
+    for first_day_of_the_month in [1, 15, 31]:
+        seconds = min(timeit.repeat(
+            lambda: compute_prognose(first_day_of_the_month, contracts, savings, recurring_savings, 1000000, REFERENCE_DATE, MONTHS),
+            number=CALLS,
+            repeat=5
+        )) / CALLS
+        print(f"first_day_of_the_month={first_day_of_the_month:>2}: {seconds * 1000:.2f} ms per prognose ({ITEMS} items, {MONTHS} months)")
+
+
+if __name__ == '__main__':
+    main()
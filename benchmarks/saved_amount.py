@@ -0,0 +1,66 @@
+"""
+Micro-benchmark of RecurringSaving.saved_amount.
+
+Measures the time of a single call for monthly recurring savings
+that started between 1 and 100 years before the reference date.
+The call time should stay the same no matter how old the saving is.
+
+For comparison the benchmark also measures the previous implementation,
+which added the amount once for every saving period.
+
+Usage:
+    python benchmarks/saved_amount.py
+"""
+import os
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'finance.settings')
+
+import django
+
+django.setup()
+
+from dateutil.relativedelta import relativedelta
+from finance_api.models import Frequency, RecurringSaving
+
+REFERENCE_DATE = date(2022, 10, 18)
+AGES_IN_YEARS = [1, 10, 25, 50, 100]
+CALLS = 200
+
+
+def saved_amount_step_by_step(saving, reference_date):
+    save_day = saving.start_date
+    end_day = saving.end_date if saving.end_date is not None and saving.end_date < reference_date else reference_date
+    total_saved = 0
+    while save_day <= end_day:
+        total_saved += saving.amount_cents
+        save_day = save_day + relativedelta(months=+saving.frequency)
+    return total_saved
+
+
+def time_per_call(function):
+    return min(timeit.repeat(function, number=CALLS, repeat=5)) / CALLS
+
+
+def main():
+    print(f"{'age (years)':>12} {'saved_amount (us)':>18} {'step by step (us)':>18}")
+    for age in AGES_IN_YEARS:
+        saving = RecurringSaving(
+            name=f"saving_{age}",
+            amount=100,
+            start_date=REFERENCE_DATE - relativedelta(years=age),
+            frequency=Frequency.MONTHLY
+        )
+        # both in cents (see finance_api/money.py)
+        assert saving.saved_cents(REFERENCE_DATE) == saved_amount_step_by_step(saving, REFERENCE_DATE)
+
+        closed_form = time_per_call(lambda: saving.saved_amount(REFERENCE_DATE))
+        step_by_step = time_per_call(lambda: saved_amount_step_by_step(saving, REFERENCE_DATE))
+        print(f"{age:>12} {closed_form * 1e6:>18.2f} {step_by_step * 1e6:>18.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark of the serialization of the lists of the costs.
+
+Seeds 1000 contracts, savings and recurring savings in an in-memory SQLite database
+and measures the time per row of:
+    - the serializer: model instances and to_representation of every field,
+    - the read-optimized path (see finance_api/rendering.py): values and compiled encoders,
+both including the query and the JSON rendering of the result.
+
+Usage:
+    python benchmarks/serialization.py
+"""
+import os
+import random
+import sys
+import timeit
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django
+from django.conf import settings
+from finance import settings as project_settings
+
+settings.configure(**{
+    **{name: getattr(project_settings, name) for name in dir(project_settings) if name.isupper()},
+    'SECRET_KEY': 'benchmark',
+    'DATABASES': {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+})
+django.setup()
+
+from dateutil.relativedelta import relativedelta
+from django.core.management import call_command
+from rest_framework.renderers import JSONRenderer
+from finance_api.models import Contract, Frequency, RecurringSaving, Saving, User
+from finance_api.rendering import compile_encoders, encode_rows
+from finance_api.serializers import ContractSerializer, RecurringSavingSerializer, SavingSerializer
+
+ROWS = 1000
+REPEAT = 5
+CALLS = 10
+
+
+def seed_user(randomizer):
+    user = User.objects.create(username="benchmark")
+    frequencies = [choice for choice, _ in Frequency.choices]
+
+    def random_day():
+        return date(2000, 1, 1) + relativedelta(days=randomizer.randint(0, 10000))
+
+    def maybe(day):
+        return day if randomizer.random() < 0.5 else None
+
+    Contract.objects.bulk_create([
+        Contract(
+            user=user, name=f"contract_{number}", description="contract", amount_cents=randomizer.randint(1, 100000),
+            first_billing_day=random_day(), end_date=maybe(random_day()), billing_frequency=randomizer.choice(frequencies)
+        )
+        for number in range(ROWS)
+    ])
+    Saving.objects.bulk_create([
+        Saving(
+            user=user, name=f"saving_{number}", description="saving", amount_cents=randomizer.randint(1, 100000),
+            pay_out_day=maybe(random_day())
+        )
+        for number in range(ROWS)
+    ])
+    RecurringSaving.objects.bulk_create([
+        RecurringSaving(
+            user=user, name=f"recurring_saving_{number}", description="recurring saving", amount_cents=randomizer.randint(1, 100000),
+            start_date=random_day(), end_date=maybe(random_day()), pay_out_day=maybe(random_day()),
+            frequency=randomizer.choice(frequencies)
+        )
+        for number in range(ROWS)
+    ])
+    return user
+
+
+def time_per_row(function):
+    return min(timeit.repeat(function, number=CALLS, repeat=REPEAT)) / CALLS / ROWS
+
+
+def main():
+    call_command('migrate', verbosity=0)
+    user = seed_user(random.Random(20221018))
+    renderer = JSONRenderer()
+
+    print(f"{'serializer':<28} {'serializer (us/row)':>20} {'encoders (us/row)':>18}")
+    for related_name, serializer_class in [
+        ('contract', ContractSerializer),
+        ('saving', SavingSerializer),
+        ('recurringsaving', RecurringSavingSerializer),
+    ]:
+        queryset = getattr(user, related_name).all()
+
+        def serializer():
+            return renderer.render(serializer_class(queryset, many=True).data)
+
+        def encoders():
+            row_encoders = compile_encoders(serializer_class)
+            rows = queryset.values(*[source for _, source, _ in row_encoders])
+            return renderer.render(encode_rows(rows, row_encoders))
+
+        assert serializer() == encoders()
+        print(f"{serializer_class.__name__:<28} {time_per_row(serializer) * 1e6:>20.2f} {time_per_row(encoders) * 1e6:>18.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+"""
+Benchmark suite of the statistics hot path.
+
+Seeds users with 10, 100, 1000 and 10000 contracts, savings and recurring savings
+(mixed ages, frequencies, end dates and pay outs) in an in-memory SQLite database and measures:
+    - User.create_statistics,
+    - vectorized.create_statistics (if NumPy is installed),
+    - the model methods used by the statistics, per call,
+    - the /statistics/ endpoint end-to-end with the test client,
+      with an empty cache and with cached commitments.
+
+Results are written as JSON, together with the git commit, so that the results
+of two commits can be compared with --compare.
+
+Usage:
+    python benchmarks/statistics_hot_path.py --output results.json
+    python benchmarks/statistics_hot_path.py --sizes 10 100 --compare results.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import django
+from django.conf import settings
+from finance import settings as project_settings
+
+settings.configure(**{
+    **{name: getattr(project_settings, name) for name in dir(project_settings) if name.isupper()},
+    'SECRET_KEY': 'benchmark',
+    'ALLOWED_HOSTS': ['testserver'],
+    'DATABASES': {'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+})
+django.setup()
+
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+from django.core.management import call_command
+from rest_framework.test import APIClient
+from finance_api import vectorized
+from finance_api.models import Contract, Frequency, RecurringSaving, Saving, User
+
+SIZES = [10, 100, 1000, 10000]
+# maximal number of model instances used to measure a single method
+METHOD_SAMPLE = 1000
+REPEAT = 5
+ROUND_SECONDS = 0.1
+SEED = 20221018
+
+
+def seed_user(size, reference_date, randomizer):
+    """
+    Creates a user with the given number of costs: 50% contracts, 25% savings and 25% recurring savings.
+    The costs start up to 30 years before the reference_date and some of them are already archived or paid out.
+    """
+    user = User.objects.create(username=f"benchmark_{size}", first_day_of_the_month=randomizer.choice([1, 15, 28]))
+    frequencies = [choice for choice, _ in Frequency.choices]
+
+    def random_day(min_years, max_years):
+        return reference_date + relativedelta(days=randomizer.randint(int(min_years * 365), int(max_years * 365)))
+
+    def maybe(day):
+        return day if randomizer.random() < 0.4 else None
+
+    contracts, savings, recurring_savings = [], [], []
+    for number in range(size):
+        amount = randomizer.randint(1, 100000) / 100
+        kind = number % 4
+        if kind < 2:
+            contracts.append(Contract(
+                name=f"contract_{number}",
+                user=user,
+                amount=amount,
+                first_billing_day=random_day(-30, 0),
+                end_date=maybe(random_day(-2, 5)),
+                billing_frequency=randomizer.choice(frequencies)
+            ))
+        elif kind == 2:
+            savings.append(Saving(
+                name=f"saving_{number}",
+                user=user,
+                amount=amount,
+                pay_out_day=maybe(random_day(-2, 5))
+            ))
+        else:
+            recurring_savings.append(RecurringSaving(
+                name=f"recurring_saving_{number}",
+                user=user,
+                amount=amount,
+                start_date=random_day(-30, 0),
+                end_date=maybe(random_day(-2, 5)),
+                pay_out_day=maybe(random_day(-2, 5)),
+                frequency=randomizer.choice(frequencies)
+            ))
+
+    Contract.objects.bulk_create(contracts, batch_size=1000)
+    Saving.objects.bulk_create(savings, batch_size=1000)
+    RecurringSaving.objects.bulk_create(recurring_savings, batch_size=1000)
+    return user
+
+
+def measure(function):
+    """
+    Returns statistics of the time of a single call in milliseconds.
+    The number of calls per round is chosen so that a round takes about ROUND_SECONDS.
+    """
+    timer = timeit.Timer(function)
+    number = max(1, int(ROUND_SECONDS / timer.timeit(number=1)))
+    rounds = [seconds / number * 1000 for seconds in timer.repeat(repeat=REPEAT, number=number)]
+    return {"min_ms": min(rounds), "median_ms": sorted(rounds)[len(rounds) // 2], "calls": number * REPEAT}
+
+
+def measure_per_item(method, items, reference_date):
+    """
+    Measures the method called for every item of the sample, returns the time of a single call.
+    """
+    items = items[:METHOD_SAMPLE]
+    if not items:
+        return None
+    result = measure(lambda: [method(item, reference_date) for item in items])
+    return {key: value / len(items) if key.endswith("_ms") else value for key, value in result.items()}
+
+
+def benchmark_size(size, reference_date):
+    user = seed_user(size, reference_date, random.Random(SEED + size))
+    contracts = list(user.contract.all())
+    recurring_savings = list(user.recurringsaving.all())
+    savings = list(user.saving.all())
+
+    client = APIClient()
+    client.force_authenticate(user=user)
+
+    def request_statistics(cached=True):
+        if not cached:
+            cache.clear()
+        response = client.post("/statistics/", {"balance": 10000}, format="json")
+        assert response.status_code == 202, response.status_code
+
+    results = {
+        "items": {"contracts": len(contracts), "savings": len(savings), "recurring_savings": len(recurring_savings)},
+        "create_statistics": measure(lambda: user.create_statistics(10000, reference_date).show()),
+        "methods": {
+            "Contract.compute_next_billing_day": measure_per_item(Contract.compute_next_billing_day, contracts, reference_date),
+            "Contract.compute_amount_to_store_regarding_first_day_of_month": measure_per_item(
+                Contract.compute_amount_to_store_regarding_first_day_of_month, contracts, reference_date
+            ),
+            "Contract.archived": measure_per_item(Contract.archived, contracts, reference_date),
+            "Saving.paid_out": measure_per_item(Saving.paid_out, savings, reference_date),
+            "RecurringSaving.paid_out": measure_per_item(RecurringSaving.paid_out, recurring_savings, reference_date),
+            "RecurringSaving.saved_amount": measure_per_item(RecurringSaving.saved_amount, recurring_savings, reference_date),
+        },
+        "endpoint": measure(lambda: request_statistics(cached=False)),
+        "endpoint_cached": measure(request_statistics),
+    }
+    if vectorized.available():
+        results["vectorized_create_statistics"] = measure(lambda: vectorized.create_statistics(user, 10000, reference_date))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def timings(results, prefix=""):
+    """
+    Flattens the results into a dictionary {name: min_ms}.
+    """
+    flat = {}
+    for name, value in results.items():
+        if isinstance(value, dict) and "min_ms" in value:
+            flat[prefix + name] = value["min_ms"]
+        elif isinstance(value, dict):
+            flat.update(timings(value, f"{prefix}{name}."))
+    return flat
+
+
+def compare(results, previous):
+    current_timings = timings(results["sizes"])
+    previous_timings = timings(previous["sizes"])
+    print(f"compared with {previous.get('commit')}")
+    width = max(len(name) for name in current_timings)
+    print(f"{'benchmark':<{width}} {'before (ms)':>12} {'after (ms)':>12} {'ratio':>7}")
+    for name, after in current_timings.items():
+        before = previous_timings.get(name)
+        if before is None:
+            continue
+        print(f"{name:<{width}} {before:>12.4f} {after:>12.4f} {after / before:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the statistics hot path.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="numbers of costs of the seeded users")
+    parser.add_argument("--output", help="JSON file for the results (default: standard output)")
+    parser.add_argument("--compare", help="JSON file with previous results to compare with")
+    arguments = parser.parse_args()
+
+    call_command("migrate", verbosity=0)
+    reference_date = date.today()
+
+    results = {
+        "commit": git_commit(),
+        "reference_date": reference_date.isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "database": "sqlite",
+        "vectorized_statistics_threshold": settings.VECTORIZED_STATISTICS_THRESHOLD,
+        "sizes": {},
+    }
+    for size in arguments.sizes:
+        print(f"benchmarking {size} items...", file=sys.stderr)
+        results["sizes"][str(size)] = benchmark_size(size, reference_date)
+
+    if arguments.output:
+        with open(arguments.output, "w") as output:
+            json.dump(results, output, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if arguments.compare:
+        with open(arguments.compare) as previous:
+            compare(results, json.load(previous))
+
+
+if __name__ == '__main__':
+    main()
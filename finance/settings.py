@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -47,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'finance_api.profiling.ProfilingMiddleware',
+    'finance_api.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -91,9 +94,50 @@ DATABASES = {
         "PASSWORD": "postgres",
         "HOST": "db",
         "PORT": 5432,
+        # connections are kept for the following requests of the thread
+        "CONN_MAX_AGE": int(os.environ.get('DATABASE_CONN_MAX_AGE', 60)),
     }
 }
 
+# Read replicas of the default database, enabled by setting the REPLICA_HOSTS environment variable
+# to comma separated hosts. Requests that only read are served by the replicas (see finance_api/routers.py).
+REPLICA_DATABASES = []
+for number, host in enumerate(host for host in os.environ.get('REPLICA_HOSTS', '').split(',') if host):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    REPLICA_DATABASES.append(f'replica_{number}')
+
+# Second database of the routing tests (ReplicaDatabaseTestCase in finance_api/tests.py), never used outside of them.
+# Unlike the replicas above it is a separate test database, not a mirror of the default one,
+# so the tests see which of the two databases served the reads.
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'NAME': 'test_replica'}}
+
+DATABASE_ROUTERS = ['finance_api.routers.PrimaryReplicaRouter']
+
+# Seconds after a write of a client during which its reads are served by the primary database
+REPLICA_STICKY_SECONDS = 5
+
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+# Local memory cache is used by default. Processes running at the same time can share the cached statistics
+# through a file based cache, enabled by setting the CACHE_LOCATION environment variable to a directory.
+
+if os.environ.get('CACHE_LOCATION'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('CACHE_LOCATION'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Statistics are cached per user and reference date, so they are not needed longer than a day
+STATISTICS_CACHE_TIMEOUT = 60 * 60 * 24
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -140,9 +184,70 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.SessionAuthentication',
+        'finance_api.authentication.SignedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'rest_framework.renderers.JSONRenderer',
+    ],
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema'
 }
+
+# Responses are rendered as JSON only, the browsable API is available only with DEBUG
+if DEBUG:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('rest_framework.renderers.BrowsableAPIRenderer')
+
+# Minimal number of contracts, savings and recurring savings of the user
+# from which statistics are computed with the vectorized engine (requires numpy)
+VECTORIZED_STATISTICS_THRESHOLD = 500
+
+# Default and maximal number of contracts, savings or recurring savings
+# per page of the paginated lists
+COST_LIST_PAGE_SIZE = 100
+COST_LIST_MAX_PAGE_SIZE = 1000
+
+# Async endpoints (see finance_api/async_views.py) run the queries in the thread shared by the sync code.
+# If set, the queries run concurrently in a pool of ASYNC_QUERY_WORKERS threads with their own persistent connections,
+# which is faster only for slow queries (see benchmarks/async_load.py)
+ASYNC_CONCURRENT_QUERIES = os.environ.get('ASYNC_CONCURRENT_QUERIES') == '1'
+ASYNC_QUERY_WORKERS = 4
+
+# Maximal number of contracts, savings or recurring savings in one bulk request
+COST_BULK_MAX_ROWS = 10000
+
+# Profiling of the requests (see finance_api/profiling.py), enabled with PROFILING=1
+PROFILING_ENABLED = os.environ.get('PROFILING') == '1'
+# requests slower than this number of milliseconds are profiled with cProfile (None - only requests with X-Profile: 1)
+PROFILING_SLOW_REQUEST_MS = float(os.environ['PROFILING_SLOW_REQUEST_MS']) if os.environ.get('PROFILING_SLOW_REQUEST_MS') else None
+PROFILING_DIRECTORY = os.environ.get('PROFILING_DIRECTORY', os.path.join(tempfile.gettempdir(), 'finance_profiles'))
+# the oldest profiles above this number are removed from PROFILING_DIRECTORY
+PROFILING_MAX_FILES = int(os.environ.get('PROFILING_MAX_FILES', 100))
+
+# Number of rows read from the database and sent at once by the exports
+COST_EXPORT_CHUNK_SIZE = 1000
+
+# Number of rows of the imported CSV files validated and created in one transaction
+COST_IMPORT_CHUNK_SIZE = 1000
+
+# Maximal number of days in the range of the events endpoint (see finance_api/events.py)
+EVENTS_MAX_RANGE_DAYS = 3660
+
+# Maximal number of days in the range of the statistics history (see finance_api/history.py)
+STATISTICS_HISTORY_MAX_RANGE_DAYS = 3660
+
+# Number of users whose statistics are computed and written at once by the command compute_statistics
+STATISTICS_BATCH_CHUNK_SIZE = 500
+
+# Lifetime of the bearer tokens in seconds (see finance_api/authentication.py)
+AUTH_TOKEN_MAX_AGE = 60 * 60 * 24 * 7
+
+# Number of users cached by every process for the token authentication and the time they are cached in seconds.
+# Other processes than the one that saved the user or revoked the token accept the tokens
+# of a deactivated or deleted user and the revoked tokens until the timeout (see finance_api/authentication.py).
+AUTH_USER_CACHE_SIZE = 1024
+AUTH_USER_CACHE_TIMEOUT = 15
+
+# Amounts are stored in cents and presented with this number of decimal places (see finance_api/money.py)
+CURRENCY_DECIMAL_PLACES = 2
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class FinanceApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finance_api'
+
+    def ready(self):
+        # register signal handlers
+        from . import signals
@@ -0,0 +1,233 @@
+"""
+Async variants of the read-heavy endpoints, served by the ASGI application (finance/asgi.py):
+    /async/statistics/          see views.StatisticsView
+    /async/contracts/           see views.ContractsList.get
+    /async/savings/             see views.SavingsList.get
+    /async/recurring-savings/   see views.RecurringSavingsList.get
+    /async/profile/             see views.ProfileView
+
+Django 4.0 has no async ORM yet, so the queries are run in a worker thread with sync_to_async.
+By default they run in the thread shared by the sync code, whose database connection is reused
+by the following requests (CONN_MAX_AGE), and all queries of a step are run in a single call.
+If settings.ASYNC_CONCURRENT_QUERIES is set, the queries run in a pool of settings.ASYNC_QUERY_WORKERS threads,
+each of them keeping its own connection, and the three cost tables of the statistics are fetched concurrently.
+That pays off only if the queries are slow compared to the hops between the threads
+(e.g. large users on a remote database), measure it with benchmarks/async_load.py.
+
+Users are authenticated with the authentication classes of REST Framework,
+so the endpoints accept the same credentials and return the same errors as the sync endpoints.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from functools import partial, wraps
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from . import serializers
+from . import vectorized
+from .conditional import aconditional_response, conditional_response
+from .models import Contract, RecurringSaving, Saving
+from .routers import replica_methods
+from .statistics_cache import acached_commitments, astatistics_version
+from .utils import apply_balance
+from .views import ContractsList, RecurringSavingsList, SavingsList
+
+
+_query_executor = None
+
+
+def _query_thread_pool():
+    global _query_executor
+    if _query_executor is None:
+        _query_executor = ThreadPoolExecutor(max_workers=settings.ASYNC_QUERY_WORKERS, thread_name_prefix='async-queries')
+    return _query_executor
+
+
+def _run_in_query_thread(function, *args, **kwargs):
+    # the threads of the pool are not part of the request cycle, which closes the obsolete connections,
+    # the other connections are kept for the following queries of the thread
+    close_old_connections()
+    return function(*args, **kwargs)
+
+
+def database_sync_to_async(function):
+    """
+    Turns the function using the database into a coroutine function (see the module documentation).
+    """
+    if not settings.ASYNC_CONCURRENT_QUERIES:
+        return sync_to_async(function)
+
+    async def run(*args, **kwargs):
+        # the context is copied, so that the function sees e.g. the routing of the request (see routers.py)
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            _query_thread_pool(),
+            partial(context.run, _run_in_query_thread, function, *args, **kwargs)
+        )
+
+    return run
+
+
+def _fetch_all(querysets):
+    return [list(queryset) for queryset in querysets]
+
+
+def _authenticate(request):
+    user = request.user
+    if not user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    return user
+
+
+def _error_response(request, exc):
+    if isinstance(exc.detail, (dict, list)):
+        data = exc.detail
+    else:
+        data = {'detail': exc.detail}
+
+    response = JsonResponse(data, status=exc.status_code, safe=False)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        # same as APIView: 401 only if the authenticator can ask for credentials
+        authenticate_header = request._authenticator.authenticate_header(request) if request._authenticator else None
+        if authenticate_header is None and request.authenticators:
+            authenticate_header = request.authenticators[0].authenticate_header(request)
+        if authenticate_header:
+            response['WWW-Authenticate'] = authenticate_header
+        else:
+            response.status_code = status.HTTP_403_FORBIDDEN
+    return response
+
+
+def async_api_view(*methods):
+    """
+    Decorates a coroutine function view(request, user) with:
+    - the check of the HTTP method,
+    - REST Framework request (parsed data and query parameters),
+    - authentication of the user (only authenticated users are allowed),
+    - error responses in the format of REST Framework.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED,
+                    headers={'Allow': ', '.join(methods)}
+                )
+
+            api_request = Request(
+                request,
+                parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+                authenticators=[authenticator() for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+            )
+            try:
+                user = await database_sync_to_async(_authenticate)(api_request)
+                return await view(api_request, user, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return _error_response(api_request, exc)
+
+        # like APIView, CSRF is checked by SessionAuthentication
+        # (django.views.decorators.csrf.csrf_exempt does not support coroutine functions in Django 4.0)
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def compute_commitments(user, reference_date):
+    """
+    Async version of views.StatisticsView.compute_commitments.
+    Contracts, savings and recurring savings are fetched concurrently, if settings.ASYNC_CONCURRENT_QUERIES is set.
+    """
+    querysets = user.commitment_values(reference_date)
+    if settings.ASYNC_CONCURRENT_QUERIES:
+        fetch = database_sync_to_async(list)
+        contracts, savings, recurring_savings = await asyncio.gather(*[fetch(queryset) for queryset in querysets])
+    else:
+        contracts, savings, recurring_savings = await database_sync_to_async(_fetch_all)(querysets)
+    if vectorized.use_for(contracts, savings, recurring_savings):
+        return vectorized.create_commitments(user, reference_date, (contracts, savings, recurring_savings))
+    return user.commitments_from_values(contracts, savings, recurring_savings, reference_date).show()
+
+
+@replica_methods('GET', 'POST')
+@async_api_view('GET', 'POST')
+async def statistics(request, user):
+    """
+    See statistics based on the current account balance
+    """
+    if request.method == 'POST':
+        return JsonResponse(await _statistics(_balance(request.data), user), status=status.HTTP_202_ACCEPTED)
+
+    # same as views.StatisticsView.get: the balance is a query parameter and the response has an ETag
+    balance = _balance(request.query_params)
+    version = await astatistics_version(user.pk)
+    etag, not_modified = conditional_response(request, user.pk, version, date.today().isoformat())
+    if not_modified is not None:
+        return not_modified
+    response = JsonResponse(await _statistics(balance, user, version))
+    response['ETag'] = etag
+    return response
+
+
+def _balance(data):
+    serializer = serializers.BalanceSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['balance']
+
+
+async def _statistics(balance, user, version = None):
+    commitments = await acached_commitments(user, date.today(), compute_commitments, version)
+    return apply_balance(commitments, balance)
+
+
+async def _cost_list(request, user, list_view, queryset):
+    # same ETag check as the sync lists (see conditional.py), before the list query
+    etag, not_modified = await aconditional_response(request, user.pk)
+    if not_modified is not None:
+        return not_modified
+
+    data, paginator = await database_sync_to_async(list_view().list_costs)(request, queryset)
+    if paginator is not None:
+        data = paginator.get_paginated_response(data).data
+    response = JsonResponse(data, safe=False)
+    response['ETag'] = etag
+    return response
+
+
+@async_api_view('GET')
+async def contracts(request, user):
+    """
+    List contracts
+    """
+    return await _cost_list(request, user, ContractsList, Contract.objects.filter(user=user))
+
+
+@async_api_view('GET')
+async def savings(request, user):
+    """
+    List savings
+    """
+    return await _cost_list(request, user, SavingsList, Saving.objects.filter(user=user))
+
+
+@async_api_view('GET')
+async def recurring_savings(request, user):
+    """
+    List recurring savings
+    """
+    return await _cost_list(request, user, RecurringSavingsList, RecurringSaving.objects.filter(user=user))
+
+
+@async_api_view('GET')
+async def profile(request, user):
+    """
+    Shows user data of the logged in user.
+    """
+    return JsonResponse(serializers.UserSerializer(user).data)
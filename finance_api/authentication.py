@@ -0,0 +1,209 @@
+"""
+Stateless authentication with signed bearer tokens.
+
+LoginView and RegisterView issue a token signed with the SECRET_KEY (django.core.signing),
+which carries the id of the user, the first day of the month of the user, a random token id
+and the time of issue. Tokens expire after settings.AUTH_TOKEN_MAX_AGE seconds.
+Requests send the token in the header
+    Authorization: Bearer <token>
+
+Users are kept in a small in-process cache (settings.AUTH_USER_CACHE_SIZE users
+for settings.AUTH_USER_CACHE_TIMEOUT seconds), so that authenticated requests need no session
+and no user query. A change of the user removes it only from the cache of the process that saved it:
+other processes may accept the tokens of a deactivated or deleted user
+for up to AUTH_USER_CACHE_TIMEOUT seconds. A token whose first day of the month differs from the user's
+is rejected, so the statistics are never computed for an outdated first day of the month.
+
+Revoked tokens (LogoutView) are kept in a deny-list in the database (see models.RevokedToken),
+shared by all processes: only the token ids, each of them only until the token would expire anyway.
+Every process keeps the ids of the revoked tokens in memory and loads them again
+at most every AUTH_USER_CACHE_TIMEOUT seconds, so authenticated requests need no revocation query.
+A token is rejected at once by the process that revoked it, by the other processes
+after up to AUTH_USER_CACHE_TIMEOUT seconds, like the changes of the users.
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core import signing
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import authentication, exceptions
+from .models import RevokedToken, User
+
+SALT = 'finance_api.authentication'
+KEYWORD = 'Bearer'
+
+
+def issue_token(user):
+    """
+    Returns a new token of the user.
+    """
+    return signing.dumps(
+        {
+            'user': user.pk,
+            'first_day_of_the_month': user.first_day_of_the_month,
+            'id': secrets.token_urlsafe(8),
+            'issued': int(time.time()),
+        },
+        salt=SALT
+    )
+
+
+def read_token(token):
+    """
+    Returns the payload of the token (see issue_token).
+    Raises AuthenticationFailed if the token is invalid, expired or revoked.
+    """
+    try:
+        payload = signing.loads(token, salt=SALT, max_age=settings.AUTH_TOKEN_MAX_AGE)
+    except signing.SignatureExpired:
+        raise exceptions.AuthenticationFailed('Token expired.')
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed('Invalid token.')
+
+    if payload['id'] in revoked_tokens:
+        raise exceptions.AuthenticationFailed('Token revoked.')
+    return payload
+
+
+def token_user_id(request):
+    """
+    Returns the id of the user of the bearer token of the request, None without a valid token.
+    Only the signature and the age of the token are checked, without any query (revoked tokens are not rejected).
+    """
+    header = authentication.get_authorization_header(request).split()
+    if len(header) != 2 or header[0].lower() != KEYWORD.lower().encode():
+        return None
+    try:
+        payload = signing.loads(header[1].decode(errors='replace'), salt=SALT, max_age=settings.AUTH_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return payload['user']
+
+
+def revoke_token(token):
+    """
+    Adds the token to the deny-list until it expires.
+    """
+    try:
+        payload = signing.loads(token, salt=SALT, max_age=settings.AUTH_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        # invalid and expired tokens are rejected anyway
+        return
+    expires = datetime.fromtimestamp(payload['issued'] + settings.AUTH_TOKEN_MAX_AGE, tz=timezone.utc)
+    # tokens of the expired revocations are rejected as expired
+    RevokedToken.objects.filter(expires__lte=datetime.now(tz=timezone.utc)).delete()
+    RevokedToken.objects.get_or_create(token_id=payload['id'], defaults={'expires': expires})
+    revoked_tokens.add(payload['id'], expires)
+
+
+class _RevokedTokens:
+    """
+    Ids of the revoked tokens that did not expire yet, loaded from the database
+    at most every settings.AUTH_USER_CACHE_TIMEOUT seconds (see the module documentation).
+    """
+    def __init__(self):
+        self.ids = frozenset()
+        # tokens revoked by this process, kept until they expire, so that a reload that started
+        # before the revocation does not drop them
+        self.revoked_here = {}
+        self.loaded = None
+        self.lock = threading.Lock()
+
+    def __contains__(self, token_id):
+        if self.loaded is None or self.loaded + settings.AUTH_USER_CACHE_TIMEOUT < time.monotonic():
+            self.load()
+        return token_id in self.ids
+
+    def load(self):
+        now = datetime.now(tz=timezone.utc)
+        # read from the primary database, a replica may not contain the latest revocations yet
+        ids = set(RevokedToken.objects.using(DEFAULT_DB_ALIAS).filter(expires__gt=now).values_list('token_id', flat=True))
+        with self.lock:
+            self.revoked_here = {token_id: expires for token_id, expires in self.revoked_here.items() if expires > now}
+            self.ids = frozenset(ids.union(self.revoked_here))
+            self.loaded = time.monotonic()
+
+    def add(self, token_id, expires):
+        with self.lock:
+            self.revoked_here[token_id] = expires
+            self.ids = self.ids.union([token_id])
+
+    def clear(self):
+        with self.lock:
+            self.ids = frozenset()
+            self.revoked_here = {}
+            self.loaded = None
+
+
+revoked_tokens = _RevokedTokens()
+
+
+class _UserCache:
+    """
+    Least recently used users of this process, each of them for settings.AUTH_USER_CACHE_TIMEOUT seconds.
+    Changes of the users in other processes are seen only after the timeout (see the module documentation).
+    """
+    def __init__(self):
+        self.users = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.users.get(user_id)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self.users[user_id]
+                return None
+            self.users.move_to_end(user_id)
+            return user
+
+    def set(self, user):
+        with self.lock:
+            self.users[user.pk] = (user, time.monotonic() + settings.AUTH_USER_CACHE_TIMEOUT)
+            self.users.move_to_end(user.pk)
+            while len(self.users) > settings.AUTH_USER_CACHE_SIZE:
+                self.users.popitem(last=False)
+
+    def remove(self, user_id):
+        with self.lock:
+            self.users.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.users.clear()
+
+
+user_cache = _UserCache()
+
+
+class SignedTokenAuthentication(authentication.BaseAuthentication):
+    """
+    Authentication with the signed bearer tokens (see the module documentation).
+    request.auth is the token.
+    """
+    def authenticate(self, request):
+        header = authentication.get_authorization_header(request).split()
+        if not header or header[0].lower() != KEYWORD.lower().encode():
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+
+        token = header[1].decode(errors='replace')
+        payload = read_token(token)
+        user = user_cache.get(payload['user'])
+        if user is None or user.first_day_of_the_month != payload['first_day_of_the_month']:
+            user = User.objects.filter(pk=payload['user']).first()
+            if user is None or not user.is_active:
+                raise exceptions.AuthenticationFailed('User inactive or deleted.')
+            user_cache.set(user)
+        if user.first_day_of_the_month != payload['first_day_of_the_month']:
+            raise exceptions.AuthenticationFailed('Token out of date, log in again.')
+        return user, token
+
+    def authenticate_header(self, request):
+        return KEYWORD
@@ -0,0 +1,62 @@
+"""
+Conditional GET of the costs and statistics of the user.
+
+ETags are derived from the per-user version of the data (see statistics_cache.statistics_version),
+which changes after every change of the costs or of the first day of the month of the user,
+and from the full path of the request, because other fields, pages or balances are other representations.
+The version is kept in the database (see models.StatisticsVersion), so all processes give the same ETags,
+and it is read with a single query by its primary key, without any query of the costs, so a request
+with a matching If-None-Match is answered with 304 Not Modified before the list query
+and the serialization (see django.views.decorators.http.etag).
+"""
+import hashlib
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from .statistics_cache import astatistics_version, statistics_version
+
+
+def _etag(user_id, version, path, *parts):
+    key = ':'.join([str(user_id), str(version), path, *parts])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def user_data_etag(request, *args, **kwargs):
+    """
+    Returns ETag of the costs of the logged in user.
+    """
+    user_id = request.user.pk
+    return _etag(user_id, statistics_version(user_id), request.get_full_path())
+
+
+def cost_etag(model):
+    """
+    Returns function that returns ETag of a single cost of the model (None if there is no such cost),
+    derived from the version of the data of its owner.
+    """
+    def etag_func(request, pk, *args, **kwargs):
+        # the owner and the version of its data in one query
+        owner = model.objects.filter(pk = pk).values_list('user_id', 'user__statistics_version__version').first()
+        if owner is None:
+            return None
+        user_id, version = owner
+        return _etag(user_id, version or 0, request.get_full_path())
+    return etag_func
+
+
+def conditional_response(request, user_id, version, *parts):
+    """
+    ETag check of the views that read the version of the data themselves,
+    e.g. the statistics, which use the same version for the cached commitments (see statistics_cache.py).
+    Returns tuple (ETag, 304 response if the ETag matches If-None-Match, otherwise None).
+    """
+    etag = quote_etag(_etag(user_id, version, request.get_full_path(), *parts))
+    return etag, get_conditional_response(request, etag = etag)
+
+
+async def aconditional_response(request, user_id, *parts):
+    """
+    Async version of the ETag check for the async views (see async_views.py).
+    Returns tuple (ETag, 304 response if the ETag matches If-None-Match, otherwise None).
+    """
+    version = await astatistics_version(user_id)
+    return conditional_response(request, user_id, version, *parts)
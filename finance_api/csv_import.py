@@ -0,0 +1,95 @@
+"""
+Streaming import of the costs from CSV files.
+
+The file is read row by row with csv.DictReader. Rows are validated with the serializer
+of the model in chunks of settings.COST_IMPORT_CHUNK_SIZE rows and the valid rows of every chunk
+are created with bulk_create in a separate transaction, so the memory used by an import
+depends only on the chunk size and a failure keeps the chunks that are already imported.
+
+The columns are the fields of the serializer (the format of the export, see export.py).
+The column id is ignored, empty values of the optional fields are imported as None
+and empty values of the fields with a default value are replaced by the default.
+Invalid rows are skipped and reported with their line numbers.
+"""
+import csv
+from dataclasses import dataclass, field
+from itertools import islice
+from django.conf import settings
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+from .statistics_cache import invalidate_statistics
+
+# maximal number of reported invalid rows
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class ImportProgress:
+    rows: int = 0
+    created: int = 0
+    failed: int = 0
+    errors: list = field(default_factory = list)
+
+    def show(self):
+        return {"rows": self.rows, "created": self.created, "failed": self.failed, "errors": self.errors}
+
+
+def read_rows(lines, serializer_class):
+    """
+    Returns csv.DictReader of the lines (iterable of strings).
+    Raises ValidationError if a required column is missing.
+    """
+    reader = csv.DictReader(lines)
+    columns = reader.fieldnames or []
+    required = [name for name, serializer_field in serializer_class().fields.items() if serializer_field.required]
+    missing = [name for name in required if name not in columns]
+    if missing:
+        raise ValidationError({'file': f"Missing columns: {', '.join(missing)}."})
+    return reader
+
+
+def import_costs(reader, model, serializer_class, user, chunk_size = None):
+    """
+    Imports the rows of the reader (see read_rows) as costs of the user.
+    Yields ImportProgress after every chunk.
+    """
+    chunk_size = chunk_size or settings.COST_IMPORT_CHUNK_SIZE
+    row_serializer = serializer_class()
+    # columns are the names of the serializer fields, their sources are the model fields (e.g. amount_cents for amount)
+    model_fields = {model_field.name: model_field for model_field in model._meta.fields}
+    columns = {name: model_fields.get(field.source) for name, field in row_serializer.fields.items()}
+    nullable_fields = {name for name, model_field in columns.items() if model_field is not None and model_field.null}
+    fields_with_default = {name for name, model_field in columns.items() if model_field is not None and model_field.has_default()}
+    progress = ImportProgress()
+
+    while True:
+        line_numbers = []
+        chunk = []
+        for row in islice(reader, chunk_size):
+            line_numbers.append(reader.line_num)
+            chunk.append({
+                name: None if value == "" and name in nullable_fields else value
+                for name, value in row.items()
+                if name is not None and not (value == "" and name in fields_with_default)
+            })
+        if not chunk:
+            break
+
+        # same as serializer_class(data = chunk, many = True), but keeps the valid rows of the chunk
+        new_costs = []
+        for line_number, row in zip(line_numbers, chunk):
+            try:
+                new_costs.append(model(user = user, **row_serializer.run_validation(row)))
+            except ValidationError as exc:
+                progress.failed += 1
+                if len(progress.errors) < MAX_REPORTED_ERRORS:
+                    progress.errors.append({"line": line_number, "errors": exc.detail})
+
+        if new_costs:
+            with transaction.atomic():
+                model.objects.bulk_create(new_costs)
+            invalidate_statistics(user.pk)
+
+        progress.rows += len(chunk)
+        progress.created += len(new_costs)
+        yield progress
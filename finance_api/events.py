@@ -0,0 +1,80 @@
+"""
+Calendar of the user: billing days of the contracts, saving days of the recurring savings
+and pay out days of the savings and recurring savings within a range of days.
+
+Every contract and saving yields its own events in order of the date,
+starting directly at the first day of the range (see utils.schedule_dates),
+and the streams of all items are merged with heapq.merge in a single pass.
+"""
+import heapq
+from datetime import timedelta
+from .money import from_cents
+from .utils import count_occurrences, schedule_dates
+
+# kinds of the events
+BILLING, SAVING, PAY_OUT = 'billing', 'saving', 'pay_out'
+
+# order of the events of the same day
+_ITEM_ORDER = {'contract': 0, 'saving': 1, 'recurring_saving': 2}
+_KIND_ORDER = {BILLING: 0, SAVING: 1, PAY_OUT: 2}
+
+
+def schedule_between(first_day, period_in_months, start_date, last_date):
+    """
+    Yields the days of the schedule from the start_date until the last_date (inclusive).
+    """
+    for day in schedule_dates(first_day, period_in_months, start_date - timedelta(days=1)):
+        if day > last_date:
+            break
+        yield day
+
+
+def _event(day, item_type, pk, kind, name, amount):
+    # tuples are compared by the merge: by date, then type and id of the item, then kind of the event
+    return (day, _ITEM_ORDER[item_type], pk, _KIND_ORDER[kind], item_type, kind, name, amount)
+
+
+def _contract_events(contract, start_date, end_date):
+    pk, name, amount, first_billing_day, contract_end_date, frequency = contract
+    last_date = end_date if contract_end_date is None else min(end_date, contract_end_date)
+    for day in schedule_between(first_billing_day, frequency, start_date, last_date):
+        yield _event(day, 'contract', pk, BILLING, name, amount)
+
+
+def _recurring_saving_events(recurring_saving, start_date, end_date):
+    pk, name, amount, saving_start_date, saving_end_date, pay_out_day, frequency = recurring_saving
+    last_saving_day = min(day for day in (saving_end_date, pay_out_day, end_date) if day is not None)
+    for day in schedule_between(saving_start_date, frequency, start_date, last_saving_day):
+        yield _event(day, 'recurring_saving', pk, SAVING, name, amount)
+
+    if pay_out_day is not None and start_date <= pay_out_day <= end_date:
+        last_saving_day = pay_out_day if saving_end_date is None else min(pay_out_day, saving_end_date)
+        saved = amount * count_occurrences(saving_start_date, frequency, last_saving_day)
+        yield _event(pay_out_day, 'recurring_saving', pk, PAY_OUT, name, saved)
+
+
+def compute_events(contracts, savings, recurring_savings, start_date, end_date):
+    """
+    Returns events from the start_date until the end_date (inclusive), ordered by date.
+    The amounts of the items are in cents, the amounts of the events in the major unit of the currency.
+
+    Arguments:
+        contracts               tuples (id, name, amount, first_billing_day, end_date, billing_frequency)
+        savings                 tuples (id, name, amount, pay_out_day)
+        recurring_savings       tuples (id, name, amount, start_date, end_date, pay_out_day, frequency)
+
+    Returns list of dictionaries with the keys "date", "kind", "item_type", "item_id", "name" and "amount".
+    """
+    streams = [_contract_events(contract, start_date, end_date) for contract in contracts]
+    streams += [_recurring_saving_events(recurring_saving, start_date, end_date) for recurring_saving in recurring_savings]
+    # a saving has a single event, so all of them form one sorted stream
+    streams.append(sorted(
+        _event(pay_out_day, 'saving', pk, PAY_OUT, name, amount)
+        for pk, name, amount, pay_out_day in savings
+        if pay_out_day is not None and start_date <= pay_out_day <= end_date
+    ))
+
+    return [
+        {"date": day, "kind": kind, "item_type": item_type, "item_id": pk, "name": name, "amount": from_cents(amount)}
+        for day, _, pk, _, item_type, kind, name, amount in heapq.merge(*streams)
+    ]
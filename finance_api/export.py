@@ -0,0 +1,77 @@
+"""
+Streaming export of the costs.
+
+Rows are read with QuerySet.iterator as plain values (without model instances and serializers)
+and encoded one by one, so the memory used by an export does not depend on the number of rows.
+Only the amounts are converted from cents to the major unit of the currency (see money.py).
+Encoded rows are sent in chunks of settings.COST_EXPORT_CHUNK_SIZE rows.
+"""
+import csv
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from .money import from_cents
+from .serializers import AmountField
+
+
+class _Echo:
+    """
+    File-like object that returns the written value, used to encode single rows with csv.writer.
+    """
+    def write(self, value):
+        return value
+
+
+def csv_lines(fields, rows):
+    """
+    Encodes the rows as CSV with a header. Missing values (None) are written as empty strings.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(fields, rows):
+    """
+    Encodes the rows as newline delimited JSON, one object per row.
+    """
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + '\n'
+
+
+FORMATS = {
+    'csv': (csv_lines, 'text/csv'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
+
+
+def _amounts_from_cents(rows, positions):
+    for row in rows:
+        row = list(row)
+        for position in positions:
+            row[position] = from_cents(row[position])
+        yield row
+
+
+def export_chunks(queryset, serializer, export_format):
+    """
+    Yields the rows of the queryset with the fields of the serializer encoded in the given format (see FORMATS),
+    joined into chunks of settings.COST_EXPORT_CHUNK_SIZE rows.
+    """
+    encode = FORMATS[export_format][0]
+    chunk_size = settings.COST_EXPORT_CHUNK_SIZE
+    fields = list(serializer.fields)
+    rows = queryset.values_list(*[field.source for field in serializer.fields.values()]).iterator(chunk_size=chunk_size)
+    amount_positions = [position for position, field in enumerate(serializer.fields.values()) if isinstance(field, AmountField)]
+    if amount_positions:
+        rows = _amounts_from_cents(rows, amount_positions)
+
+    chunk = []
+    for line in encode(fields, rows):
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
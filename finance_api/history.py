@@ -0,0 +1,173 @@
+"""
+Historical statistics: the balance, the amounts stored for the contracts and saved for the savings
+and the disponible amount for every day of a range.
+
+Instead of computing the statistics again for every day, every contract and saving yields
+the days on which its amount changes (beginnings of the user months, billing days,
+saving days and pay outs) together with the new amount, starting directly at the first day of the range.
+The changes of all items are merged with heapq.merge and applied to running totals day by day,
+so every day costs only the updates of the items affected on that day.
+Amounts are integer numbers of cents, so the running totals are exact.
+
+For every day the result is the same as the statistics computed on that day
+(see User.create_statistics) for the balance of the day.
+First days of the month after 28 keep the day clamped by a shorter month (see utils.MonthBoundaries),
+so the beginnings counted until a billing day depend on the day: they are counted with
+MonthBoundaries.count_between on every day on which they can change.
+"""
+import bisect
+import heapq
+from datetime import timedelta
+from .money import share
+from .utils import count_occurrences, date_from_month_index, month_boundaries, month_index, next_occurrence, schedule_dates
+
+
+def _amount_to_store(amount, frequency, beginnings_until_billing):
+    # same as Contract.compute_amount_to_store_regarding_first_day_of_month
+    if beginnings_until_billing == 0:
+        return amount
+    if frequency - beginnings_until_billing == 0:
+        return 0
+    return share(amount, frequency, frequency - beginnings_until_billing)
+
+
+def _change_days(first_day_of_the_month, start_date, months):
+    """
+    Returns the days after the start_date on which the beginnings of the months
+    counted until a billing day can change: the beginnings of the months clamped by their own month
+    and, for first days after 28, the first days of the months (see utils.MonthBoundaries.next).
+    """
+    boundaries = month_boundaries(first_day_of_the_month)
+    first_index = month_index(start_date)
+    days = [boundaries.beginning(first_index + month) for month in range(months + 1)]
+    if first_day_of_the_month > 28:
+        days += [date_from_month_index(first_index + month, 1) for month in range(1, months + 1)]
+        days.sort()
+    return days[bisect.bisect_right(days, start_date):]
+
+
+def _contract_changes(contract, change_days, boundaries, start_date, end_date):
+    amount, first_billing_day, contract_end_date, frequency = contract
+    last_day = end_date if contract_end_date is None else min(end_date, contract_end_date)
+
+    # the amount to store depends on the next billing day and the beginnings of the months until that day
+    day = start_date
+    for billing_day in schedule_dates(first_billing_day, frequency, start_date):
+        if contract_end_date is not None and billing_day > contract_end_date:
+            # the contract ends before the next billing day
+            yield day, 0
+            return
+
+        first = bisect.bisect_right(change_days, day)
+        last = bisect.bisect_left(change_days, billing_day)
+        if boundaries is None:
+            # every change day is a beginning of the month
+            yield day, _amount_to_store(amount, frequency, last - first)
+            for position in range(first, last):
+                if change_days[position] > last_day:
+                    return
+                yield change_days[position], _amount_to_store(amount, frequency, last - position - 1)
+        else:
+            yield day, _amount_to_store(amount, frequency, boundaries.count_between(day, billing_day))
+            for position in range(first, last):
+                if change_days[position] > last_day:
+                    return
+                change_day = change_days[position]
+                yield change_day, _amount_to_store(amount, frequency, boundaries.count_between(change_day, billing_day))
+
+        if billing_day > last_day:
+            return
+        day = billing_day
+
+
+def _saving_changes(saving, start_date, end_date):
+    amount, pay_out_day = saving
+    yield start_date, amount
+    if pay_out_day is not None and pay_out_day <= end_date:
+        yield pay_out_day, 0
+
+
+def _recurring_saving_changes(recurring_saving, start_date, end_date):
+    amount, saving_start_date, saving_end_date, pay_out_day, frequency = recurring_saving
+    last_saving_day = start_date if saving_end_date is None else min(start_date, saving_end_date)
+    occurrences = count_occurrences(saving_start_date, frequency, last_saving_day)
+    yield start_date, amount * occurrences
+
+    last_saving_day = min(day for day in (saving_end_date, pay_out_day, end_date) if day is not None)
+    for day in schedule_dates(saving_start_date, frequency, start_date):
+        if day > last_saving_day:
+            break
+        occurrences += 1
+        yield day, amount * occurrences
+
+    if pay_out_day is not None and pay_out_day < end_date:
+        # the saved amount is counted until the pay out day (inclusive)
+        yield pay_out_day + timedelta(days=1), 0
+
+
+def _numbered(changes, number):
+    for day, amount in changes:
+        yield day, number, amount
+
+
+def compute_history(first_day_of_the_month, contracts, savings, recurring_savings, balances, start_date, end_date):
+    """
+    Computes the statistics for every day from the start_date until the end_date (inclusive).
+    All amounts are in cents (see money.py).
+
+    Arguments:
+        contracts               tuples (amount, first_billing_day, end_date, billing_frequency)
+                                of the contracts that are active on the start_date
+        savings                 tuples (amount, pay_out_day) of the savings that are not paid out on the start_date
+        recurring_savings       tuples (amount, start_date, end_date, pay_out_day, frequency)
+                                of the recurring savings that are not paid out on the start_date
+        balances                tuples (date, balance) ordered by date, the first one not after the start_date.
+                                The balance of a day is the last balance on or before that day.
+
+    Returns list of tuples (date, balance, saved, stored), the disponible amount is balance - saved - stored.
+    """
+    contracts = list(contracts)
+    # beginnings of the months until the latest next billing day after the end_date,
+    # which can be any number of months after the end_date (e.g. the first billing day of a contract)
+    last_billing_day = max(
+        (next_occurrence(first_billing_day, frequency, end_date) for _, first_billing_day, _, frequency in contracts),
+        default=end_date
+    )
+    months = month_index(max(last_billing_day, end_date)) - month_index(start_date) + 1
+    change_days = _change_days(first_day_of_the_month, start_date, months)
+    boundaries = month_boundaries(first_day_of_the_month) if first_day_of_the_month > 28 else None
+
+    streams = [_contract_changes(contract, change_days, boundaries, start_date, end_date) for contract in contracts]
+    contracts_count = len(streams)
+    streams += [_saving_changes(saving, start_date, end_date) for saving in savings]
+    streams += [_recurring_saving_changes(recurring_saving, start_date, end_date) for recurring_saving in recurring_savings]
+
+    # an item changes its amount at most once a day, so the merged changes are ordered by day and item
+    changes = heapq.merge(*[_numbered(stream, number) for number, stream in enumerate(streams)])
+    amounts = [0] * len(streams)
+    stored = 0
+    saved = 0
+    change = next(changes, None)
+    balance_position = 0
+    balance = balances[0][1]
+
+    history = []
+    day = start_date
+    while day <= end_date:
+        while change is not None and change[0] <= day:
+            _, number, amount = change
+            if number < contracts_count:
+                stored += amount - amounts[number]
+            else:
+                saved += amount - amounts[number]
+            amounts[number] = amount
+            change = next(changes, None)
+
+        while balance_position + 1 < len(balances) and balances[balance_position + 1][0] <= day:
+            balance_position += 1
+            balance = balances[balance_position][1]
+
+        history.append((day, balance, saved, stored))
+        day += timedelta(days=1)
+
+    return history
@@ -0,0 +1,30 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from finance_api.statistics_batch import compute_statistics
+
+
+class Command(BaseCommand):
+    help = "Computes and stores the statistics of all users (see finance_api/statistics_batch.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help="reference date of the statistics (default: today)")
+        parser.add_argument('--workers', type=int, help="number of worker processes (default: number of CPUs)")
+        parser.add_argument('--chunk-size', type=int, help="number of users computed and written at once")
+
+    def handle(self, *args, **options):
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError("Number of workers must be at least 1.")
+        if options['chunk_size'] is not None and options['chunk_size'] < 1:
+            raise CommandError("Chunk size must be at least 1.")
+
+        progress = None
+        for progress in compute_statistics(options['date'], options['workers'], options['chunk_size']):
+            self.stdout.write(f"{progress.users} users computed, {progress.users_per_second():.0f} users/s")
+
+        if progress is None:
+            self.stdout.write("No users to compute.")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Statistics of {progress.users} users computed in {progress.seconds:.2f} s "
+                f"({progress.users_per_second():.0f} users/s)."
+            ))
@@ -0,0 +1,54 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+from finance_api import serializers
+from finance_api.csv_import import import_costs, read_rows
+from finance_api.models import Contract, RecurringSaving, Saving, User
+
+COST_TYPES = {
+    'contracts': (Contract, serializers.ContractSerializer),
+    'savings': (Saving, serializers.SavingSerializer),
+    'recurring-savings': (RecurringSaving, serializers.RecurringSavingSerializer),
+}
+
+
+class Command(BaseCommand):
+    help = "Imports contracts, savings or recurring savings of the user from a CSV file (see finance_api/csv_import.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="user that the costs are imported for")
+        parser.add_argument('type', choices=COST_TYPES, help="type of the imported costs")
+        parser.add_argument('path', help="path of the CSV file, - for the standard input")
+        parser.add_argument('--chunk-size', type=int, help="number of rows created in one transaction")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist.")
+        model, serializer_class = COST_TYPES[options['type']]
+
+        if options['path'] == '-':
+            self.import_file(sys.stdin, model, serializer_class, user, options['chunk_size'])
+        else:
+            with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+                self.import_file(lines, model, serializer_class, user, options['chunk_size'])
+
+    def import_file(self, lines, model, serializer_class, user, chunk_size):
+        try:
+            reader = read_rows(lines, serializer_class)
+        except ValidationError as exc:
+            raise CommandError(exc.detail['file'])
+
+        reported_errors = 0
+        progress = None
+        for progress in import_costs(reader, model, serializer_class, user, chunk_size):
+            for error in progress.errors[reported_errors:]:
+                self.stderr.write(f"line {error['line']}: {dict(error['errors'])}")
+            reported_errors = len(progress.errors)
+            self.stdout.write(f"{progress.rows} rows read, {progress.created} created, {progress.failed} failed")
+
+        if progress is None:
+            self.stdout.write("No rows to import.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Imported {progress.created} of {progress.rows} rows."))
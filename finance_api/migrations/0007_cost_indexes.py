@@ -0,0 +1,37 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_api', '0006_alter_contract_billing_frequency_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(fields=['user', 'end_date'], name='contract_user_end_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contract',
+            index=models.Index(condition=models.Q(('end_date__isnull', True)), fields=['user'], name='contract_user_no_end_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringsaving',
+            index=models.Index(fields=['user', 'pay_out_day'], name='recurring_user_pay_out_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringsaving',
+            index=models.Index(condition=models.Q(('pay_out_day__isnull', True)), fields=['user'], name='recurring_user_no_pay_out_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saving',
+            index=models.Index(fields=['user', 'pay_out_day'], name='saving_user_pay_out_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saving',
+            index=models.Index(condition=models.Q(('pay_out_day__isnull', True)), fields=['user'], name='saving_user_no_pay_out_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_api', '0007_cost_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('balance', models.FloatField()),
+                ('saved', models.FloatField()),
+                ('stored', models.FloatField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistics_snapshots', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='statisticssnapshot',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='snapshot_user_date_unique'),
+        ),
+    ]
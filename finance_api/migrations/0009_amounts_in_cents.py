@@ -0,0 +1,67 @@
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Round
+
+# cents in the major unit of the currency when the amounts were converted
+CENTS = 100
+MODELS_WITH_AMOUNT = ['contract', 'saving', 'recurringsaving']
+
+
+def amounts_to_cents(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    for model_name in MODELS_WITH_AMOUNT:
+        apps.get_model('finance_api', model_name).objects.using(db_alias).update(amount_cents=Round(F('amount') * CENTS))
+
+
+def amounts_from_cents(apps, schema_editor):
+    db_alias = schema_editor.connection.alias
+    for model_name in MODELS_WITH_AMOUNT:
+        apps.get_model('finance_api', model_name).objects.using(db_alias).update(amount=F('amount_cents') / float(CENTS))
+
+
+def delete_snapshots(apps, schema_editor):
+    # snapshots can be computed again (see User.create_history)
+    apps.get_model('finance_api', 'statisticssnapshot').objects.using(schema_editor.connection.alias).all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_api', '0008_statistics_snapshots'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name='amount_cents',
+                field=models.BigIntegerField(default=0),
+            )
+            for model_name in MODELS_WITH_AMOUNT
+        ],
+        migrations.RunPython(amounts_to_cents, amounts_from_cents),
+        *[
+            migrations.RemoveField(
+                model_name=model_name,
+                name='amount',
+            )
+            for model_name in MODELS_WITH_AMOUNT
+        ],
+        migrations.RunPython(delete_snapshots, delete_snapshots),
+        *[
+            migrations.RemoveField(
+                model_name='statisticssnapshot',
+                name=name,
+            )
+            for name in ['balance', 'saved', 'stored']
+        ],
+        *[
+            migrations.AddField(
+                model_name='statisticssnapshot',
+                name=f'{name}_cents',
+                field=models.BigIntegerField(default=0),
+                preserve_default=False,
+            )
+            for name in ['balance', 'saved', 'stored']
+        ],
+    ]
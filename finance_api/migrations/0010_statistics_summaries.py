@@ -0,0 +1,31 @@
+# Generated by Django 4.0.6 on 2026-10-18 02:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_api', '0009_amounts_in_cents'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticsSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('saved_cents', models.BigIntegerField()),
+                ('stored_cents', models.BigIntegerField()),
+                ('savings', models.PositiveIntegerField()),
+                ('contracts', models.PositiveIntegerField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statistics_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='statisticssummary',
+            constraint=models.UniqueConstraint(fields=('user', 'date'), name='summary_user_date_unique'),
+        ),
+    ]
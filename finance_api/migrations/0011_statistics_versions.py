@@ -0,0 +1,22 @@
+# Generated by Django 4.0.6 on 2026-10-18 04:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_api', '0010_statistics_summaries'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticsVersion',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='statistics_version', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-18 03:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_api', '0011_statistics_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statisticssnapshot',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -1,10 +1,14 @@
 from datetime import date
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from dateutil.relativedelta import relativedelta
 from django.core.validators import MaxValueValidator, MinValueValidator
-import calendar
-from .utils import StatisticContract, StatisticSaving, Statistics
+from . import profiling
+from .events import compute_events
+from .history import compute_history
+from .money import from_cents, share, to_cents
+from .prognose import compute_prognose
+from .utils import Commitments, StatisticContract, StatisticSaving, count_occurrences, month_boundaries, next_occurrence
 
 
 class User(AbstractUser):
@@ -33,20 +37,10 @@ class User(AbstractUser):
 
         e.g.
         first_day_of_the_month = 31
-        reference_date = date(2022, 2, 1)
+        reference_date = date(2022, 3, 15)
         result = date(2022, 2, 28)
         """
-        last_day_of_month = calendar.monthrange(reference_date.year, reference_date.month)[1]
-
-        if last_day_of_month < self.first_day_of_the_month:
-            first_day = date(reference_date.year, reference_date.month, last_day_of_month)
-        else:
-            first_day = date(reference_date.year, reference_date.month, self.first_day_of_the_month)
-          
-        if first_day > reference_date:
-            first_day = first_day - relativedelta(months=1)
-
-        return first_day
+        return self.month_boundaries().current(reference_date)
     
     def beginning_of_next_month(self, reference_date = date.today()):
         """
@@ -55,17 +49,17 @@ class User(AbstractUser):
 
         If first_day_of_the_month is bigger than the last day of the next month,
         the function returns last applicable day.
+        A day clamped in the month of the reference_date is kept
+        (first_day_of_the_month = 31, reference_date = date(2023, 2, 28), result = date(2023, 3, 28)).
         """
-        try:
-            first_day = date(reference_date.year, reference_date.month, self.first_day_of_the_month)
-        except ValueError:
-            last_day_of_month = calendar.monthrange(reference_date.year, reference_date.month)[1]
-            first_day = date(reference_date.year, reference_date.month, last_day_of_month)
-        
-        if first_day <= reference_date:
-            first_day = first_day + relativedelta(months=1)
+        return self.month_boundaries().next(reference_date)
 
-        return first_day
+    def month_boundaries(self):
+        """
+        Returns the beginnings of the months of the user (see utils.MonthBoundaries),
+        shared by all contracts of the user.
+        """
+        return month_boundaries(self.first_day_of_the_month)
 
     def create_statistics(self, balance, reference_date):
         """
@@ -76,39 +70,176 @@ class User(AbstractUser):
         - reference_date
 
         The function computes, which amount should be stored 
-        for the specific contract and saving
+        for the specific contract and saving (see create_commitments)
         and subtracts this amount from the given balance,
         in order to compute the amount disponible for the user.
 
         The result is presented as an instance of the class utils.Statistics.
         """
+        commitments = self.create_commitments(reference_date)
+        with profiling.phase('statistics.balance'):
+            return commitments.statistics(balance)
+
+    def create_commitments(self, reference_date):
+        """
+        Computes which amount should be stored for the specific contract and saving
+        on the reference_date. The result does not depend on the balance
+        and is presented as an instance of the class utils.Commitments.
+
+        Contracts, savings and recurring savings are fetched with one query each,
+        archived contracts and paid out savings are filtered out by the database.
+        The related managers set contract.user to this instance,
+        so the user is not fetched again for every contract.
+        """
+        return self.collect_commitments(
+            self.contract.active(reference_date),
+            self.saving.not_paid_out(reference_date),
+            self.recurringsaving.not_paid_out(reference_date),
+            reference_date
+        )
+
+    @staticmethod
+    def collect_commitments(contracts, savings, recurring_savings, reference_date):
+        """
+        Computes the commitments (see create_commitments) of the given
+        active contracts and savings that are not paid out yet.
+        """
         all_savings = []
         active_contracts = []
-        user_contracts = self.contract.all()
-        user_savings = self.saving.all()
-        user_recurring_savings = self.recurringsaving.all()
 
-        for saving in user_savings:
-            if not saving.paid_out(reference_date):
+        with profiling.phase('statistics.savings'):
+            for saving in savings:
                 all_savings.append(StatisticSaving(saving.name, False, saving.amount))
-                balance -= saving.amount
 
-        for recurring_saving in user_recurring_savings:
-            if not recurring_saving.paid_out(reference_date):
+        with profiling.phase('statistics.recurring_savings'):
+            for recurring_saving in recurring_savings:
                 total_saved = recurring_saving.saved_amount(reference_date)
                 all_savings.append(StatisticSaving(recurring_saving.name, True, total_saved))
-                balance -= total_saved
 
-        for contract in user_contracts:
-            if not contract.archived():
+        with profiling.phase('statistics.contracts'):
+            for contract in contracts:
                 billing_day = contract.compute_next_billing_day(reference_date)
                 to_store = contract.compute_amount_to_store_regarding_first_day_of_month(reference_date)
-
                 active_contracts.append(StatisticContract(contract.name, billing_day, contract.amount, to_store))
-                balance -= to_store
 
-        return Statistics(balance, all_savings, active_contracts)
+        return Commitments(all_savings, active_contracts)
+
+    def commitment_values(self, reference_date):
+        """
+        Returns querysets of the values needed to compute the commitments on the reference_date
+        (see commitments_from_values and vectorized.create_commitments):
+        - active contracts: tuples (name, amount_cents, first_billing_day, end_date, billing_frequency)
+        - savings that are not paid out: tuples (name, amount_cents)
+        - recurring savings that are not paid out: tuples (name, amount_cents, start_date, end_date, frequency)
+        """
+        return (
+            self.contract.active(reference_date).values_list('name', 'amount_cents', 'first_billing_day', 'end_date', 'billing_frequency'),
+            self.saving.not_paid_out(reference_date).values_list('name', 'amount_cents'),
+            self.recurringsaving.not_paid_out(reference_date).values_list('name', 'amount_cents', 'start_date', 'end_date', 'frequency'),
+        )
+
+    def commitments_from_values(self, contracts, savings, recurring_savings, reference_date):
+        """
+        Computes the commitments (see create_commitments) from the values fetched by commitment_values.
+        """
+        return self.collect_commitments(
+            [
+                Contract(user = self, name = name, amount_cents = amount, first_billing_day = first_billing_day, end_date = end_date, billing_frequency = frequency)
+                for name, amount, first_billing_day, end_date, frequency in contracts
+            ],
+            [Saving(name = name, amount_cents = amount) for name, amount in savings],
+            [
+                RecurringSaving(name = name, amount_cents = amount, start_date = start_date, end_date = end_date, frequency = frequency)
+                for name, amount, start_date, end_date, frequency in recurring_savings
+            ],
+            reference_date
+        )
+
+    def create_prognose(self, balance, reference_date, months, monthly_income = 0):
+        """
+        Creates prognose of the balance and the disponible amount
+        for the beginnings of the next months (see prognose.compute_prognose),
+        based on:
+        - balance (should illustrate total account balance on the reference_date)
+        - contracts, savings and recurring savings of the user
+        - monthly_income received at the beginning of every month
 
+        Contracts, savings and recurring savings are fetched with one query each.
+        """
+        return compute_prognose(
+            self.first_day_of_the_month,
+            self.contract.active(reference_date).values_list('amount_cents', 'first_billing_day', 'end_date', 'billing_frequency'),
+            self.saving.not_paid_out(reference_date).values_list('amount_cents', 'pay_out_day'),
+            self.recurringsaving.not_paid_out(reference_date).values_list(
+                'amount_cents', 'start_date', 'end_date', 'pay_out_day', 'frequency'
+            ),
+            to_cents(balance),
+            reference_date,
+            months,
+            to_cents(monthly_income)
+        )
+
+    def create_events(self, start_date, end_date):
+        """
+        Creates calendar of the user (see events.compute_events):
+        billing days of the contracts, saving days of the recurring savings
+        and pay out days of the savings from the start_date until the end_date.
+
+        Contracts, savings and recurring savings are fetched with one query each.
+        """
+        return compute_events(
+            self.contract.active(start_date).filter(first_billing_day__lte = end_date).values_list('id', 'name', 'amount_cents', 'first_billing_day', 'end_date', 'billing_frequency'),
+            self.saving.filter(pay_out_day__gte = start_date, pay_out_day__lte = end_date).values_list('id', 'name', 'amount_cents', 'pay_out_day'),
+            self.recurringsaving.not_paid_out(start_date).filter(start_date__lte = end_date).values_list(
+                'id', 'name', 'amount_cents', 'start_date', 'end_date', 'pay_out_day', 'frequency'
+            ),
+            start_date,
+            end_date
+        )
+
+    def create_history(self, balances, start_date, end_date):
+        """
+        Creates statistics for every day from the start_date until the end_date (see history.compute_history),
+        based on:
+        - balances: tuples (date, balance) ordered by date, the first one not after the start_date
+        - contracts, savings and recurring savings of the user
+
+        The result is a list of snapshots (see StatisticsSnapshot), that are not stored yet.
+        The snapshots get the version of the statistics read before the costs,
+        so snapshots computed during a change of the costs are never read.
+        Contracts, savings and recurring savings are fetched with one query each.
+        """
+        version = StatisticsVersion.of_user(self.pk)
+        history = compute_history(
+            self.first_day_of_the_month,
+            self.contract.active(start_date).values_list('amount_cents', 'first_billing_day', 'end_date', 'billing_frequency'),
+            self.saving.not_paid_out(start_date).values_list('amount_cents', 'pay_out_day'),
+            self.recurringsaving.not_paid_out(start_date).values_list(
+                'amount_cents', 'start_date', 'end_date', 'pay_out_day', 'frequency'
+            ),
+            [(day, to_cents(balance)) for day, balance in balances],
+            start_date,
+            end_date
+        )
+        return [
+            StatisticsSnapshot(
+                user = self, date = day, version = version, balance_cents = balance, saved_cents = saved, stored_cents = stored
+            )
+            for day, balance, saved, stored in history
+        ]
+
+    def store_history(self, snapshots):
+        """
+        Stores the snapshots created by create_history,
+        replacing the snapshots of the same days and the snapshots of the older versions.
+        """
+        if not snapshots:
+            return
+        with transaction.atomic():
+            self.statistics_snapshots.filter(
+                models.Q(date__gte = snapshots[0].date, date__lte = snapshots[-1].date) | models.Q(version__lt = snapshots[0].version)
+            ).delete()
+            StatisticsSnapshot.objects.bulk_create(snapshots)
 
 class Cost(models.Model):
     """
@@ -119,18 +250,55 @@ class Cost(models.Model):
         name            Name of the costs
         user            Foreign key pointing to the user that this costs is related to
         description     Optional description.
-        amount          Amount of money related to this costs.
+        amount_cents    Amount of money related to this costs, in cents (see money.py).
+                        Available in the major unit of the currency as the property amount.
     """
     name = models.CharField(max_length = 30)
     user = models.ForeignKey(User, on_delete = models.CASCADE, related_name = "%(class)s")
     description = models.CharField(max_length = 300, null = True)
-    amount = models.FloatField(default=0)
+    amount_cents = models.BigIntegerField(default = 0)
 
     class Meta:
         # mark model as abstract,
         # so that it is not used to create any database table
         abstract = True
 
+    @property
+    def amount(self):
+        """
+        Amount in the major unit of the currency.
+        Can also be set (e.g. Contract(amount = 12.5)), the value is rounded to whole cents.
+        """
+        return from_cents(self.amount_cents)
+
+    @amount.setter
+    def amount(self, value):
+        self.amount_cents = to_cents(value)
+
+
+class ContractQuerySet(models.QuerySet):
+    def active(self, reference_date):
+        """
+        Contracts that are not archived on the reference_date (see Contract.archived).
+        """
+        return self.filter(models.Q(end_date__isnull = True) | models.Q(end_date__gte = reference_date))
+
+
+class SavingQuerySet(models.QuerySet):
+    def not_paid_out(self, reference_date):
+        """
+        Savings that are not paid out on the reference_date (see Saving.paid_out).
+        """
+        return self.filter(models.Q(pay_out_day__isnull = True) | models.Q(pay_out_day__gt = reference_date))
+
+
+class RecurringSavingQuerySet(models.QuerySet):
+    def not_paid_out(self, reference_date):
+        """
+        Recurring savings that are not paid out on the reference_date (see RecurringSaving.paid_out).
+        """
+        return self.filter(models.Q(pay_out_day__isnull = True) | models.Q(pay_out_day__gte = reference_date))
+
 
 class Frequency(models.IntegerChoices):
     """
@@ -162,6 +330,15 @@ class Contract(Cost):
         default = Frequency.MONTHLY
     )
 
+    objects = ContractQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # active contracts of the user
+            models.Index(fields = ['user', 'end_date'], name = 'contract_user_end_date_idx'),
+            models.Index(fields = ['user'], condition = models.Q(end_date__isnull = True), name = 'contract_user_no_end_idx'),
+        ]
+
     def archived(self, reference_date = date.today()):
         """
         Returns boolean saying if the contract is archived,
@@ -175,10 +352,7 @@ class Contract(Cost):
         Based on the first_billing_day, the function looks for the first possible billing day
         in the future (in relation to reference_date).
         """
-        period_in_months = self.billing_frequency
-        billing_day = self.first_billing_day
-        while billing_day <= reference_date:
-                billing_day = billing_day + relativedelta(months=+period_in_months)
+        billing_day = next_occurrence(self.first_billing_day, self.billing_frequency, reference_date)
 
         if self.end_date is not None and self.end_date < billing_day:
             return None
@@ -198,11 +372,9 @@ class Contract(Cost):
     def compute_amount_to_store(self, reference_date = date.today()):
 
         period_in_months = self.billing_frequency
-        monthly_store = self.amount / period_in_months
         next_billing = self.compute_next_billing_day(reference_date)
         full_remaining_months = relativedelta(next_billing, reference_date).months
-        to_store = monthly_store * (period_in_months - full_remaining_months)
-        return to_store
+        return from_cents(share(self.amount_cents, period_in_months, period_in_months - full_remaining_months))
 
 
     def compute_amount_to_store_regarding_first_day_of_month(self, reference_date = date.today()):
@@ -245,27 +417,31 @@ class Contract(Cost):
         either 0 or 100% (because there is always max. 1 salary until the billing_day)
         and for ANUALLY contracts the program computes 1/12 of the full amount
         for each month to store.
+
+        The amount is computed in cents (see stored_cents) and a part of the amount is rounded down to a whole cent.
         """
-        next_month_first_day = self.user.beginning_of_next_month(reference_date)
-        next_billing = self.compute_next_billing_day(reference_date)
+        return from_cents(self.stored_cents(reference_date))
 
-        beginnings_until_next_billinng = 0
+    def stored_cents(self, reference_date):
+        """
+        Same as compute_amount_to_store_regarding_first_day_of_month, in cents.
+        """
+        next_billing = self.compute_next_billing_day(reference_date)
+        if next_billing is None:
+            # the contract ends before the next billing day
+            return 0
 
-        while next_month_first_day < next_billing:
-            beginnings_until_next_billinng += 1
-            next_month_first_day += relativedelta(months=1)
+        beginnings_until_next_billinng = self.user.month_boundaries().count_between(reference_date, next_billing)
 
         if beginnings_until_next_billinng == 0:
-            return self.amount
+            return self.amount_cents
 
         period_in_months = self.billing_frequency
 
         if period_in_months - beginnings_until_next_billinng == 0:
             return 0
 
-        monthly_store = self.amount / period_in_months
-        to_store = monthly_store * (period_in_months - beginnings_until_next_billinng)
-        return to_store
+        return share(self.amount_cents, period_in_months, period_in_months - beginnings_until_next_billinng)
 
 
 class Saving(Cost):
@@ -277,6 +453,15 @@ class Saving(Cost):
     """
     pay_out_day = models.DateField(null = True)
 
+    objects = SavingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # savings of the user that are not paid out
+            models.Index(fields = ['user', 'pay_out_day'], name = 'saving_user_pay_out_idx'),
+            models.Index(fields = ['user'], condition = models.Q(pay_out_day__isnull = True), name = 'saving_user_no_pay_out_idx'),
+        ]
+
     def paid_out(self, reference_date = date.today()):
         """
         Returns boolean saying if the saved amount has been paid out,
@@ -309,6 +494,15 @@ class RecurringSaving(Cost):
         default = Frequency.MONTHLY
     )
 
+    objects = RecurringSavingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # recurring savings of the user that are not paid out
+            models.Index(fields = ['user', 'pay_out_day'], name = 'recurring_user_pay_out_idx'),
+            models.Index(fields = ['user'], condition = models.Q(pay_out_day__isnull = True), name = 'recurring_user_no_pay_out_idx'),
+        ]
+
     def paid_out(self, reference_date = date.today()):
         """
         Returns boolean saying if the saved amount has been paid out,
@@ -320,15 +514,147 @@ class RecurringSaving(Cost):
         """
         Computes total amount saved for this saving,
         based on the start_date, reference_date, recurrency and amount.
+
+        The amount is saved on the start_date and then every saving period,
+        until the end_date (if set) or the reference_date.
+        """
+        return from_cents(self.saved_cents(reference_date))
+
+    def saved_cents(self, reference_date):
+        """
+        Same as saved_amount, in cents.
         """
         if self.paid_out(reference_date):
             return 0
 
-        save_day = self.start_date
         end_day = self.end_date if self.end_date is not None and self.end_date < reference_date else reference_date
-        total_saved = 0
-        saving_period = self.frequency
-        while save_day <= end_day:
-            total_saved += self.amount
-            save_day = save_day + relativedelta(months=+saving_period)
-        return total_saved
\ No newline at end of file
+        return self.amount_cents * count_occurrences(self.start_date, self.frequency, end_day)
+
+
+class StatisticsVersion(models.Model):
+    """
+    Version of the statistics of the user, increased after every change of the costs of the user
+    or of first_day_of_the_month (see statistics_cache.invalidate_statistics).
+    Kept in the database, so that all processes see the same version,
+    and outside of the User model, so that saving a user never writes an outdated version back.
+
+    Attributes:
+        user        The user, also the primary key.
+        version     Number of the changes, users without any change have no row (version 0).
+    """
+    user = models.OneToOneField(User, on_delete = models.CASCADE, primary_key = True, related_name = "statistics_version")
+    version = models.BigIntegerField(default = 0)
+
+    @classmethod
+    def of_user(cls, user_id):
+        """
+        Returns the current version of the statistics of the user.
+        """
+        version = cls.objects.filter(user_id = user_id).values_list('version', flat = True).first()
+        return version or 0
+
+
+class StatisticsSnapshotQuerySet(models.QuerySet):
+    def between(self, start_date, end_date):
+        """
+        Returns snapshots from the start_date until the end_date (inclusive).
+        """
+        return self.filter(date__gte = start_date, date__lte = end_date)
+
+    def of_version(self, version):
+        """
+        Returns snapshots computed with the given version of the statistics (see StatisticsVersion).
+        """
+        return self.filter(version = version)
+
+
+class StatisticsSnapshot(models.Model):
+    """
+    Statistics of the user on a specific day (see User.create_history),
+    stored for fast reading of the history.
+    Snapshots keep the version of the statistics they were computed with (see StatisticsVersion),
+    only the snapshots of the current version are read. Changes of the costs do not touch the snapshots,
+    the outdated ones are replaced when the history of the user is stored again (see User.store_history).
+
+    Attributes:
+        user            Foreign key pointing to the user of the snapshot.
+        date            Day of the statistics.
+        version         Version of the statistics of the user the snapshot was computed with.
+        balance_cents   Account balance on this day.
+        saved_cents     Total amount saved for the savings and recurring savings.
+        stored_cents    Total amount stored for the contracts.
+    All amounts are in cents (see money.py).
+    """
+    user = models.ForeignKey(User, on_delete = models.CASCADE, related_name = "statistics_snapshots")
+    date = models.DateField()
+    version = models.BigIntegerField(default = 0)
+    balance_cents = models.BigIntegerField()
+    saved_cents = models.BigIntegerField()
+    stored_cents = models.BigIntegerField()
+
+    objects = StatisticsSnapshotQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # one snapshot per day, also used to read the snapshots of the user within a range of days
+            models.UniqueConstraint(fields = ['user', 'date'], name = 'snapshot_user_date_unique'),
+        ]
+
+    def show(self):
+        return {
+            "date": self.date,
+            "balance": from_cents(self.balance_cents),
+            "saved": from_cents(self.saved_cents),
+            "stored": from_cents(self.stored_cents),
+            "disponible": from_cents(self.balance_cents - self.saved_cents - self.stored_cents),
+        }
+
+
+class StatisticsSummary(models.Model):
+    """
+    Amounts committed by the user on a specific day, computed for all users at once
+    by the command compute_statistics (see statistics_batch.py).
+
+    Attributes:
+        user            Foreign key pointing to the user of the summary.
+        date            Reference date of the statistics.
+        saved_cents     Total amount saved for the savings and recurring savings.
+        stored_cents    Total amount stored for the contracts.
+        savings         Number of the savings and recurring savings that are not paid out.
+        contracts       Number of the active contracts.
+    All amounts are in cents (see money.py).
+    """
+    user = models.ForeignKey(User, on_delete = models.CASCADE, related_name = "statistics_summaries")
+    date = models.DateField()
+    saved_cents = models.BigIntegerField()
+    stored_cents = models.BigIntegerField()
+    savings = models.PositiveIntegerField()
+    contracts = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields = ['user', 'date'], name = 'summary_user_date_unique'),
+        ]
+
+    def show(self):
+        return {
+            "date": self.date,
+            "saved": from_cents(self.saved_cents),
+            "stored": from_cents(self.stored_cents),
+            "committed": from_cents(self.saved_cents + self.stored_cents),
+            "savings": self.savings,
+            "contracts": self.contracts,
+        }
+
+
+class RevokedToken(models.Model):
+    """
+    Bearer token revoked before it expires (see authentication.revoke_token).
+    Kept in the database, so that all processes reject the token and the revocation is never evicted.
+
+    Attributes:
+        token_id    Random id of the token, also the primary key.
+        expires     Time when the token expires, afterwards the row is not needed and is deleted.
+    """
+    token_id = models.CharField(max_length = 32, primary_key = True)
+    expires = models.DateTimeField(db_index = True)
@@ -0,0 +1,46 @@
+"""
+Amounts of money.
+
+Amounts are stored and computed as integer numbers of the minor unit of the currency (cents),
+so that the statistics are exact and cheap to compute.
+The API presents them in the major unit with settings.CURRENCY_DECIMAL_PLACES decimal places
+(see serializers.AmountField).
+"""
+from decimal import ROUND_HALF_UP, Decimal
+from django.conf import settings
+
+
+def cents_per_unit():
+    """
+    Returns the number of cents in the major unit of the currency.
+    The setting is read on every call, so the module can be imported before the settings are configured.
+    """
+    return 10 ** settings.CURRENCY_DECIMAL_PLACES
+
+
+def to_cents(amount):
+    """
+    Converts an amount in the major unit (int, float, Decimal or string) to cents,
+    rounded half up to a whole cent. Floats are converted by their shortest representation,
+    so 0.29 is 29 cents and not 28.999... cents.
+    """
+    if isinstance(amount, int):
+        return amount * cents_per_unit()
+    if isinstance(amount, float):
+        amount = repr(amount)
+    return int((Decimal(amount) * cents_per_unit()).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """
+    Converts cents to the major unit, as a float for the JSON responses.
+    """
+    return cents / cents_per_unit()
+
+
+def share(cents, parts, taken):
+    """
+    Returns the amount of the taken parts, when the cents are split into the given number of equal parts.
+    The result is rounded down to a whole cent.
+    """
+    return cents * taken // parts
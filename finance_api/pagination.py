@@ -0,0 +1,69 @@
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from . import profiling
+from .rendering import compile_encoders, encode_rows
+
+
+class CostCursorPagination(CursorPagination):
+    """
+    Keyset pagination of the costs of the user.
+    The page size can be changed with the query parameter page_size.
+    """
+    page_size = settings.COST_LIST_PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = settings.COST_LIST_MAX_PAGE_SIZE
+    ordering = 'id'
+
+
+class CostListMixin:
+    """
+    Lists costs of the logged in user.
+
+    Query parameters:
+        fields          Comma separated names of the fields to return,
+                        only these fields are selected from the database.
+        cursor          Cursor of the page, returned as "next" and "previous" of the previous page.
+        page_size       Number of costs per page.
+        ordering        One of the cursor_orderings, optionally with "-" for descending order.
+
+    The costs are paginated only if cursor or page_size is given,
+    otherwise the list of all costs is returned.
+    """
+    cursor_orderings = ('id',)
+
+    def get_fields(self, request):
+        if 'fields' not in request.query_params:
+            return None
+
+        fields = [field.strip() for field in request.query_params['fields'].split(',') if field.strip()]
+        unknown_fields = set(fields) - set(self.serializer_class.Meta.fields)
+        if not fields or unknown_fields:
+            raise ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown_fields))}" if unknown_fields else "No fields given."})
+        return fields
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get('ordering', 'id')
+        if ordering.lstrip('-') not in self.cursor_orderings:
+            raise ValidationError({'ordering': f"Ordering must be one of: {', '.join(self.cursor_orderings)}."})
+        return ordering
+
+    def list_costs(self, request, queryset):
+        fields = self.get_fields(request)
+        paginate = 'cursor' in request.query_params or 'page_size' in request.query_params
+        ordering = self.get_ordering(request) if paginate else 'id'
+
+        # only the returned fields and the fields of the cursor are selected from the database,
+        # as plain values converted by the encoders of the serializer (see rendering.py)
+        encoders = compile_encoders(self.serializer_class, None if fields is None else frozenset(fields))
+        rows = queryset.values(*{source for _, source, _ in encoders} | {'id', ordering.lstrip('-')})
+
+        if not paginate:
+            with profiling.phase('serializer'):
+                return encode_rows(rows, encoders), None
+
+        paginator = CostCursorPagination()
+        paginator.ordering = (ordering, 'id') if ordering.lstrip('-') != 'id' else ordering
+        page = paginator.paginate_queryset(rows, request, view=self)
+        with profiling.phase('serializer'):
+            return encode_rows(page, encoders), paginator
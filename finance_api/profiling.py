@@ -0,0 +1,220 @@
+"""
+Per-request profiling.
+
+ProfilingMiddleware measures every request and adds the measurements
+to the Server-Timing header of the response:
+    total           wall time of the request
+    db              time spent in the database, the description contains the number of queries
+    <phase>         time spent in the phases marked with profiling.phase(name),
+                    e.g. the phases of User.create_commitments or the serialization of the cost lists
+
+A cProfile file (readable with pstats or snakeviz) is written to settings.PROFILING_DIRECTORY
+for requests with the header X-Profile: 1 and for requests slower than settings.PROFILING_SLOW_REQUEST_MS.
+The header is honoured only with settings.DEBUG or for staff users: anonymous requests are not profiled at all
+and the profiles of the other users are discarded. At most settings.PROFILING_MAX_FILES profiles are kept,
+the oldest ones are removed.
+Note that the slow requests can only be found if all requests are profiled,
+so setting PROFILING_SLOW_REQUEST_MS slows down all requests.
+
+The middleware supports both the sync and the async handler, so it can stay first in MIDDLEWARE
+without adapting the async views (ASGI) to a worker thread. The profiles of the async requests
+cover only the thread of the event loop, not the queries run in the worker threads.
+
+The middleware is enabled with settings.PROFILING_ENABLED (environment variable PROFILING=1).
+When it is disabled, profiling.phase does nothing.
+"""
+import asyncio
+import cProfile
+import logging
+import os
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+# measurements of the current request, None outside of the profiled requests
+_current_timings = ContextVar('profiling_timings', default = None)
+
+
+class RequestTimings:
+    """
+    Measurements of a single request.
+    """
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.phases = {}
+
+    def add_phase(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def database_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+    def server_timing(self, total):
+        """
+        Returns the value of the Server-Timing header.
+        """
+        metrics = [
+            f'total;dur={total * 1000:.2f}',
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"',
+        ]
+        for name, seconds in self.phases.items():
+            metrics.append(f'{name};dur={seconds * 1000:.2f}')
+        return ', '.join(metrics)
+
+
+@contextmanager
+def phase(name):
+    """
+    Measures the time of the enclosed block as the phase with the given name
+    of the current request. Repeated phases are added up.
+    """
+    timings = _current_timings.get()
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add_phase(name, time.perf_counter() - start)
+
+
+class ProfilingMiddleware:
+    """
+    Adds the Server-Timing header to the responses and writes cProfile files
+    of the requested and slow requests (see the module documentation).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # marks the middleware as a coroutine function for the async handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        profiler = self.start_profiler(request)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.database_wrapper))
+                response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+            _current_timings.reset(token)
+
+        response['Server-Timing'] = timings.server_timing(total)
+        if profiler is not None and self.should_dump(request, total):
+            self.dump(profiler, request)
+        return response
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        profiler = self.start_profiler(request)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.database_wrapper))
+                response = await self.get_response(request)
+        finally:
+            total = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+            _current_timings.reset(token)
+
+        response['Server-Timing'] = timings.server_timing(total)
+        # the user of the session may not be loaded yet
+        if profiler is not None and await sync_to_async(self.should_dump)(request, total):
+            await sync_to_async(self.dump)(profiler, request)
+        return response
+
+    @staticmethod
+    def profile_requested(request):
+        """
+        Returns whether the request asks for the profile with the header and may ask for it,
+        the user is not authenticated yet, so only the requests with a token or a session are profiled.
+        """
+        # routers import the models, which import this module
+        from .routers import request_user_id
+
+        if request.META.get(PROFILE_HEADER) != '1':
+            return False
+        return settings.DEBUG or request_user_id(request) is not None
+
+    def start_profiler(self, request):
+        if not self.profile_requested(request) and settings.PROFILING_SLOW_REQUEST_MS is None:
+            return None
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is already active in this thread
+            return None
+        return profiler
+
+    @classmethod
+    def should_dump(cls, request, total):
+        if settings.PROFILING_SLOW_REQUEST_MS is not None and total * 1000 >= settings.PROFILING_SLOW_REQUEST_MS:
+            return True
+        if not cls.profile_requested(request):
+            return False
+        # DRF sets the authenticated user also to the Django request
+        user = getattr(request, 'user', None)
+        return settings.DEBUG or (user is not None and user.is_staff)
+
+    @classmethod
+    def dump(cls, profiler, request):
+        os.makedirs(settings.PROFILING_DIRECTORY, exist_ok = True)
+        path_name = re.sub(r'[^A-Za-z0-9]+', '_', request.path).strip('_') or 'root'
+        file_name = f'{time.strftime("%Y%m%d-%H%M%S")}-{time.perf_counter_ns()}-{request.method}-{path_name}.prof'
+        file_path = os.path.join(settings.PROFILING_DIRECTORY, file_name)
+        profiler.dump_stats(file_path)
+        logger.info('Profile of %s %s written to %s', request.method, request.path, file_path)
+        cls.remove_old_profiles()
+
+    @staticmethod
+    def remove_old_profiles():
+        """
+        Removes the oldest profiles above settings.PROFILING_MAX_FILES.
+        """
+        profiles = []
+        with os.scandir(settings.PROFILING_DIRECTORY) as entries:
+            for entry in entries:
+                if entry.name.endswith('.prof') and entry.is_file():
+                    profiles.append((entry.stat().st_mtime, entry.name, entry.path))
+        profiles.sort()
+        for _, _, path in profiles[:max(len(profiles) - settings.PROFILING_MAX_FILES, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # removed by another process
+                pass
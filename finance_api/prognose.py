@@ -0,0 +1,224 @@
+"""
+Cash-flow prognose.
+
+Projects the account balance and the disponible amount
+at the beginning of each of the next user months (see User.first_day_of_the_month).
+
+All billing days, saving days and pay outs within the horizon are generated
+in a single sweep over the contracts, savings and recurring savings of the user,
+instead of computing the statistics again for every month.
+Dates are compared as integer keys (month index * 32 + day),
+so that following a schedule costs a single addition per period.
+
+Assumptions of the prognose:
+- monthly_income is received at the beginning of every user month,
+- the amount of a contract leaves the account on its billing day,
+- a saving leaves the account when it is paid out,
+- recurring savings stay on the account until they are paid out.
+"""
+import bisect
+from dateutil.relativedelta import relativedelta
+from .money import from_cents, share
+from .utils import (
+    count_kept_days,
+    count_occurrences,
+    date_from_month_index,
+    month_boundaries,
+    month_index,
+    next_occurrence,
+    shortest_month_in_cycle,
+)
+
+
+def date_key(day):
+    """
+    Returns an integer that keeps the order of dates
+    and allows to move a date by full months with a single addition.
+    """
+    return month_index(day) * 32 + day.day
+
+
+def schedule_keys(first_day, period_in_months, reference_date):
+    """
+    Yields keys of all days of the schedule after the reference_date.
+    The schedule starts on first_day and repeats every period_in_months months (see utils.follow_schedule).
+    """
+    occurrence = next_occurrence(first_day, period_in_months, reference_date)
+    shortest_month = shortest_month_in_cycle(first_day, period_in_months)
+
+    # as long as the day can still be clamped by a shorter month, follow the schedule with relativedelta
+    while occurrence.day > shortest_month:
+        yield date_key(occurrence)
+        occurrence = occurrence + relativedelta(months=+period_in_months)
+
+    key = date_key(occurrence)
+    step = period_in_months * 32
+    while True:
+        yield key
+        key += step
+
+
+class MonthBeginnings:
+    """
+    Beginnings of the next user months after the reference_date:
+    the beginning of the next month after the same day of each of the next months
+    (see utils.MonthBoundaries.next, User.beginning_of_next_month).
+
+    First days of the month up to 28 are never clamped, the beginnings are computed with integer keys.
+    Later first days follow the clamping of MonthBoundaries, so the beginnings of the months counted
+    until a billing day are the ones the statistics count on the same day (see count_until).
+    """
+
+    def __init__(self, first_day_of_the_month, reference_date, months):
+        self.first_day_of_the_month = first_day_of_the_month
+        if first_day_of_the_month <= 28:
+            first_index = month_index(reference_date)
+            if first_day_of_the_month <= reference_date.day:
+                first_index += 1
+            self.first_index = first_index
+            self.boundaries = None
+            self.keys = [(first_index + month) * 32 + first_day_of_the_month for month in range(months)]
+        else:
+            boundaries = month_boundaries(first_day_of_the_month)
+            self.boundaries = boundaries
+            beginnings = [boundaries.next(reference_date + relativedelta(months=month)) for month in range(months)]
+            self.keys = [date_key(beginning) for beginning in beginnings]
+            # first beginnings counted by the statistics on every beginning
+            self.next_keys = [date_key(boundaries.next(beginning)) for beginning in beginnings]
+
+    def dates(self):
+        """
+        Returns the beginnings of the months as dates.
+        """
+        return [date_from_month_index(key // 32, key % 32) for key in self.keys]
+
+    def first_after(self, key):
+        """
+        Returns the position of the first beginning on or after the date with the given key.
+        The position can be after the last computed month.
+        """
+        if self.boundaries is not None:
+            return bisect.bisect_left(self.keys, key)
+        position = key // 32 - self.first_index
+        if position < 0:
+            return 0
+        return position + (key % 32 > self.first_day_of_the_month)
+
+    def count_until(self, position, key):
+        """
+        Returns the number of the beginnings of the months after the beginning at the position
+        and before the date with the given key (see utils.MonthBoundaries.count_between).
+        """
+        if self.boundaries is None:
+            return self.first_after(key) - position - 1
+        next_key = self.next_keys[position]
+        if next_key >= key:
+            return 0
+        return count_kept_days(next_key // 32, next_key % 32, key // 32, key % 32)
+
+
+def compute_prognose(
+    first_day_of_the_month,
+    contracts,
+    savings,
+    recurring_savings,
+    balance,
+    reference_date,
+    months,
+    monthly_income = 0
+):
+    """
+    Computes the prognose for the next months.
+    The balance, the monthly_income and the amounts of the costs are in cents (see money.py).
+
+    Arguments:
+        contracts               tuples (amount, first_billing_day, end_date, billing_frequency)
+        savings                 tuples (amount, pay_out_day)
+        recurring_savings       tuples (amount, start_date, end_date, pay_out_day, frequency)
+
+    Returns list of dictionaries with the keys "month_beginning", "balance" and "disponible"
+    (in the major unit of the currency).
+    For every beginning of the month, "disponible" is equal to the disponible amount of the statistics
+    computed on that day for the projected balance.
+    """
+    beginnings = MonthBeginnings(first_day_of_the_month, reference_date, months)
+    beginning_keys = beginnings.keys
+
+    # amounts that leave the account until the beginning of the month (inclusive)
+    expenses = [0] * (months + 1)
+    # amount to store for contracts at the beginning of the month
+    to_store = [0] * months
+    # amounts stored for savings, as differences to the previous month
+    saved_changes = [0] * (months + 1)
+
+    for amount, pay_out_day in savings:
+        if pay_out_day is None:
+            saved_changes[0] += amount
+        elif pay_out_day > reference_date:
+            paid_out = min(beginnings.first_after(date_key(pay_out_day)), months)
+            saved_changes[0] += amount
+            saved_changes[paid_out] -= amount
+            expenses[paid_out] += amount
+
+    for amount, start_date, end_date, pay_out_day, frequency in recurring_savings:
+        if pay_out_day is not None and pay_out_day < reference_date:
+            continue
+
+        paid_out = months if pay_out_day is None else min(beginnings.first_after(date_key(pay_out_day) + 1), months)
+        last_saving_day = reference_date if end_date is None or end_date > reference_date else end_date
+        saved = amount * count_occurrences(start_date, frequency, last_saving_day)
+        saved_changes[0] += saved
+        saved_changes[paid_out] -= saved
+
+        end_key = date_key(end_date) if end_date is not None else beginning_keys[-1]
+        for key in schedule_keys(start_date, frequency, reference_date):
+            position = beginnings.first_after(key)
+            if key > end_key or position >= paid_out:
+                break
+            saved_changes[position] += amount
+            saved_changes[paid_out] -= amount
+
+        if paid_out < months:
+            last_saving_day = pay_out_day if end_date is None or end_date > pay_out_day else end_date
+            expenses[paid_out] += amount * count_occurrences(start_date, frequency, last_saving_day)
+
+    for amount, first_billing_day, end_date, frequency in contracts:
+        if end_date is not None and end_date < reference_date:
+            continue
+
+        end_key = date_key(end_date) if end_date is not None else None
+        position = 0
+        for key in schedule_keys(first_billing_day, frequency, reference_date):
+            next_position = beginnings.first_after(key)
+            billed = end_key is None or key <= end_key
+
+            # beginnings of the month with this billing day as the next billing day
+            while position < min(next_position, months):
+                if end_key is not None and beginning_keys[position] > end_key:
+                    break
+                if billed:
+                    beginnings_until_billing = beginnings.count_until(position, key)
+                    if beginnings_until_billing == 0:
+                        to_store[position] += amount
+                    elif beginnings_until_billing != frequency:
+                        to_store[position] += share(amount, frequency, frequency - beginnings_until_billing)
+                position += 1
+
+            if not billed or next_position >= months:
+                break
+            expenses[next_position] += amount
+
+    prognose = []
+    total_expenses = 0
+    saved = 0
+    for month, month_beginning in enumerate(beginnings.dates()):
+        total_expenses += expenses[month]
+        saved += saved_changes[month]
+        projected_balance = balance + (month + 1) * monthly_income - total_expenses
+        prognose.append({
+            "month_beginning": month_beginning,
+            "balance": from_cents(projected_balance),
+            "disponible": from_cents(projected_balance - saved - to_store[month]),
+        })
+
+    return prognose
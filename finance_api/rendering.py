@@ -0,0 +1,56 @@
+"""
+Read-optimized rendering of the lists of the costs.
+
+The costs are read from the database as plain values (QuerySet.values), without model instances,
+and every row is converted by encoders compiled once per serializer and set of fields,
+instead of calling to_representation of every field of the serializer for every row.
+The output is the same as the output of the serializer: the fields in the order of the serializer,
+amounts in the major unit of the currency (see money.py), dates in ISO 8601 and None for missing values.
+"""
+from datetime import date
+from functools import lru_cache
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .money import from_cents
+from .serializers import AmountField
+
+# fields whose representation is the value read from the database
+_UNCHANGED_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.ChoiceField)
+
+
+def _encoder(field):
+    if isinstance(field, AmountField):
+        return from_cents
+    if isinstance(field, serializers.DateField):
+        output_format = getattr(field, 'format', api_settings.DATE_FORMAT)
+        if output_format is None:
+            return None
+        if output_format.lower() == ISO_8601:
+            return date.isoformat
+    if isinstance(field, _UNCHANGED_FIELDS):
+        return None
+    return field.to_representation
+
+
+@lru_cache(maxsize=None)
+def compile_encoders(serializer_class, fields = None):
+    """
+    Returns tuples (name, source, encode) of the fields of the serializer, only of the given fields (frozenset) if any.
+    The value of the source is encoded by encode, which is None if the value is returned unchanged.
+    """
+    serializer = serializer_class(fields = fields)
+    return tuple((name, field.source, _encoder(field)) for name, field in serializer.fields.items())
+
+
+def encode_rows(rows, encoders):
+    """
+    Returns the rows (dictionaries of the values of the sources) in the format of the serializer.
+    """
+    data = []
+    for row in rows:
+        item = {}
+        for name, source, encode in encoders:
+            value = row[source]
+            item[name] = value if encode is None or value is None else encode(value)
+        data.append(item)
+    return data
@@ -0,0 +1,197 @@
+"""
+Routing of the reads of the requests to the read replicas of the database.
+
+Requests that only read (the safe methods GET, HEAD and OPTIONS and the methods listed
+in replica_methods of the view, e.g. POST of the statistics) read from one of
+settings.REPLICA_DATABASES, chosen once per request. All writes go to the primary (default) database.
+Reads go to the primary as well:
+    - outside of the requests (e.g. management commands),
+    - within a transaction of the primary,
+    - after the first write of the request,
+    - for settings.REPLICA_STICKY_SECONDS after a request of the client that wrote (read-your-writes).
+      Writes of an authenticated user (session or bearer token) mark the user in the cache,
+      so all clients of the user read from the primary, also the ones that do not keep cookies.
+      The cache has to be shared by all processes (see CACHES in the settings).
+      Views that write after the response left the middleware (the streamed imports) call mark_user_sticky themselves.
+      Responses to anonymous requests that wrote set the cookie REPLICA_STICKY_COOKIE instead.
+
+The routing state of the current request is kept in a context variable,
+so the routing also works for the async views and their worker threads (see async_views.py).
+"""
+import asyncio
+import random
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from .authentication import token_user_id
+
+REPLICA_STICKY_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current_routing = ContextVar('database_routing', default = None)
+
+
+class RequestRouting:
+    """
+    Routing state of a single request.
+    """
+    def __init__(self):
+        self.sticky = False
+        self.replica = None
+        self.wrote = False
+        self.user_id = None
+
+
+def replica_methods(*methods):
+    """
+    Decorates a function view: requests with the given methods only read and can be served by a replica.
+    Class based views set the attribute replica_methods instead.
+    """
+    def decorator(view):
+        view.replica_methods = methods
+        return view
+    return decorator
+
+
+def _sticky_key(user_id):
+    return f"primary-until:{user_id}"
+
+
+def mark_user_sticky(user_id):
+    """
+    Sends the reads of the user to the primary for settings.REPLICA_STICKY_SECONDS.
+    Called by ReplicaRoutingMiddleware after the requests that wrote and by the writes
+    that happen after the response left the middleware (e.g. the streamed imports).
+    """
+    if settings.REPLICA_DATABASES:
+        cache.set(_sticky_key(user_id), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def request_user_id(request):
+    """
+    Returns the id of the user of the request (bearer token or session), None for anonymous requests.
+    The user is not authenticated yet, so only the token or the session is read.
+    """
+    user_id = token_user_id(request)
+    if user_id is None and hasattr(request, 'session'):
+        user_id = request.session.get(SESSION_KEY)
+    return None if user_id is None else str(user_id)
+
+
+def _view_replica_methods(view_func):
+    methods = getattr(view_func, 'replica_methods', None)
+    if methods is None:
+        # APIView.as_view() keeps the class of the view
+        methods = getattr(getattr(view_func, 'cls', None), 'replica_methods', SAFE_METHODS)
+    return methods
+
+
+class PrimaryReplicaRouter:
+    """
+    Database router that sends the reads of the requests that only read to a replica (see the module documentation).
+    """
+    def db_for_read(self, model, **hints):
+        routing = _current_routing.get()
+        if routing is None or routing.replica is None or routing.wrote or routing.sticky:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _current_routing.get()
+        if routing is None:
+            # outside of the requests the objects are written to their own database,
+            # e.g. the content types and permissions of migrate --database <alias>
+            return None
+        routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas contain the same data as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Sets the routing state of the request (see the module documentation).
+    The middleware supports both the sync and the async handler, so the async views (ASGI)
+    are not adapted to a worker thread for every request.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # marks the middleware as a coroutine function for the async handler
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        routing = RequestRouting()
+        token = _current_routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_routing.reset(token)
+        if self.sticky_user(routing):
+            mark_user_sticky(routing.user_id)
+        return self.mark_sticky(routing, response)
+
+    async def __acall__(self, request):
+        routing = RequestRouting()
+        token = _current_routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_routing.reset(token)
+        if self.sticky_user(routing):
+            await cache.aset(_sticky_key(routing.user_id), True, settings.REPLICA_STICKY_SECONDS)
+        return self.mark_sticky(routing, response)
+
+    @staticmethod
+    def sticky(request, user_id):
+        if user_id is not None:
+            return cache.get(_sticky_key(user_id)) is not None
+        try:
+            return float(request.COOKIES.get(REPLICA_STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            return False
+
+    @staticmethod
+    def sticky_user(routing):
+        """
+        Returns whether the request of an authenticated user wrote, so the user reads from the primary for a while.
+        """
+        return routing.wrote and routing.user_id is not None and bool(settings.REPLICA_DATABASES)
+
+    @staticmethod
+    def mark_sticky(routing, response):
+        # anonymous clients are marked by the cookie
+        if routing.wrote and routing.user_id is None and settings.REPLICA_DATABASES:
+            response.set_cookie(
+                REPLICA_STICKY_COOKIE,
+                str(time.time() + settings.REPLICA_STICKY_SECONDS),
+                max_age = settings.REPLICA_STICKY_SECONDS,
+                httponly = True,
+                samesite = 'Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _current_routing.get()
+        if routing is None:
+            return None
+        routing.user_id = request_user_id(request)
+        if settings.REPLICA_DATABASES and request.method in _view_replica_methods(view_func):
+            routing.sticky = self.sticky(request, routing.user_id)
+            routing.replica = random.choice(settings.REPLICA_DATABASES)
+        return None
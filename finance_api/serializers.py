@@ -1,6 +1,9 @@
+from decimal import ROUND_HALF_UP, InvalidOperation
+from django.conf import settings
 from django.contrib.auth import authenticate
 from rest_framework import serializers
 from .models import Contract, Saving, RecurringSaving, User
+from .money import cents_per_unit, from_cents
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -14,7 +17,58 @@ class UserSerializer(serializers.ModelSerializer):
         ]
 
 
-class ContractSerializer(serializers.ModelSerializer):
+class AmountField(serializers.DecimalField):
+    """
+    Amount of money in the major unit of the currency (e.g. 12.34),
+    with at most settings.CURRENCY_DECIMAL_PLACES decimal places.
+    The internal value is an integer number of cents (see money.py).
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('max_digits', 18)
+        kwargs.setdefault('decimal_places', settings.CURRENCY_DECIMAL_PLACES)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        return int(super().to_internal_value(data) * cents_per_unit())
+
+    def to_representation(self, value):
+        return from_cents(value)
+
+
+class BalanceField(AmountField):
+    """
+    Amount of money that is not stored (balance, income),
+    rounded to whole cents like money.to_cents instead of rejecting more decimal places.
+    """
+    def __init__(self, **kwargs):
+        kwargs.setdefault('rounding', ROUND_HALF_UP)
+        super().__init__(**kwargs)
+
+    def validate_precision(self, value):
+        try:
+            value = self.quantize(value)
+        except InvalidOperation:
+            self.fail('max_digits', max_digits=self.max_digits)
+        return super().validate_precision(value)
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer that takes an additional argument fields,
+    with the names of the fields that should be serialized.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class ContractSerializer(DynamicFieldsModelSerializer):
+    amount = AmountField(source='amount_cents', required=False)
+
     class Meta:
         model = Contract
         fields = [
@@ -28,7 +82,9 @@ class ContractSerializer(serializers.ModelSerializer):
         ]
 
 
-class SavingSerializer(serializers.ModelSerializer):
+class SavingSerializer(DynamicFieldsModelSerializer):
+    amount = AmountField(source='amount_cents', required=False)
+
     class Meta:
         model = Saving
         fields = [
@@ -41,10 +97,67 @@ class SavingSerializer(serializers.ModelSerializer):
 
 
 class BalanceSerializer(serializers.Serializer):
-    balance = serializers.FloatField()
+    balance = BalanceField()
+
+
+class BalancesSerializer(serializers.Serializer):
+    balances = serializers.ListField(child=BalanceField(), min_length=1, max_length=10000)
+
+
+class PrognoseSerializer(serializers.Serializer):
+    balance = BalanceField()
+    months = serializers.IntegerField(default=12, min_value=1, max_value=600)
+    monthly_income = BalanceField(default=0)
+
+
+class DateRangeSerializer(serializers.Serializer):
+    """
+    Range of days: query parameters "from" and "to" (inclusive).
+    The length of the range is limited by the setting max_range_setting.
+    """
+    max_range_setting = 'EVENTS_MAX_RANGE_DAYS'
+
+    def get_fields(self):
+        # "from" is a keyword, so the fields can not be declared as class attributes
+        return {'from': serializers.DateField(), 'to': serializers.DateField()}
+
+    def validate(self, attrs):
+        max_range_days = getattr(settings, self.max_range_setting)
+        if attrs['to'] < attrs['from']:
+            raise serializers.ValidationError('"to" must not be before "from".')
+        if (attrs['to'] - attrs['from']).days >= max_range_days:
+            raise serializers.ValidationError(f'The range must not be longer than {max_range_days} days.')
+        return attrs
+
+
+class HistoryRangeSerializer(DateRangeSerializer):
+    max_range_setting = 'STATISTICS_HISTORY_MAX_RANGE_DAYS'
+
+
+class DatedBalanceSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    balance = BalanceField()
+
+
+class HistorySerializer(HistoryRangeSerializer):
+    """
+    Range of days and the balances within the range.
+    The balance of a day is the last balance on or before that day.
+    """
+    def get_fields(self):
+        return {**super().get_fields(), 'balances': DatedBalanceSerializer(many=True, allow_empty=False)}
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        attrs['balances'] = sorted((balance['date'], balance['balance']) for balance in attrs['balances'])
+        if attrs['balances'][0][0] > attrs['from']:
+            raise serializers.ValidationError({'balances': 'The first balance must not be after "from".'})
+        return attrs
+
 
+class RecurringSavingSerializer(DynamicFieldsModelSerializer):
+    amount = AmountField(source='amount_cents', required=False)
 
-class RecurringSavingSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecurringSaving
         fields = [
@@ -0,0 +1,36 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .authentication import user_cache
+from .models import Contract, RecurringSaving, Saving, User
+from .statistics_cache import invalidate_statistics
+
+
+@receiver(post_save, sender=Contract)
+@receiver(post_save, sender=Saving)
+@receiver(post_save, sender=RecurringSaving)
+@receiver(post_delete, sender=Contract)
+@receiver(post_delete, sender=Saving)
+@receiver(post_delete, sender=RecurringSaving)
+def invalidate_statistics_of_cost_owner(sender, instance, **kwargs):
+    """
+    Cached statistics of the user are not valid anymore after any change of the user's costs.
+    """
+    invalidate_statistics(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def invalidate_statistics_of_user(sender, instance, update_fields=None, **kwargs):
+    """
+    Cached statistics of the user depend on first_day_of_the_month.
+    """
+    if update_fields is None or 'first_day_of_the_month' in update_fields:
+        invalidate_statistics(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def remove_cached_user(sender, instance, **kwargs):
+    """
+    Users cached for the token authentication are fetched again after every change.
+    """
+    user_cache.remove(instance.pk)
@@ -0,0 +1,118 @@
+"""
+Statistics of all users computed at once (see models.StatisticsSummary).
+
+User ids are split into shards of settings.STATISTICS_BATCH_CHUNK_SIZE users.
+For every shard the active contracts and the savings and recurring savings that are not paid out
+are fetched with one query per model (prefetch_related), the commitments of every user
+are computed in memory (see User.collect_commitments) and the summaries of the shard
+are written in one transaction.
+
+Shards are computed in parallel by a ProcessPoolExecutor (see worker_pool). The worker processes
+are forked, so they use the configured settings of the parent process. Every worker process opens
+its own database connection, so the connection of the parent process is closed
+before the workers are started. The command
+    python manage.py compute_statistics
+should run daily.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import date
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Prefetch
+from .models import Contract, RecurringSaving, Saving, StatisticsSummary, User
+
+
+@dataclass
+class BatchProgress:
+    users: int = 0
+    seconds: float = 0
+
+    def users_per_second(self):
+        return self.users / self.seconds if self.seconds else 0
+
+
+def shards(chunk_size = None):
+    """
+    Returns lists of at most chunk_size ids of all users, ordered by id.
+    """
+    chunk_size = chunk_size or settings.STATISTICS_BATCH_CHUNK_SIZE
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat = True))
+    return [user_ids[start:start + chunk_size] for start in range(0, len(user_ids), chunk_size)]
+
+
+def compute_shard(user_ids, reference_date):
+    """
+    Computes and stores the summaries of the statistics of the users on the reference_date.
+    Returns the number of the users.
+    """
+    users = User.objects.filter(pk__in = user_ids).prefetch_related(
+        Prefetch('contract', queryset = Contract.objects.active(reference_date)),
+        Prefetch('saving', queryset = Saving.objects.not_paid_out(reference_date)),
+        Prefetch('recurringsaving', queryset = RecurringSaving.objects.not_paid_out(reference_date)),
+    )
+
+    summaries = []
+    for user in users:
+        # prefetched items refer to their user, so the first day of the month is not fetched again
+        commitments = User.collect_commitments(user.contract.all(), user.saving.all(), user.recurringsaving.all(), reference_date)
+        summaries.append(StatisticsSummary(
+            user = user,
+            date = reference_date,
+            saved_cents = commitments.saved_cents(),
+            stored_cents = commitments.stored_cents(),
+            savings = len(commitments.savings),
+            contracts = len(commitments.active_contracts),
+        ))
+
+    with transaction.atomic():
+        StatisticsSummary.objects.filter(user_id__in = user_ids, date = reference_date).delete()
+        StatisticsSummary.objects.bulk_create(summaries)
+    return len(summaries)
+
+
+def _close_connections():
+    # a forked worker must not use the connection of the parent process
+    connections.close_all()
+
+
+def worker_pool(workers = None):
+    """
+    Returns a pool of the given number of worker processes (default: number of CPUs).
+    The workers are forked with any default start method of the platform: a spawned worker
+    would import the settings again without django.setup() and could not run compute_shard.
+    """
+    return ProcessPoolExecutor(
+        max_workers = workers,
+        mp_context = multiprocessing.get_context('fork'),
+        initializer = _close_connections
+    )
+
+
+def compute_statistics(reference_date = None, workers = None, chunk_size = None):
+    """
+    Computes and stores the summaries of the statistics of all users on the reference_date (default: today).
+    Shards of the users are computed by the given number of worker processes (default: number of CPUs),
+    a single worker computes them in the current process.
+    Yields BatchProgress after every shard.
+    """
+    reference_date = reference_date or date.today()
+    user_shards = shards(chunk_size)
+    progress = BatchProgress()
+    start = time.perf_counter()
+
+    if workers == 1:
+        for user_ids in user_shards:
+            progress.users += compute_shard(user_ids, reference_date)
+            progress.seconds = time.perf_counter() - start
+            yield progress
+        return
+
+    _close_connections()
+    with worker_pool(workers) as executor:
+        for users in executor.map(compute_shard, user_shards, [reference_date] * len(user_shards)):
+            progress.users += users
+            progress.seconds = time.perf_counter() - start
+            yield progress
@@ -0,0 +1,119 @@
+"""
+Per-user cache of the statistics.
+
+The commitments used by the statistics (see utils.Commitments) are cached
+under a key built from the user, the reference date and the version of the statistics of the user.
+The version (see models.StatisticsVersion) is kept in the database and increased by the signals in signals.py
+every time a contract, saving or recurring saving of the user changes, so that old entries are never read again
+by any process, also if every process has its own cache.
+On a cache hit only the version is read and the committed amount is subtracted from the balance.
+The stored snapshots of the history of the statistics keep the version they were computed with,
+so they are outdated by the same change without being touched (see models.StatisticsSnapshot).
+
+Operations that change many costs at once (e.g. a bulk delete, which sends a signal for every row)
+run within invalidation_batch, so the version of every user is increased only once.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import StatisticsVersion
+
+# ids of the users invalidated within the current invalidation_batch, None outside of the batches
+_pending_invalidations = ContextVar('pending_invalidations', default = None)
+
+
+def statistics_version(user_id):
+    """
+    Returns current version of the statistics of the user.
+    """
+    return StatisticsVersion.of_user(user_id)
+
+
+async def astatistics_version(user_id):
+    """
+    Async version of statistics_version.
+    """
+    return await sync_to_async(statistics_version)(user_id)
+
+
+def invalidate_statistics(user_id):
+    """
+    Increases version of the statistics of the user, so that cached statistics
+    and stored snapshots of the statistics are not used anymore.
+    Within invalidation_batch the version is increased at the end of the batch.
+    """
+    pending = _pending_invalidations.get()
+    if pending is not None:
+        pending.add(user_id)
+        return
+    _increase_version(user_id)
+
+
+@contextmanager
+def invalidation_batch():
+    """
+    Collects the invalidations of the enclosed block and invalidates the statistics
+    of every collected user once at the end of the block.
+    """
+    if _pending_invalidations.get() is not None:
+        # the enclosing batch invalidates the users
+        yield
+        return
+
+    pending = set()
+    token = _pending_invalidations.set(pending)
+    try:
+        yield
+    finally:
+        _pending_invalidations.reset(token)
+        for user_id in pending:
+            _increase_version(user_id)
+
+
+def _increase_version(user_id):
+    if StatisticsVersion.objects.filter(user_id=user_id).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            StatisticsVersion.objects.create(user_id=user_id, version=1)
+    except IntegrityError:
+        # created by another request in the meantime
+        StatisticsVersion.objects.filter(user_id=user_id).update(version=F('version') + 1)
+
+
+def _commitments_key(user_id, reference_date, version):
+    return f"commitments:{user_id}:{reference_date.isoformat()}:{version}"
+
+
+def cached_commitments(user, reference_date, compute, version = None):
+    """
+    Returns commitments of the user (in the format of utils.Commitments.show()).
+    If they are not cached yet, they are computed by compute(user, reference_date).
+    The version of the statistics is read, unless it is given.
+    """
+    if version is None:
+        version = statistics_version(user.pk)
+    key = _commitments_key(user.pk, reference_date, version)
+    commitments = cache.get(key)
+    if commitments is None:
+        commitments = compute(user, reference_date)
+        cache.set(key, commitments, settings.STATISTICS_CACHE_TIMEOUT)
+    return commitments
+
+
+async def acached_commitments(user, reference_date, compute, version = None):
+    """
+    Async version of cached_commitments, compute is a coroutine function.
+    """
+    if version is None:
+        version = await astatistics_version(user.pk)
+    key = _commitments_key(user.pk, reference_date, version)
+    commitments = await cache.aget(key)
+    if commitments is None:
+        commitments = await compute(user, reference_date)
+        await cache.aset(key, commitments, settings.STATISTICS_CACHE_TIMEOUT)
+    return commitments
@@ -1,8 +1,37 @@
-from datetime import date
-from django.test import TestCase
-from .models import Contract, User, Frequency, Saving, RecurringSaving
+from datetime import date, datetime, timezone
+import asyncio
+import io
+import json
+import os
+import pstats
+import random
+import tempfile
+from unittest import skipUnless
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from .models import Contract, User, Frequency, Saving, RecurringSaving, RevokedToken, StatisticsSummary, StatisticsVersion
 from dateutil.relativedelta import relativedelta
 from .utils import StatisticContract, StatisticSaving, Statistics
+from . import statistics_batch
+from . import serializers
+from .rendering import compile_encoders, encode_rows
+from .authentication import SALT, issue_token, revoked_tokens, user_cache
+from . import profiling
+from . import vectorized
+from .profiling import ProfilingMiddleware
+from .routers import REPLICA_STICKY_COOKIE, PrimaryReplicaRouter, ReplicaRoutingMiddleware
+from .views import ContractsList, StatisticsView
+from .events import compute_events
+from .money import from_cents, to_cents
 
 class ContractTestCase(TestCase):
     @staticmethod
@@ -120,6 +149,39 @@ class ContractTestCase(TestCase):
         reference_day = date(2022, 9, 30)
         self.assertEqual(contract.compute_next_billing_day(reference_day), None)
 
+    def test_compute_next_billing_day_matches_step_by_step_computation(self):
+        """Next billing day is the same as when adding the billing period step by step, for random dates 1970 - 2100"""
+        def next_billing_day_step_by_step(first_billing_day, period_in_months, reference_day):
+            billing_day = first_billing_day
+            while billing_day <= reference_day:
+                billing_day = billing_day + relativedelta(months=+period_in_months)
+            return billing_day
+
+        testing_user = User.objects.get(username = "Testing user")
+        randomizer = random.Random(20221018)
+        first_possible_day = date(1970, 1, 1).toordinal()
+        last_possible_day = date(2100, 12, 31).toordinal()
+
+        for _ in range(500):
+            first_billing_day = date.fromordinal(randomizer.randint(first_possible_day, last_possible_day))
+            reference_day = date.fromordinal(randomizer.randint(first_possible_day, last_possible_day))
+            frequency = randomizer.choice(Frequency.values)
+            contract = Contract(user = testing_user, first_billing_day = first_billing_day, billing_frequency = frequency)
+
+            self.assertEqual(
+                contract.compute_next_billing_day(reference_day),
+                next_billing_day_step_by_step(first_billing_day, frequency, reference_day),
+                f"first_billing_day={first_billing_day}, reference_day={reference_day}, frequency={frequency}"
+            )
+
+    def test_compute_next_billing_day_end_of_month_clamping_is_kept(self):
+        """Next billing day keeps the day shortened by a short month for all following billing days"""
+        testing_user = User.objects.get(username = "Testing user")
+        contract = ContractTestCase.createSampleContract(12, testing_user, first_billing_day = date(2012, 1, 31))
+        self.assertEqual(contract.compute_next_billing_day(date(2012, 2, 1)), date(2012, 2, 29))
+        self.assertEqual(contract.compute_next_billing_day(date(2012, 3, 1)), date(2012, 3, 29))
+        self.assertEqual(contract.compute_next_billing_day(date(2022, 9, 30)), date(2022, 10, 28))
+
     def test_compute_amount_to_store_monthly(self):
         """Amount to store for billing frequency: monthy equals: 
         - 100% if billing_day comes sooner than beginning of next month
@@ -417,6 +479,42 @@ class RecurringSavingTestCase(TestCase):
         reference_date = date(2023, 1, 10)
         self.assertEqual(saving.saved_amount(reference_date), 300)
 
+    def test_saved_amount_matches_step_by_step_computation(self):
+        "Saved amount is the same as when adding the amount for each saving period step by step, for random dates 1970 - 2100"
+        def saved_amount_step_by_step(saving, reference_date):
+            save_day = saving.start_date
+            end_day = saving.end_date if saving.end_date is not None and saving.end_date < reference_date else reference_date
+            total_saved = 0
+            while save_day <= end_day:
+                total_saved += saving.amount
+                save_day = save_day + relativedelta(months=+saving.frequency)
+            return total_saved
+
+        testing_user = User.objects.get(username = "Testing user")
+        randomizer = random.Random(20221018)
+        first_possible_day = date(1970, 1, 1).toordinal()
+        last_possible_day = date(2100, 12, 31).toordinal()
+
+        for _ in range(500):
+            start_date, end_date, reference_date = sorted(
+                date.fromordinal(randomizer.randint(first_possible_day, last_possible_day)) for _ in range(3)
+            )
+            if randomizer.random() < 0.5:
+                end_date, reference_date = reference_date, end_date
+            saving = RecurringSaving(
+                user = testing_user,
+                amount = 150,
+                start_date = start_date,
+                end_date = randomizer.choice([None, end_date]),
+                frequency = randomizer.choice(Frequency.values)
+            )
+
+            self.assertEqual(
+                saving.saved_amount(reference_date),
+                saved_amount_step_by_step(saving, reference_date),
+                f"start_date={start_date}, end_date={saving.end_date}, reference_date={reference_date}, frequency={saving.frequency}"
+            )
+
 
 class UserTestCase(TestCase):
     def setUp(self):
@@ -441,6 +539,63 @@ class UserTestCase(TestCase):
         self.assertEqual(User.objects.get(username = "FirstDay10").beginning_of_next_month(reference_date), date(2023, 3, 10))
         self.assertEqual(User.objects.get(username = "FirstDay31").beginning_of_next_month(reference_date), date(2023, 3, 31))
 
+    def test_beginnings_after_short_month(self):
+        "Beginnings of the months keep the day clamped by a shorter month"
+        user = User.objects.get(username = "FirstDay31")
+        self.assertEqual(user.beginning_of_next_month(date(2023, 2, 28)), date(2023, 3, 28))
+        self.assertEqual(user.beginning_of_next_month(date(2023, 4, 30)), date(2023, 5, 30))
+        self.assertEqual(user.beginning_of_current_month(date(2023, 6, 10)), date(2023, 5, 30))
+        self.assertEqual(user.beginning_of_current_month(date(2023, 6, 30)), date(2023, 6, 30))
+
+        user = User.objects.create(username = "FirstDay29", first_day_of_the_month = 29)
+        self.assertEqual(user.beginning_of_next_month(date(2023, 2, 28)), date(2023, 3, 28))
+        self.assertEqual(user.beginning_of_next_month(date(2024, 2, 28)), date(2024, 2, 29))
+        self.assertEqual(user.beginning_of_next_month(date(2024, 2, 29)), date(2024, 3, 29))
+        self.assertEqual(user.beginning_of_current_month(date(2023, 3, 10)), date(2023, 2, 28))
+
+    def test_count_month_beginnings(self):
+        "Beginnings of the months between two days are counted without the days themselves"
+        boundaries = User.objects.get(username = "FirstDay10").month_boundaries()
+        self.assertEqual(boundaries.count_between(date(2023, 3, 9), date(2023, 3, 11)), 1)
+        self.assertEqual(boundaries.count_between(date(2023, 3, 10), date(2023, 4, 10)), 0)
+        self.assertEqual(boundaries.count_between(date(2023, 3, 9), date(2023, 6, 10)), 3)
+        self.assertEqual(boundaries.count_between(date(2023, 3, 9), date(2023, 3, 9)), 0)
+
+        boundaries = User.objects.get(username = "FirstDay31").month_boundaries()
+        # 28.02, 28.03, 28.04 and 28.05
+        self.assertEqual(boundaries.count_between(date(2023, 1, 31), date(2023, 5, 31)), 4)
+        self.assertEqual(boundaries.count_between(date(2023, 2, 28), date(2023, 3, 30)), 1)
+        # 31.03, 30.04, 30.05, ... the day stays 28 from February 2024 on
+        self.assertEqual(boundaries.count_between(date(2023, 3, 1), date(2023, 6, 30)), 3)
+        self.assertEqual(boundaries.count_between(date(2023, 3, 1), date(2025, 3, 29)), 25)
+        self.assertIs(boundaries, User.objects.get(username = "FirstDay31").month_boundaries())
+
+    def test_count_month_beginnings_equal_to_relativedelta(self):
+        "Counted beginnings of the months are the same as stepping through the months with relativedelta"
+        randomizer = random.Random(19)
+        for first_day_of_the_month in [1, 15, 28, 29, 30, 31]:
+            user = User(first_day_of_the_month = first_day_of_the_month)
+            for _ in range(50):
+                start_date = date(2022, 1, 1) + relativedelta(days = randomizer.randint(0, 800))
+                end_date = start_date + relativedelta(days = randomizer.randint(0, 1200))
+                beginning = user.beginning_of_next_month(start_date)
+                count = 0
+                while beginning < end_date:
+                    count += 1
+                    beginning += relativedelta(months = 1)
+                self.assertEqual(user.month_boundaries().count_between(start_date, end_date), count, msg = (first_day_of_the_month, start_date, end_date))
+
+    def test_amount_to_store_after_short_month(self):
+        "Amount to store for a user with the first day 31 follows the beginnings of the months"
+        user = User.objects.get(username = "FirstDay31")
+        contract = ContractTestCase.createSampleContract(1, user, frequency = Frequency.QUARTERLY, first_billing_day = date(2022, 6, 15), amount = 300)
+
+        # beginnings until the billing day 15.06.2023: 31.03, 30.04 and 30.05
+        self.assertEqual(contract.compute_amount_to_store_regarding_first_day_of_month(date(2023, 3, 30)), 0)
+        self.assertEqual(contract.compute_amount_to_store_regarding_first_day_of_month(date(2023, 3, 31)), 100)
+        self.assertEqual(contract.compute_amount_to_store_regarding_first_day_of_month(date(2023, 5, 30)), 200)
+        self.assertEqual(contract.compute_amount_to_store_regarding_first_day_of_month(date(2023, 5, 31)), 300)
+
     def test_create_statistics_one_contract_monthly(self):
         "Statistics are computed correctly for user with one contract with billing frequency: monthly"
         user =  User.objects.create(username = "StatisticsContractMonthly", first_day_of_the_month = 5)
@@ -835,4 +990,1464 @@ class UserTestCase(TestCase):
         statistics = user.create_statistics(10000, reference_date)
         self.assertEqual(statistics.balance, 5700)
         self.assertCountEqual(statistics.savings, savings)
-        self.assertCountEqual(statistics.active_contracts, active_contracts)
\ No newline at end of file
+        self.assertCountEqual(statistics.active_contracts, active_contracts)
+
+class StatisticsQueriesTestCase(TestCase):
+    @staticmethod
+    def createSampleItems(user, count, first_pk):
+        for pk in range(first_pk, first_pk + count):
+            ContractTestCase.createSampleContract(pk, user, first_billing_day = date(2012, 5, 20), frequency = Frequency.QUARTERLY)
+            SavingTestCase.createSampleSaving(pk, user)
+            RecurringSavingTestCase.createSampleRecurringSaving(pk, user, start_date = date(2012, 1, 31))
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username = "StatisticsQueries", first_day_of_the_month = 10)
+
+    def test_create_statistics_number_of_queries(self):
+        "Statistics need one query per cost type no matter how many contracts and savings the user has"
+        reference_date = date(2022, 10, 18)
+        StatisticsQueriesTestCase.createSampleItems(self.user, 1, 1)
+        user = User.objects.get(pk = self.user.pk)
+        with self.assertNumQueries(3):
+            user.create_statistics(10000, reference_date)
+
+        StatisticsQueriesTestCase.createSampleItems(self.user, 50, 2)
+        user = User.objects.get(pk = self.user.pk)
+        with self.assertNumQueries(3):
+            statistics = user.create_statistics(10000, reference_date)
+        self.assertEqual(len(statistics.active_contracts), 51)
+        self.assertEqual(len(statistics.savings), 102)
+
+    def test_statistics_endpoint_number_of_queries(self):
+        "Statistics endpoint does not fetch the user again for every contract"
+        StatisticsQueriesTestCase.createSampleItems(self.user, 20, 1)
+        client = APIClient()
+        client.force_authenticate(user = self.user)
+        # the version of the statistics (see statistics_cache.py) and one query per cost type
+        with self.assertNumQueries(4):
+            response = client.post("/statistics/", {"balance": 10000}, format = "json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(response.data["active_contracts"]), 20)
+
+    @skipUnless(vectorized.available(), "numpy is not installed")
+    @override_settings(VECTORIZED_STATISTICS_THRESHOLD = 10)
+    def test_engine_chosen_without_query(self):
+        "Statistics engine is chosen by the number of the fetched costs, without an additional query"
+        StatisticsQueriesTestCase.createSampleItems(self.user, 20, 1)
+        client = APIClient()
+        client.force_authenticate(user = self.user)
+        # the version of the statistics and one query per cost type
+        with self.assertNumQueries(4):
+            response = client.post("/statistics/", {"balance": 10000}, format = "json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, self.user.create_statistics(10000, date.today()).show())
+
+
+@skipUnless(vectorized.available(), "numpy is not installed")
+class VectorizedStatisticsTestCase(TestCase):
+    @staticmethod
+    def createRandomItems(user, randomizer, count):
+        first_possible_day = date(1970, 1, 1).toordinal()
+        last_possible_day = date(2030, 12, 31).toordinal()
+
+        def random_day():
+            return date.fromordinal(randomizer.randint(first_possible_day, last_possible_day))
+
+        for pk in range(1, count + 1):
+            ContractTestCase.createSampleContract(
+                pk,
+                user,
+                frequency = randomizer.choice(Frequency.values),
+                first_billing_day = random_day(),
+                end_date = randomizer.choice([None, random_day()]),
+                amount = randomizer.randint(1, 100000) / 100
+            )
+            SavingTestCase.createSampleSaving(
+                pk,
+                user,
+                amount = randomizer.randint(1, 100000) / 100,
+                pay_out_day = randomizer.choice([None, random_day()])
+            )
+            RecurringSavingTestCase.createSampleRecurringSaving(
+                pk,
+                user,
+                start_date = random_day(),
+                amount = randomizer.randint(1, 100000) / 100,
+                pay_out_day = randomizer.choice([None, random_day()]),
+                end_date = randomizer.choice([None, random_day()]),
+                frequency = randomizer.choice(Frequency.values)
+            )
+
+    def test_create_statistics_matches_model_statistics(self):
+        "Vectorized statistics are identical to the statistics computed by the user model"
+        randomizer = random.Random(20221018)
+        for first_day_of_the_month in [1, 10, 29, 31]:
+            user = User.objects.create(username = f"Vectorized_{first_day_of_the_month}", first_day_of_the_month = first_day_of_the_month)
+            VectorizedStatisticsTestCase.createRandomItems(user, randomizer, 100)
+
+            for _ in range(10):
+                reference_date = date.fromordinal(randomizer.randint(date(1990, 1, 1).toordinal(), date(2030, 12, 31).toordinal()))
+                self.assertEqual(
+                    vectorized.create_statistics(user, 10000, reference_date),
+                    user.create_statistics(10000, reference_date).show(),
+                    f"first_day_of_the_month={first_day_of_the_month}, reference_date={reference_date}"
+                )
+            Contract.objects.all().delete()
+            Saving.objects.all().delete()
+            RecurringSaving.objects.all().delete()
+
+    def test_create_statistics_contract_ending_before_next_billing(self):
+        "Nothing is stored for a contract that ends before its next billing day"
+        user = User.objects.create(username = "VectorizedEndDate", first_day_of_the_month = 5)
+        ContractTestCase.createSampleContract(1, user, first_billing_day = date(2022, 5, 20), end_date = date(2022, 10, 10), amount = 200)
+
+        expected_statistics = {
+            "disponible": 10000,
+            "savings": [],
+            "active_contracts": [
+                {"name": "contract_1", "billing_date": None, "amount": 200, "stored_until_next_billing": 0}
+            ]
+        }
+        self.assertEqual(vectorized.create_statistics(user, 10000, date(2022, 10, 1)), expected_statistics)
+        self.assertEqual(user.create_statistics(10000, date(2022, 10, 1)).show(), expected_statistics)
+
+    @override_settings(VECTORIZED_STATISTICS_THRESHOLD = 1)
+    def test_statistics_endpoint_uses_vectorized_engine(self):
+        "Statistics endpoint computes the statistics with the vectorized engine for users with many costs"
+        cache.clear()
+        user = User.objects.create(username = "VectorizedEndpoint", first_day_of_the_month = 5)
+        VectorizedStatisticsTestCase.createRandomItems(user, random.Random(1), 4)
+        client = APIClient()
+        client.force_authenticate(user = user)
+
+        response = client.post("/statistics/", {"balance": 10000}, format = "json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, user.create_statistics(10000, date.today()).show())
+
+
+class StatisticsCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username = "StatisticsCache", first_day_of_the_month = 5)
+        self.client = APIClient()
+        self.client.force_authenticate(user = self.user)
+        ContractTestCase.createSampleContract(1, self.user, first_billing_day = date(2022, 5, 20), amount = 0.1, frequency = Frequency.QUARTERLY)
+        SavingTestCase.createSampleSaving(1, self.user, amount = 0.2)
+        RecurringSavingTestCase.createSampleRecurringSaving(1, self.user, start_date = date(2022, 1, 31), amount = 0.7)
+
+    def test_cached_statistics_for_other_balance(self):
+        "Cached statistics are not computed again and give the same result as the statistics of the user"
+        response = self.client.post("/statistics/", {"balance": 10000}, format = "json")
+        self.assertEqual(response.data, self.user.create_statistics(10000, date.today()).show())
+
+        # only the version of the statistics
+        with self.assertNumQueries(1):
+            response = self.client.post("/statistics/", {"balance": 123.45}, format = "json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data, self.user.create_statistics(123.45, date.today()).show())
+
+    def test_statistics_invalidated_by_changes_of_costs(self):
+        "Cached statistics are computed again after a contract, saving or recurring saving changes"
+        self.client.post("/statistics/", {"balance": 10000}, format = "json")
+
+        SavingTestCase.createSampleSaving(2, self.user, amount = 1000)
+        response = self.client.post("/statistics/", {"balance": 10000}, format = "json")
+        self.assertEqual(len(response.data["savings"]), 3)
+
+        contract = Contract.objects.get(pk = 1)
+        contract.amount = 300
+        contract.save()
+        response = self.client.post("/statistics/", {"balance": 10000}, format = "json")
+        self.assertEqual(response.data["active_contracts"][0]["amount"], 300)
+
+        RecurringSaving.objects.get(pk = 1).delete()
+        response = self.client.post("/statistics/", {"balance": 10000}, format = "json")
+        self.assertEqual(response.data, self.user.create_statistics(10000, date.today()).show())
+
+    def test_statistics_invalidated_by_other_process(self):
+        "Statistics cached by a process are not used after the costs were changed by another process with another cache"
+        self.client.post("/statistics/", {"balance": 10000}, format = "json")
+
+        other_process_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-process'}}
+        with override_settings(CACHES = other_process_cache):
+            contract = Contract.objects.get(pk = 1)
+            contract.amount = 300
+            contract.save()
+
+        response = self.client.post("/statistics/", {"balance": 10000}, format = "json")
+        self.assertEqual(response.data["active_contracts"][0]["amount"], 300)
+        self.assertEqual(response.data, self.user.create_statistics(10000, date.today()).show())
+
+    def test_statistics_invalidated_by_first_day_of_the_month(self):
+        "Cached statistics are computed again after the first day of the month of the user changes"
+        self.client.post("/statistics/", {"balance": 10000}, format = "json")
+
+        self.user.first_day_of_the_month = 20
+        self.user.save()
+        # the version of the statistics and one query per cost type
+        with self.assertNumQueries(4):
+            self.client.post("/statistics/", {"balance": 10000}, format = "json")
+
+
+class CommitmentsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username = "Commitments", first_day_of_the_month = 5)
+        ContractTestCase.createSampleContract(1, self.user, first_billing_day = date(2022, 5, 20), amount = 2100, frequency = Frequency.QUARTERLY)
+        SavingTestCase.createSampleSaving(1, self.user, amount = 2000)
+        RecurringSavingTestCase.createSampleRecurringSaving(1, self.user, start_date = date(2022, 5, 20), amount = 100)
+
+    def test_commitments(self):
+        "Commitments contain the total committed amount and the amounts for each contract and saving"
+        commitments = self.user.create_commitments(date(2022, 9, 5))
+        self.assertEqual(commitments.total(), 3100)
+        self.assertEqual(commitments.statistics(10000), self.user.create_statistics(10000, date(2022, 9, 5)))
+        self.assertEqual(commitments.statistics(500).balance, -2600)
+        self.assertEqual(commitments.show()["committed"], 3100)
+        self.assertCountEqual(commitments.savings, [
+            StatisticSaving("saving_1", False, 2000),
+            StatisticSaving("recurring_saving_1", True, 400)
+        ])
+
+    def test_statistics_batch_endpoint(self):
+        "Batch endpoint returns the commitments and disponible amount for every given balance"
+        client = APIClient()
+        client.force_authenticate(user = self.user)
+        commitments = self.user.create_commitments(date.today())
+
+        response = client.post("/statistics/batch/", {"balances": [10000, 0, 2500.5]}, format = "json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["committed"], commitments.total())
+        self.assertEqual(len(response.data["active_contracts"]), 1)
+        self.assertEqual(response.data["disponible"], [
+            commitments.statistics(balance).balance for balance in [10000, 0, 2500.5]
+        ])
+
+        response = client.post("/statistics/batch/", {"balances": []}, format = "json")
+        self.assertEqual(response.status_code, 400)
+
+
+class CostListTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username = "CostList")
+        self.client = APIClient()
+        self.client.force_authenticate(user = self.user)
+        for pk in range(1, 26):
+            ContractTestCase.createSampleContract(pk, self.user, first_billing_day = date(2022, 1, 1) + relativedelta(days = 25 - pk))
+            SavingTestCase.createSampleSaving(pk, self.user)
+        other_user = User.objects.create(username = "OtherCostList")
+        ContractTestCase.createSampleContract(100, other_user)
+
+    def test_list_without_pagination(self):
+        "List of all costs of the user is returned if no page is requested"
+        response = self.client.get("/contracts/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 25)
+        self.assertEqual(set(response.data[0]), {"id", "name", "description", "amount", "first_billing_day", "end_date", "billing_frequency"})
+
+    def test_cursor_pagination(self):
+        "Costs are returned page by page following the cursors"
+        ids = []
+        url = "/contracts/?page_size=10"
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data["results"]), 10)
+            ids += [contract["id"] for contract in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(ids, list(range(1, 26)))
+
+    def test_cursor_pagination_ordered_by_date(self):
+        "Costs can be paginated by date"
+        response = self.client.get("/contracts/", {"page_size": 5, "ordering": "first_billing_day"})
+        self.assertEqual([contract["id"] for contract in response.data["results"]], [25, 24, 23, 22, 21])
+
+        response = self.client.get("/savings/", {"page_size": 5, "ordering": "pay_out_day"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_field_selection(self):
+        "Only the requested fields are selected and returned"
+        # the version of the data for the ETag and the list
+        with self.assertNumQueries(2):
+            response = self.client.get("/savings/", {"fields": "name,amount", "page_size": 3})
+        self.assertEqual(response.data["results"], [
+            {"name": "saving_1", "amount": 100},
+            {"name": "saving_2", "amount": 100},
+            {"name": "saving_3", "amount": 100}
+        ])
+
+        response = self.client.get("/recurring-savings/", {"fields": "name"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+        response = self.client.get("/contracts/", {"fields": "name,user"})
+        self.assertEqual(response.status_code, 400)
+
+
+class CostIndexesTestCase(TestCase):
+    def setUp(self):
+        for user_number in range(20):
+            user = User.objects.create(username = f"Indexes_{user_number}")
+            Contract.objects.bulk_create([
+                Contract(name = "contract", user = user, end_date = None if pk % 3 else date(2021, 1, 1)) for pk in range(50)
+            ])
+            Saving.objects.bulk_create([
+                Saving(name = "saving", user = user, pay_out_day = None if pk % 3 else date(2021, 1, 1)) for pk in range(50)
+            ])
+            RecurringSaving.objects.bulk_create([
+                RecurringSaving(name = "recurring_saving", user = user, pay_out_day = None if pk % 3 else date(2021, 1, 1)) for pk in range(50)
+            ])
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            if connection.vendor == "postgresql":
+                # the seeded tables are small enough for a sequential scan
+                cursor.execute("SET enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_names):
+        plan = queryset.explain()
+        self.assertTrue(any(index_name in plan for index_name in index_names), plan)
+        if connection.vendor == "sqlite":
+            self.assertNotRegex(plan, r"SCAN finance_api_\w+($|\n)", plan)
+
+    def test_active_contracts_use_index(self):
+        "Active contracts of the user are found with an index"
+        user = User.objects.get(username = "Indexes_3")
+        self.assertUsesIndex(user.contract.active(date(2022, 1, 1)), ["contract_user_end_date_idx", "contract_user_no_end_idx"])
+        self.assertEqual(user.contract.active(date(2022, 1, 1)).count(), 33)
+
+    def test_not_paid_out_savings_use_index(self):
+        "Savings and recurring savings of the user that are not paid out are found with an index"
+        user = User.objects.get(username = "Indexes_3")
+        self.assertUsesIndex(user.saving.not_paid_out(date(2022, 1, 1)), ["saving_user_pay_out_idx", "saving_user_no_pay_out_idx"])
+        self.assertUsesIndex(
+            user.recurringsaving.not_paid_out(date(2022, 1, 1)),
+            ["recurring_user_pay_out_idx", "recurring_user_no_pay_out_idx"]
+        )
+        self.assertEqual(user.saving.not_paid_out(date(2020, 1, 1)).count(), 50)
+        self.assertEqual(user.recurringsaving.not_paid_out(date(2021, 1, 1)).count(), 50)
+        self.assertEqual(user.recurringsaving.not_paid_out(date(2021, 1, 2)).count(), 33)
+
+
+class PrognoseTestCase(TestCase):
+    @staticmethod
+    def expensesStepByStep(user, reference_date, last_day):
+        "Amounts leaving the account after the reference_date until the last_day (inclusive)"
+        expenses = 0
+        for contract in user.contract.all():
+            billing_day = contract.first_billing_day
+            while billing_day <= last_day and (contract.end_date is None or billing_day <= contract.end_date):
+                if billing_day > reference_date:
+                    expenses += contract.amount
+                billing_day = billing_day + relativedelta(months=+contract.billing_frequency)
+        for saving in user.saving.all():
+            if saving.pay_out_day is not None and reference_date < saving.pay_out_day <= last_day:
+                expenses += saving.amount
+        for saving in user.recurringsaving.all():
+            if saving.pay_out_day is not None and reference_date <= saving.pay_out_day < last_day:
+                expenses += saving.saved_amount(saving.pay_out_day)
+        return expenses
+
+    def test_prognose_matches_statistics(self):
+        "Disponible amount in the prognose equals the statistics computed for the projected balance on every beginning of the month"
+        randomizer = random.Random(20221018)
+        for first_day_of_the_month in [1, 10, 28, 29, 30, 31]:
+            user = User.objects.create(username = f"Prognose_{first_day_of_the_month}", first_day_of_the_month = first_day_of_the_month)
+            VectorizedStatisticsTestCase.createRandomItems(user, randomizer, 15)
+
+            for reference_date in [date(2022, 10, 18), date(2025, 3, 17), date(2023, 1, 31)]:
+                prognose = user.create_prognose(10000, reference_date, 36, monthly_income = 1500)
+                self.assertEqual(len(prognose), 36)
+                for month, prognosed_month in enumerate(prognose):
+                    month_beginning = prognosed_month["month_beginning"]
+                    self.assertEqual(month_beginning, user.beginning_of_next_month(reference_date + relativedelta(months=month)))
+
+                    balance = 10000 + (month + 1) * 1500 - PrognoseTestCase.expensesStepByStep(user, reference_date, month_beginning)
+                    self.assertAlmostEqual(prognosed_month["balance"], balance, places = 6)
+                    self.assertAlmostEqual(
+                        prognosed_month["disponible"],
+                        user.create_statistics(balance, month_beginning).balance,
+                        places = 6,
+                        msg = f"first_day_of_the_month={first_day_of_the_month}, reference_date={reference_date}, month_beginning={month_beginning}"
+                    )
+            Contract.objects.all().delete()
+            Saving.objects.all().delete()
+            RecurringSaving.objects.all().delete()
+
+    def test_prognose_one_contract_quarterly(self):
+        "Prognose stores the contract amount month by month and pays it on the billing day"
+        user = User.objects.create(username = "PrognoseQuarterly", first_day_of_the_month = 5)
+        ContractTestCase.createSampleContract(1, user, first_billing_day = date(2022, 5, 20), amount = 2100, frequency = Frequency.QUARTERLY)
+
+        prognose = user.create_prognose(10000, date(2022, 8, 21), 4)
+        self.assertEqual(prognose, [
+            {"month_beginning": date(2022, 9, 5), "balance": 10000, "disponible": 9300},
+            {"month_beginning": date(2022, 10, 5), "balance": 10000, "disponible": 8600},
+            {"month_beginning": date(2022, 11, 5), "balance": 10000, "disponible": 7900},
+            {"month_beginning": date(2022, 12, 5), "balance": 7900, "disponible": 7200},
+        ])
+
+    def test_prognose_endpoint(self):
+        "Prognose endpoint returns the prognose for the requested number of months"
+        user = User.objects.create(username = "PrognoseEndpoint", first_day_of_the_month = 5)
+        SavingTestCase.createSampleSaving(1, user, amount = 2000)
+        client = APIClient()
+        client.force_authenticate(user = user)
+
+        response = client.post("/prognose/", {"balance": 10000, "months": 3, "monthly_income": 100}, format = "json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual([month["disponible"] for month in response.data], [8100, 8200, 8300])
+
+
+class BulkCostsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username = "Bulk")
+        self.client = APIClient()
+        self.client.force_authenticate(user = self.user)
+
+    @staticmethod
+    def createSampleRows(count):
+        return [{
+            "name": f"contract_{number}",
+            "description": "description",
+            "amount": 100,
+            "first_billing_day": "2022-01-15",
+            "end_date": "" if number % 2 else "2023-01-01",
+            "billing_frequency": 1,
+        } for number in range(count)]
+
+    def test_bulk_create(self):
+        "Costs from a JSON array are created in one request"
+        # the savepoint (2), one insert and the version of the statistics
+        with self.assertNumQueries(4):
+            response = self.client.post("/contracts/bulk/", self.createSampleRows(50), format = "json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 50)
+        self.assertEqual(self.user.contract.count(), 50)
+        self.assertEqual(self.user.contract.filter(end_date = None).count(), 25)
+        self.assertEqual(response.data[0]["id"], Contract.objects.get(name = "contract_0").pk)
+
+    def test_bulk_create_ndjson(self):
+        "Costs can be sent as newline delimited JSON"
+        body = '{"name": "saving_1", "description": "saving", "amount": 100, "pay_out_day": ""}\n' \
+            '\n' \
+            '{"name": "saving_2", "description": "saving", "amount": 200, "pay_out_day": "2023-01-01"}\n'
+        response = self.client.post("/savings/bulk/", body, content_type = "application/x-ndjson")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(self.user.saving.order_by("name").values_list("amount_cents", "pay_out_day")), [
+            (10000, None),
+            (20000, date(2023, 1, 1))
+        ])
+
+        response = self.client.post("/savings/bulk/", '{"name": "saving_3"}\n{"name": ', content_type = "application/x-ndjson")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("line 2", response.data["detail"])
+
+    def test_bulk_create_invalid_rows(self):
+        "Nothing is created if any row is invalid and the errors are returned per row"
+        rows = self.createSampleRows(3)
+        rows[1]["amount"] = "a lot"
+        response = self.client.post("/contracts/bulk/", rows, format = "json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"][0], {})
+        self.assertIn("amount", response.data["errors"][1])
+        self.assertEqual(response.data["errors"][2], {})
+        self.assertEqual(self.user.contract.count(), 0)
+
+        response = self.client.post("/contracts/bulk/", rows[0], format = "json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_update(self):
+        "Costs of the user are updated by id"
+        self.client.post("/contracts/bulk/", self.createSampleRows(3), format = "json")
+        other_contract = ContractTestCase.createSampleContract(100, User.objects.create(username = "OtherBulk"))
+
+        rows = list(self.user.contract.order_by("id").values("id", "name", "description", "first_billing_day", "billing_frequency"))
+        for row in rows:
+            row["amount"] = 300
+            row["end_date"] = ""
+        response = self.client.put("/contracts/bulk/", rows + [{**rows[0], "id": other_contract.pk}], format = "json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], [{}, {}, {}, {"id": ["Not found."]}])
+        self.assertEqual(self.user.contract.filter(amount_cents = 30000).count(), 0)
+
+        response = self.client.put("/contracts/bulk/", rows, format = "json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.user.contract.filter(amount_cents = 30000, end_date = None).count(), 3)
+        self.assertEqual(Contract.objects.get(pk = other_contract.pk).amount, 100)
+
+    def test_bulk_update_invalid_ids(self):
+        "Ids that are not integers and ids given more than once are rejected"
+        self.client.post("/contracts/bulk/", self.createSampleRows(2), format = "json")
+        rows = list(self.user.contract.order_by("id").values("id", "name", "description", "first_billing_day", "billing_frequency"))
+        for row in rows:
+            row["amount"] = 300
+            row["end_date"] = ""
+
+        response = self.client.put("/contracts/bulk/", [{**rows[0], "id": [rows[0]["id"]]}, {**rows[1], "id": True}], format = "json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], [{"id": ["A valid integer is required."]}] * 2)
+
+        response = self.client.put("/contracts/bulk/", [rows[0], {**rows[1], "id": rows[0]["id"]}], format = "json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], [{}, {"id": ["Duplicate id."]}])
+        self.assertEqual(self.user.contract.filter(amount_cents = 30000).count(), 0)
+
+    def test_bulk_delete_invalid_ids(self):
+        "Ids that are not integers and ids given more than once are rejected"
+        self.client.post("/contracts/bulk/", self.createSampleRows(2), format = "json")
+        ids = list(self.user.contract.values_list("id", flat = True))
+
+        response = self.client.delete("/contracts/bulk/", [[ids[0]], {"id": ids[1]}, "1"], format = "json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], [{"id": ["A valid integer is required."]}] * 3)
+
+        response = self.client.delete("/contracts/bulk/", [ids[0], ids[0]], format = "json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], [{}, {"id": ["Duplicate id."]}])
+        self.assertEqual(self.user.contract.count(), 2)
+
+    def test_bulk_delete(self):
+        "Costs of the user are deleted by id"
+        self.client.post("/recurring-savings/bulk/", [{
+            "name": f"recurring_{number}",
+            "description": "recurring",
+            "amount": 50,
+            "start_date": "2022-01-01",
+            "end_date": "",
+            "pay_out_day": "",
+            "frequency": 1
+        } for number in range(4)], format = "json")
+        ids = list(self.user.recurringsaving.values_list("id", flat = True))
+
+        response = self.client.delete("/recurring-savings/bulk/", ids[:2] + [1000], format = "json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.user.recurringsaving.count(), 4)
+
+        response = self.client.delete("/recurring-savings/bulk/", ids[:2], format = "json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {"deleted": 2})
+        self.assertEqual(list(self.user.recurringsaving.values_list("id", flat = True)), ids[2:])
+
+    def test_bulk_delete_invalidates_once(self):
+        "Statistics are invalidated once per bulk delete, not once per deleted row"
+        self.client.post("/contracts/bulk/", self.createSampleRows(200), format = "json")
+        ids = list(self.user.contract.values_list("id", flat = True))
+        version = StatisticsVersion.of_user(self.user.pk)
+
+        # the ids, the contracts, two batches of contracts, the savepoint (2) and one update of the version
+        with self.assertNumQueries(7):
+            response = self.client.delete("/contracts/bulk/", ids, format = "json")
+        self.assertEqual(response.data, {"deleted": 200})
+        self.assertEqual(StatisticsVersion.of_user(self.user.pk), version + 1)
+
+    def test_bulk_changes_invalidate_statistics(self):
+        "Statistics are computed again after a bulk change"
+        response = self.client.post("/statistics/", {"balance": 1000}, format = "json")
+        self.assertEqual(response.data["active_contracts"], [])
+
+        rows = self.createSampleRows(2)
+        for row in rows:
+            row["end_date"] = ""
+        self.client.post("/contracts/bulk/", rows, format = "json")
+        response = self.client.post("/statistics/", {"balance": 1000}, format = "json")
+        self.assertEqual(len(response.data["active_contracts"]), 2)
+
+
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username = "Profiling")
+        self.client = APIClient()
+        self.client.force_authenticate(user = self.user)
+        ContractTestCase.createSampleContract(1, self.user)
+        self.profiles = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profiles.cleanup)
+
+    def test_server_timing(self):
+        "Wall time, database time and phases of the request are returned in the Server-Timing header"
+        with override_settings(PROFILING_ENABLED = True):
+            response = self.client.post("/statistics/", {"balance": 1000}, format = "json")
+        self.assertEqual(response.status_code, 202)
+        metrics = {metric.split(";")[0]: metric for metric in response["Server-Timing"].split(", ")}
+        self.assertIn("total", metrics)
+        self.assertIn('desc="4 queries"', metrics["db"])
+        self.assertIn("statistics.contracts", metrics)
+        self.assertIn("statistics.savings", metrics)
+
+        with override_settings(PROFILING_ENABLED = True, PROFILING_DIRECTORY = self.profiles.name):
+            response = self.client.get("/contracts/")
+        self.assertIn("serializer;dur=", response["Server-Timing"])
+        self.assertEqual(os.listdir(self.profiles.name), [])
+
+    def test_disabled(self):
+        "Nothing is measured if the profiling is not enabled"
+        with override_settings(PROFILING_ENABLED = False):
+            response = self.client.get("/contracts/", HTTP_X_PROFILE = "1")
+        self.assertNotIn("Server-Timing", response)
+
+    def test_profile_dump(self):
+        "Profile is written for requests of staff users with the debug header and for slow requests"
+        self.user.is_staff = True
+        self.user.save()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION = f"Bearer {issue_token(self.user)}")
+        with override_settings(PROFILING_ENABLED = True, PROFILING_DIRECTORY = self.profiles.name):
+            self.client.get("/contracts/", HTTP_X_PROFILE = "1")
+            self.client.get("/contracts/")
+        profiles = os.listdir(self.profiles.name)
+        self.assertEqual(len(profiles), 1)
+        self.assertIn("GET-contracts", profiles[0])
+        stats = pstats.Stats(os.path.join(self.profiles.name, profiles[0]))
+        self.assertTrue(any("list_costs" in function for _, _, function in stats.stats))
+
+        with override_settings(PROFILING_ENABLED = True, PROFILING_DIRECTORY = self.profiles.name, PROFILING_SLOW_REQUEST_MS = 0):
+            self.client.post("/statistics/", {"balance": 1000}, format = "json")
+        self.assertEqual(len(os.listdir(self.profiles.name)), 2)
+
+    def test_profile_header_restricted(self):
+        "Debug header of anonymous and non-staff users is ignored unless DEBUG is set"
+        token = issue_token(self.user)
+        with override_settings(PROFILING_ENABLED = True, PROFILING_DIRECTORY = self.profiles.name):
+            APIClient().get("/contracts/", HTTP_X_PROFILE = "1")
+            self.client.get("/contracts/", HTTP_X_PROFILE = "1")
+            self.client = APIClient()
+            self.client.credentials(HTTP_AUTHORIZATION = f"Bearer {token}")
+            self.client.get("/contracts/", HTTP_X_PROFILE = "1")
+        self.assertEqual(os.listdir(self.profiles.name), [])
+
+        with override_settings(PROFILING_ENABLED = True, PROFILING_DIRECTORY = self.profiles.name, DEBUG = True):
+            APIClient().get("/contracts/", HTTP_X_PROFILE = "1")
+        self.assertEqual(len(os.listdir(self.profiles.name)), 1)
+
+    def test_profile_max_files(self):
+        "Only the newest profiles are kept"
+        with override_settings(PROFILING_ENABLED = True, PROFILING_DIRECTORY = self.profiles.name, PROFILING_MAX_FILES = 2, PROFILING_SLOW_REQUEST_MS = 0):
+            for url in ["/contracts/", "/savings/", "/recurring-savings/"]:
+                self.client.get(url)
+        profiles = sorted(os.listdir(self.profiles.name))
+        self.assertEqual(len(profiles), 2)
+        self.assertIn("GET-savings", profiles[0])
+        self.assertIn("GET-recurring_savings", profiles[1])
+
+    def test_async_middleware(self):
+        "Middleware runs the async handler without adapting it to a thread"
+        async def get_response(request):
+            with profiling.phase("view"):
+                return HttpResponse()
+
+        with override_settings(PROFILING_ENABLED = True):
+            middleware = ProfilingMiddleware(get_response)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        response = async_to_sync(middleware)(RequestFactory().get("/async/contracts/"))
+        self.assertIn("view;dur=", response["Server-Timing"])
+
+
+@override_settings(ASYNC_CONCURRENT_QUERIES = False)
+class AsyncViewsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username = "Async", email = "async@example.com")
+        self.client = APIClient()
+        self.client.force_authenticate(user = self.user)
+        for pk in range(1, 6):
+            ContractTestCase.createSampleContract(pk, self.user)
+            SavingTestCase.createSampleSaving(pk, self.user)
+            RecurringSavingTestCase.createSampleRecurringSaving(pk, self.user)
+
+    def test_statistics(self):
+        "Async statistics are equal to the statistics of the sync endpoint"
+        response = self.client.post("/async/statistics/", {"balance": 10000}, format = "json")
+        self.assertEqual(response.status_code, 202)
+        async_statistics = response.json()
+
+        cache.clear()
+        response = self.client.post("/statistics/", {"balance": 10000}, format = "json")
+        self.assertEqual(async_statistics, response.json())
+
+        response = self.client.post("/async/statistics/", {"balance": "a lot"}, format = "json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("balance", response.json())
+
+    def test_lists(self):
+        "Async lists are equal to the lists of the sync endpoints"
+        for url in ["contracts/", "savings/", "recurring-savings/", "savings/?fields=name"]:
+            response = self.client.get(f"/async/{url}")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), self.client.get(f"/{url}").json())
+
+        response = self.client.get("/async/contracts/?page_size=2")
+        self.assertEqual(response.json()["results"], self.client.get("/contracts/?page_size=2").json()["results"])
+        response = self.client.get(response.json()["next"])
+        self.assertEqual([contract["id"] for contract in response.json()["results"]], [3, 4])
+
+        response = self.client.get("/async/contracts/?fields=user")
+        self.assertEqual(response.status_code, 400)
+
+    def test_profile(self):
+        "Async profile shows the logged in user"
+        response = self.client.get("/async/profile/")
+        self.assertEqual(response.json(), {"username": "Async", "email": "async@example.com", "first_name": "", "last_name": ""})
+
+        response = self.client.post("/async/profile/")
+        self.assertEqual(response.status_code, 405)
+
+    def test_authentication_required(self):
+        "Async endpoints are available only for authenticated users"
+        client = APIClient()
+        for url in ["statistics/", "contracts/", "savings/", "recurring-savings/", "profile/"]:
+            self.assertEqual(client.get(f"/async/{url}").status_code, 403)
+
+
+class CostExportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username = "Export")
+        self.client = APIClient()
+        self.client.force_authenticate(user = self.user)
+        for pk in range(1, 6):
+            ContractTestCase.createSampleContract(pk, self.user, end_date = date(2023, 1, 1) if pk == 2 else None)
+        ContractTestCase.createSampleContract(100, User.objects.create(username = "OtherExport"))
+
+    @staticmethod
+    def content(response):
+        return b"".join(response.streaming_content).decode()
+
+    @override_settings(COST_EXPORT_CHUNK_SIZE = 2)
+    def test_csv_export(self):
+        "Contracts of the user are streamed as CSV"
+        response = self.client.get("/contracts/export/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn('filename="contracts.csv"', response["Content-Disposition"])
+
+        lines = self.content(response).splitlines()
+        self.assertEqual(lines[0], "id,name,description,amount,first_billing_day,end_date,billing_frequency")
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(lines[1], "1,contract_1,1 contract description,100.0,2020-01-01,,1")
+        self.assertEqual(lines[2].split(",")[5], "2023-01-01")
+
+    def test_ndjson_export(self):
+        "Savings of the user are streamed as newline delimited JSON"
+        SavingTestCase.createSampleSaving(1, self.user)
+        response = self.client.get("/savings/export/", {"type": "ndjson"})
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(rows, [{"id": 1, "name": "saving_1", "description": "1 saving description", "amount": 100.0, "pay_out_day": None}])
+
+        response = self.client.get("/recurring-savings/export/", {"type": "ndjson"})
+        self.assertEqual(self.content(response), "")
+
+        response = self.client.get("/savings/export/", {"type": "xml"})
+        self.assertEqual(response.status_code, 400)
+
+
+class CostImportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username = "Import")
+        self.client = APIClient()
+        self.client.force_authenticate(user = self.user)
+
+    @staticmethod
+    def createSampleFile(rows):
+        lines = ["id,name,description,amount,first_billing_day,end_date,billing_frequency"]
+        for number in range(rows):
+            lines.append(f"{number},contract_{number},,{number},2022-01-{number % 28 + 1:02d},{'' if number % 2 else '2023-01-01'},1")
+        return "\n".join(lines) + "\n"
+
+    def test_import_endpoint(self):
+        "Contracts are imported from the uploaded file in chunks, progress is streamed after every chunk"
+        content = self.createSampleFile(5) + "broken,,,a lot,,,\n"
+        uploaded_file = SimpleUploadedFile("contracts.csv", content.encode(), content_type = "text/csv")
+        with override_settings(COST_IMPORT_CHUNK_SIZE = 2):
+            response = self.client.post("/contracts/import/", {"file": uploaded_file}, format = "multipart")
+            self.assertEqual(response.status_code, 200)
+            progress = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+        self.assertEqual([(line["rows"], line["created"], line["failed"]) for line in progress], [(2, 2, 0), (4, 4, 0), (6, 5, 1)])
+        self.assertEqual(progress[-1]["errors"][0]["line"], 7)
+        self.assertEqual(set(progress[-1]["errors"][0]["errors"]), {"name", "amount"})
+        self.assertEqual(self.user.contract.count(), 5)
+        self.assertEqual(self.user.contract.filter(end_date = None, description = None).count(), 2)
+
+    def test_import_missing_columns(self):
+        "Files without the required columns are rejected"
+        uploaded_file = SimpleUploadedFile("savings.csv", b"amount\n100\n", content_type = "text/csv")
+        response = self.client.post("/savings/import/", {"file": uploaded_file}, format = "multipart")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post("/savings/import/", {}, format = "multipart")
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_can_be_imported(self):
+        "Exported recurring savings can be imported again"
+        RecurringSavingTestCase.createSampleRecurringSaving(1, self.user)
+        exported = b"".join(self.client.get("/recurring-savings/export/").streaming_content)
+
+        with tempfile.NamedTemporaryFile(suffix = ".csv") as csv_file:
+            csv_file.write(exported)
+            csv_file.flush()
+            output = io.StringIO()
+            call_command("import_costs", "Import", "recurring-savings", csv_file.name, stdout = output)
+
+        self.assertIn("Imported 1 of 1 rows.", output.getvalue())
+        self.assertEqual(self.user.recurringsaving.count(), 2)
+        self.assertEqual(
+            set(self.user.recurringsaving.values_list("name", "amount_cents", "start_date", "end_date", "pay_out_day", "frequency")),
+            set(self.user.recurringsaving.filter(pk = 1).values_list("name", "amount_cents", "start_date", "end_date", "pay_out_day", "frequency"))
+        )
+
+
+class EventsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username = "Calendar")
+        self.client = APIClient()
+        self.client.force_authenticate(user = self.user)
+
+    def getEvents(self, start_date, end_date):
+        response = self.client.get("/events/", {"from": start_date.isoformat(), "to": end_date.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        return [(event["date"], event["item_type"], event["item_id"], event["kind"], float(event["amount"])) for event in response.json()]
+
+    def test_events(self):
+        "Events of all items are ordered by date, billing days stay clamped after a short month"
+        ContractTestCase.createSampleContract(1, self.user, first_billing_day = date(2021, 1, 31), amount = 10)
+        ContractTestCase.createSampleContract(2, self.user, frequency = Frequency.QUARTERLY, first_billing_day = date(2021, 12, 15), amount = 20)
+        ContractTestCase.createSampleContract(3, self.user, end_date = date(2021, 12, 31))
+        SavingTestCase.createSampleSaving(1, self.user, amount = 30, pay_out_day = date(2022, 2, 28))
+        SavingTestCase.createSampleSaving(2, self.user, amount = 40)
+        RecurringSavingTestCase.createSampleRecurringSaving(
+            1, self.user, start_date = date(2021, 11, 1), amount = 50, frequency = Frequency.MONTHLY, pay_out_day = date(2022, 3, 1)
+        )
+
+        self.assertEqual(self.getEvents(date(2022, 1, 1), date(2022, 3, 31)), [
+            ("2022-01-01", "recurring_saving", 1, "saving", 50),
+            ("2022-01-28", "contract", 1, "billing", 10),
+            ("2022-02-01", "recurring_saving", 1, "saving", 50),
+            ("2022-02-28", "contract", 1, "billing", 10),
+            ("2022-02-28", "saving", 1, "pay_out", 30),
+            ("2022-03-01", "recurring_saving", 1, "saving", 50),
+            ("2022-03-01", "recurring_saving", 1, "pay_out", 250),
+            ("2022-03-15", "contract", 2, "billing", 20),
+            ("2022-03-28", "contract", 1, "billing", 10),
+        ])
+
+    def test_range_validation(self):
+        "Range requires both days in the right order and not longer than the maximal range"
+        response = self.client.get("/events/", {"from": "2022-01-01"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("to", response.json())
+
+        response = self.client.get("/events/", {"from": "2022-02-01", "to": "2022-01-01"})
+        self.assertEqual(response.status_code, 400)
+
+        with override_settings(EVENTS_MAX_RANGE_DAYS = 31):
+            response = self.client.get("/events/", {"from": "2022-01-01", "to": "2022-02-01"})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(self.client.get("/events/", {"from": "2022-01-01", "to": "2022-01-31"}).status_code, 200)
+
+    def test_billing_days_equal_to_contracts(self):
+        "Billing days of the events are the same as the next billing days computed by the contracts"
+        randomizer = random.Random(17)
+        frequencies = [choice for choice, _ in Frequency.choices]
+        for pk in range(1, 31):
+            ContractTestCase.createSampleContract(
+                pk,
+                self.user,
+                frequency = randomizer.choice(frequencies),
+                first_billing_day = date(2020, 1, 1) + relativedelta(days = randomizer.randint(0, 1000))
+            )
+        start_date, end_date = date(2022, 6, 1), date(2024, 6, 1)
+
+        events = self.user.create_events(start_date, end_date)
+        for contract in self.user.contract.all():
+            dates = [event["date"] for event in events if event["item_type"] == "contract" and event["item_id"] == contract.pk]
+            self.assertEqual(dates[0], contract.compute_next_billing_day(start_date - relativedelta(days = 1)))
+            for previous_date, next_date in zip(dates, dates[1:]):
+                self.assertEqual(contract.compute_next_billing_day(previous_date), next_date)
+            self.assertLess(end_date, contract.compute_next_billing_day(dates[-1]))
+
+    def test_events_of_many_items(self):
+        "Events of a year for 1000 items are computed in a single pass"
+        randomizer = random.Random(1000)
+        frequencies = [choice for choice, _ in Frequency.choices]
+        contracts = [
+            (pk, f"contract_{pk}", 10, date(2000, 1, 1) + relativedelta(days = randomizer.randint(0, 8000)), None, randomizer.choice(frequencies))
+            for pk in range(500)
+        ]
+        savings = [(pk, f"saving_{pk}", 10, date(2022, 1, 1) + relativedelta(days = pk)) for pk in range(250)]
+        recurring_savings = [
+            (pk, f"recurring_saving_{pk}", 10, date(2000, 1, 1) + relativedelta(days = randomizer.randint(0, 8000)), None, None, Frequency.MONTHLY)
+            for pk in range(250)
+        ]
+
+        events = compute_events(contracts, savings, recurring_savings, date(2022, 1, 1), date(2022, 12, 31))
+        self.assertEqual([event["date"] for event in events], sorted(event["date"] for event in events))
+        self.assertEqual(sum(event["item_type"] == "recurring_saving" for event in events), 250 * 12)
+        self.assertEqual(sum(event["item_type"] == "saving" for event in events), 250)
+
+
+class StatisticsHistoryTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username = "History", first_day_of_the_month = 15)
+        self.client = APIClient()
+        self.client.force_authenticate(user = self.user)
+
+    def createSampleItems(self, seed):
+        randomizer = random.Random(seed)
+        frequencies = [choice for choice, _ in Frequency.choices]
+
+        def random_day():
+            return date(2021, 1, 1) + relativedelta(days = randomizer.randint(0, 700))
+
+        for pk in range(1, 11):
+            ContractTestCase.createSampleContract(
+                pk,
+                self.user,
+                frequency = randomizer.choice(frequencies),
+                first_billing_day = random_day(),
+                end_date = random_day() if pk % 3 == 0 else None,
+                amount = randomizer.randint(1, 1000)
+            )
+            SavingTestCase.createSampleSaving(pk, self.user, amount = randomizer.randint(1, 1000), pay_out_day = random_day() if pk % 2 else None)
+            RecurringSavingTestCase.createSampleRecurringSaving(
+                pk,
+                self.user,
+                start_date = random_day(),
+                amount = randomizer.randint(1, 1000),
+                pay_out_day = random_day() if pk % 2 else None,
+                end_date = random_day() if pk % 4 == 0 else None,
+                frequency = randomizer.choice(frequencies)
+            )
+
+    def test_history_equal_to_statistics(self):
+        "Statistics of every day of the history are the same as the statistics computed on that day"
+        self.createSampleItems(18)
+        start_date = date(2022, 1, 15)
+        balances = [(date(2022, 1, 1), 1000), (date(2022, 4, 10), 2000)]
+
+        for first_day_of_the_month in [1, 15, 28, 29, 30, 31]:
+            self.user.first_day_of_the_month = first_day_of_the_month
+            self.user.save()
+            history = self.user.create_history(balances, start_date, date(2022, 8, 31))
+            self.assertEqual(len(history), 229)
+
+            for snapshot in history:
+                day = snapshot.show()
+                balance = 1000 if day["date"] < date(2022, 4, 10) else 2000
+                self.assertEqual(day["balance"], balance)
+                statistics = self.user.create_statistics(balance, day["date"])
+                self.assertAlmostEqual(day["disponible"], statistics.balance, places = 6, msg = day["date"])
+                self.assertAlmostEqual(day["saved"], sum(saving.total_saved for saving in statistics.savings), places = 6, msg = day["date"])
+
+    def test_history_of_far_future_billing(self):
+        "Amounts to store of a contract billed long after the range are the same as in the statistics"
+        ContractTestCase.createSampleContract(1, self.user, frequency = Frequency.ANNUALY, first_billing_day = date(2025, 6, 20), amount = 1200)
+        ContractTestCase.createSampleContract(2, self.user, frequency = Frequency.QUARTERLY, first_billing_day = date(2024, 2, 10), amount = 300)
+
+        for first_day_of_the_month in [15, 31]:
+            self.user.first_day_of_the_month = first_day_of_the_month
+            self.user.save()
+            history = self.user.create_history([(date(2022, 12, 1), 0)], date(2022, 12, 1), date(2023, 3, 31))
+            for snapshot in history:
+                day = snapshot.show()
+                statistics = self.user.create_statistics(0, day["date"])
+                self.assertAlmostEqual(day["disponible"], statistics.balance, places = 6, msg = day["date"])
+
+    def test_history_endpoint(self):
+        "History is computed, stored and read again from the snapshots"
+        ContractTestCase.createSampleContract(1, self.user, frequency = Frequency.QUARTERLY, first_billing_day = date(2022, 1, 20), amount = 300)
+        SavingTestCase.createSampleSaving(1, self.user, amount = 50, pay_out_day = date(2022, 2, 10))
+
+        response = self.client.post("/statistics/history/", {
+            "from": "2022-02-01",
+            "to": "2022-02-28",
+            "balances": [{"date": "2022-02-01", "balance": 1000}]
+        }, format = "json")
+        self.assertEqual(response.status_code, 202)
+        history = response.json()
+        self.assertEqual(len(history), 28)
+        self.assertEqual(history[0], {"date": "2022-02-01", "balance": 1000.0, "saved": 50.0, "stored": 0, "disponible": 950.0})
+        # the saving is paid out on 10.02, the first third of the contract is stored from 15.02
+        self.assertEqual(history[9]["saved"], 0)
+        self.assertEqual(history[13]["stored"], 0)
+        self.assertEqual(history[14]["stored"], 100)
+        self.assertEqual(self.user.statistics_snapshots.count(), 28)
+
+        response = self.client.get("/statistics/history/", {"from": "2022-02-10", "to": "2022-02-14"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), history[9:14])
+
+    def test_snapshots_outdated_after_change(self):
+        "Stored snapshots are not read after a change of the costs and replaced by the next stored history"
+        ContractTestCase.createSampleContract(1, self.user)
+        self.user.store_history(self.user.create_history([(date(2022, 1, 1), 1000)], date(2022, 1, 1), date(2022, 1, 31)))
+        response = self.client.get("/statistics/history/", {"from": "2022-01-01", "to": "2022-01-31"})
+        self.assertEqual(len(response.json()), 31)
+
+        with self.assertNumQueries(2):
+            # the saving and the version of the statistics, the snapshots are not deleted
+            SavingTestCase.createSampleSaving(1, self.user)
+        self.assertEqual(self.user.statistics_snapshots.count(), 31)
+        response = self.client.get("/statistics/history/", {"from": "2022-01-01", "to": "2022-01-31"})
+        self.assertEqual(response.json(), [])
+
+        self.user.store_history(self.user.create_history([(date(2022, 1, 1), 1000)], date(2022, 1, 10), date(2022, 1, 20)))
+        self.assertEqual(self.user.statistics_snapshots.count(), 11)
+        response = self.client.get("/statistics/history/", {"from": "2022-01-01", "to": "2022-01-31"})
+        self.assertEqual(len(response.json()), 11)
+
+    def test_history_validation(self):
+        "Balances are required and the first balance must not be after the first day"
+        response = self.client.post("/statistics/history/", {"from": "2022-02-01", "to": "2022-02-28", "balances": []}, format = "json")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post("/statistics/history/", {
+            "from": "2022-02-01",
+            "to": "2022-02-28",
+            "balances": [{"date": "2022-02-02", "balance": 1000}]
+        }, format = "json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("balances", response.json())
+
+
+class MoneyTestCase(TestCase):
+    def test_to_cents(self):
+        "Amounts are converted to whole cents without floating point errors"
+        self.assertEqual(to_cents(12), 1200)
+        self.assertEqual(to_cents(0.29), 29)
+        self.assertEqual(to_cents(1.005), 101)
+        self.assertEqual(to_cents("2500.50"), 250050)
+        self.assertEqual(from_cents(to_cents(0.1) + to_cents(0.2)), 0.3)
+
+    def test_amounts_in_cents(self):
+        "Amounts of the costs are stored in cents and returned in the major unit of the currency"
+        user = User.objects.create(username = "Money")
+        client = APIClient()
+        client.force_authenticate(user = user)
+
+        response = client.post("/savings/", {"name": "saving", "description": "saving", "amount": "0.29", "pay_out_day": ""}, format = "json")
+        self.assertEqual(response.data["amount"], 0.29)
+        saving = Saving.objects.get(user = user)
+        self.assertEqual(saving.amount_cents, 29)
+        self.assertEqual(client.get(f"/savings/{saving.pk}/").data["amount"], 0.29)
+
+        response = client.post("/savings/", {"name": "saving", "description": "saving", "amount": "0.001", "pay_out_day": ""}, format = "json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("amount", response.data)
+
+    def test_balances_rounded_to_cents(self):
+        "Balances with more decimal places than the amounts are rounded to whole cents"
+        user = User.objects.create(username = "MoneyBalance")
+        SavingTestCase.createSampleSaving(1, user, amount = 0.1)
+        client = APIClient()
+        client.force_authenticate(user = user)
+
+        response = client.post("/statistics/", {"balance": 10.125}, format = "json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["disponible"], 10.03)
+        response = client.post("/statistics/batch/", {"balances": ["10.124", 1e30]}, format = "json")
+        self.assertEqual(response.status_code, 400)
+        response = client.post("/statistics/batch/", {"balances": ["10.124", 0.001]}, format = "json")
+        self.assertEqual(response.data["disponible"], [10.02, -0.1])
+
+    def test_statistics_are_exact(self):
+        "Statistics of many small amounts are exact"
+        user = User.objects.create(username = "MoneyStatistics")
+        for pk in range(1, 11):
+            SavingTestCase.createSampleSaving(pk, user, amount = 0.1)
+        self.assertEqual(user.create_statistics(1, date(2022, 10, 1)).show()["disponible"], 0)
+
+
+def batch_chunk_size(_):
+    # runs in a worker process of statistics_batch.worker_pool
+    return settings.STATISTICS_BATCH_CHUNK_SIZE
+
+
+class StatisticsBatchTestCase(TestCase):
+    def setUp(self):
+        for number in range(7):
+            user = User.objects.create(username = f"Batch_{number}", first_day_of_the_month = [1, 15, 31][number % 3])
+            StatisticsQueriesTestCase.createSampleItems(user, number % 4, number * 10)
+
+    def test_summaries_equal_to_statistics(self):
+        "Summaries of all users are the same as the statistics of every user"
+        reference_date = date(2022, 10, 18)
+        progress = [batch.users for batch in statistics_batch.compute_statistics(reference_date, workers = 1, chunk_size = 3)]
+        self.assertEqual(progress, [3, 6, 7])
+
+        for user in User.objects.all():
+            commitments = user.create_commitments(reference_date)
+            summary = user.statistics_summaries.get(date = reference_date)
+            self.assertEqual(summary.show()["committed"], commitments.total())
+            self.assertEqual((summary.savings, summary.contracts), (len(commitments.savings), len(commitments.active_contracts)))
+
+    def test_queries_per_shard(self):
+        "Items of a shard are fetched with one query per model, independently of the number of users"
+        user_ids = list(User.objects.values_list("pk", flat = True))
+        with CaptureQueriesContext(connection) as queries:
+            statistics_batch.compute_shard(user_ids, date(2022, 10, 18))
+        self.assertEqual(len([query for query in queries if query["sql"].startswith("SELECT")]), 4)
+
+    @override_settings(STATISTICS_BATCH_CHUNK_SIZE = 3)
+    def test_workers_use_settings_of_parent_process(self):
+        "Worker processes are forked, so they use the settings of the parent process and not the imported settings module"
+        with statistics_batch.worker_pool(2) as executor:
+            self.assertEqual(list(executor.map(batch_chunk_size, range(2))), [3, 3])
+
+    def test_command(self):
+        "Command replaces the summaries of the day and reports the throughput"
+        output = io.StringIO()
+        call_command("compute_statistics", "--date", "2022-10-18", "--workers", "1", stdout = output)
+        call_command("compute_statistics", "--date", "2022-10-18", "--workers", "1", stdout = output)
+        self.assertIn("Statistics of 7 users computed", output.getvalue())
+        self.assertIn("users/s", output.getvalue())
+        self.assertEqual(StatisticsSummary.objects.filter(date = date(2022, 10, 18)).count(), 7)
+
+
+class RenderingTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username = "Rendering")
+        self.client = APIClient()
+        self.client.force_authenticate(user = self.user)
+        ContractTestCase.createSampleContract(1, self.user, amount = 12.34, end_date = date(2023, 1, 31))
+        ContractTestCase.createSampleContract(2, self.user, amount = 0.1)
+        SavingTestCase.createSampleSaving(1, self.user, amount = 99.99, pay_out_day = date(2023, 5, 1))
+        SavingTestCase.createSampleSaving(2, self.user)
+        RecurringSavingTestCase.createSampleRecurringSaving(1, self.user, amount = 7.5, pay_out_day = date(2024, 1, 1))
+
+    def test_rows_equal_to_serializer(self):
+        "Encoded rows are the same as the output of the serializers"
+        for model, serializer_class in [
+            (Contract, serializers.ContractSerializer),
+            (Saving, serializers.SavingSerializer),
+            (RecurringSaving, serializers.RecurringSavingSerializer),
+        ]:
+            queryset = model.objects.filter(user = self.user).order_by("id")
+            for fields in [None, frozenset(["name", "amount"]), frozenset(["end_date"]) if model is not Saving else frozenset(["id"])]:
+                encoders = compile_encoders(serializer_class, fields)
+                rows = queryset.values(*[source for _, source, _ in encoders])
+                self.assertEqual(
+                    json.dumps(encode_rows(rows, encoders)),
+                    json.dumps(serializer_class(queryset, many = True, fields = fields).data)
+                )
+
+    def test_list_endpoint(self):
+        "List endpoint returns the rows in the format of the serializer with one query"
+        # the version of the data for the ETag and the list
+        with self.assertNumQueries(2):
+            response = self.client.get("/contracts/", {"page_size": 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"], serializers.ContractSerializer(self.user.contract.order_by("id"), many = True).data)
+
+    def test_json_renderer(self):
+        "Responses are rendered as JSON"
+        response = self.client.get("/contracts/", HTTP_ACCEPT = "application/json")
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(response.json()[0]["amount"], 12.34)
+
+
+@override_settings(ASYNC_CONCURRENT_QUERIES = False)
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username = "Conditional", first_day_of_the_month = 5)
+        self.client = APIClient()
+        self.client.force_authenticate(user = self.user)
+        for pk in range(1, 4):
+            ContractTestCase.createSampleContract(pk, self.user)
+            SavingTestCase.createSampleSaving(pk, self.user)
+            RecurringSavingTestCase.createSampleRecurringSaving(pk, self.user)
+
+    def test_lists_not_modified(self):
+        "Lists with a matching ETag are answered with 304 without any query of the costs"
+        for url in ["/contracts/", "/savings/?fields=name", "/recurring-savings/?page_size=2", "/async/contracts/"]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            # only the version of the data, no query of the costs
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH = response["ETag"])
+            self.assertEqual(response.status_code, 304, url)
+
+    def test_etag_changes_with_costs(self):
+        "ETag of the list changes after a change of the costs of the user and differs between representations"
+        etag = self.client.get("/savings/")["ETag"]
+        self.assertNotEqual(self.client.get("/savings/?fields=name")["ETag"], etag)
+        self.assertNotEqual(self.client.get("/async/savings/")["ETag"], etag)
+
+        SavingTestCase.createSampleSaving(4, self.user)
+        response = self.client.get("/savings/", HTTP_IF_NONE_MATCH = etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 4)
+        self.assertNotEqual(response["ETag"], etag)
+
+        other_user = User.objects.create(username = "OtherConditional")
+        etag = response["ETag"]
+        SavingTestCase.createSampleSaving(5, other_user)
+        self.assertEqual(self.client.get("/savings/", HTTP_IF_NONE_MATCH = etag).status_code, 304)
+
+    def test_etag_changes_in_other_process(self):
+        "ETags change after a change of the costs handled by another process with another cache"
+        list_etag = self.client.get("/contracts/")["ETag"]
+        contract_etag = self.client.get("/contracts/1/")["ETag"]
+        statistics_etag = self.client.get("/statistics/", {"balance": 100})["ETag"]
+
+        other_process_cache = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-process'}}
+        with override_settings(CACHES = other_process_cache):
+            contract = Contract.objects.get(pk = 1)
+            contract.amount = 300
+            contract.save()
+
+        self.assertEqual(self.client.get("/contracts/", HTTP_IF_NONE_MATCH = list_etag).status_code, 200)
+        self.assertEqual(self.client.get("/contracts/1/", HTTP_IF_NONE_MATCH = contract_etag).status_code, 200)
+        response = self.client.get("/statistics/", {"balance": 100}, HTTP_IF_NONE_MATCH = statistics_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["active_contracts"][0]["amount"], 300)
+
+    def test_single_cost_not_modified(self):
+        "Single costs with a matching ETag are answered with 304 before the serialization"
+        response = self.client.get("/contracts/1/")
+        self.assertEqual(response.status_code, 200)
+        # the owner of the cost and the version of its data
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/contracts/1/", HTTP_IF_NONE_MATCH = response["ETag"]).status_code, 304)
+
+        contract = Contract.objects.get(pk = 1)
+        contract.amount = 300
+        contract.save()
+        response = self.client.get("/contracts/1/", HTTP_IF_NONE_MATCH = response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["amount"], 300)
+        self.assertEqual(self.client.get("/contracts/100/").status_code, 404)
+
+    def test_statistics_not_modified(self):
+        "Statistics read with GET are equal to the statistics of POST and have an ETag"
+        for url in ["/statistics/", "/async/statistics/"]:
+            response = self.client.get(url, {"balance": 10000})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), self.client.post(url, {"balance": 10000}, format = "json").json())
+
+            # only the version of the statistics, no query of the costs
+            with self.assertNumQueries(1):
+                not_modified = self.client.get(url, {"balance": 10000}, HTTP_IF_NONE_MATCH = response["ETag"])
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertNotEqual(self.client.get(url, {"balance": 500})["ETag"], response["ETag"])
+
+            self.user.first_day_of_the_month = 20
+            self.user.save()
+            self.assertEqual(self.client.get(url, {"balance": 10000}, HTTP_IF_NONE_MATCH = response["ETag"]).status_code, 200)
+            self.assertEqual(self.client.get(url, {"balance": "a lot"}).status_code, 400)
+
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("balance", response.json())
+            self.assertNotIn("ETag", response)
+
+
+@override_settings(ASYNC_CONCURRENT_QUERIES = False)
+class TokenAuthenticationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        revoked_tokens.clear()
+        self.client = APIClient()
+        response = self.client.post("/register/", {"username": "Token", "password": "secret-password", "confirm_password": "secret-password"})
+        self.assertEqual(response.status_code, 202)
+        self.token = response.data["token"]
+        self.client.logout()
+        self.user = User.objects.get(username = "Token")
+        ContractTestCase.createSampleContract(1, self.user)
+
+    def test_login_issues_token(self):
+        "Login returns a token that authenticates the user"
+        response = self.client.post("/login/", {"username": "Token", "password": "secret-password"})
+        self.assertEqual(response.status_code, 202)
+        self.client.logout()
+
+        self.client.credentials(HTTP_AUTHORIZATION = f"Bearer {response.data['token']}")
+        for url in ["/contracts/", "/async/contracts/", "/profile/"]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+        self.assertEqual(response.data["username"], "Token")
+
+    def test_no_authentication_queries(self):
+        "Only the first request of the process loads the revoked tokens and the user, there is no session query"
+        self.client.credentials(HTTP_AUTHORIZATION = f"Bearer {self.token}")
+        with self.assertNumQueries(4):
+            self.assertEqual(self.client.get("/contracts/").status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/profile/").status_code, 200)
+        # the version of the data for the ETag and the list
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get("/contracts/").status_code, 200)
+        self.assertEqual(self.client.get("/statistics/", {"balance": 100}).status_code, 200)
+        # only the version of the statistics (see statistics_cache.py)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/statistics/", {"balance": 200}).status_code, 200)
+
+    def test_invalid_tokens(self):
+        "Invalid, expired and revoked tokens are rejected"
+        self.client.credentials(HTTP_AUTHORIZATION = f"Bearer {self.token[:-1]}x")
+        self.assertEqual(self.client.get("/contracts/").status_code, 403)
+
+        self.client.credentials(HTTP_AUTHORIZATION = f"Bearer {self.token}")
+        with override_settings(AUTH_TOKEN_MAX_AGE = -1):
+            self.assertEqual(self.client.get("/contracts/").status_code, 403)
+
+        self.assertEqual(self.client.post("/logout/").status_code, 202)
+        response = self.client.get("/contracts/")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(str(response.data["detail"]), "Token revoked.")
+
+    def test_revoked_tokens_loaded_after_timeout(self):
+        "Tokens revoked by another process are rejected after the revoked tokens are loaded again"
+        self.client.credentials(HTTP_AUTHORIZATION = f"Bearer {self.token}")
+        self.assertEqual(self.client.get("/profile/").status_code, 200)
+
+        # another process revokes the token
+        token_id = signing.loads(self.token, salt = SALT)["id"]
+        RevokedToken.objects.create(token_id = token_id, expires = datetime(2100, 1, 1, tzinfo = timezone.utc))
+        self.assertEqual(self.client.get("/profile/").status_code, 200)
+        with override_settings(AUTH_USER_CACHE_TIMEOUT = -1):
+            self.assertEqual(self.client.get("/profile/").status_code, 403)
+
+    def test_revoked_tokens_shared(self):
+        "Revoked tokens are rejected by other processes and the revocations are deleted after the tokens expire"
+        other_token = self.client.post("/login/", {"username": "Token", "password": "secret-password"}).data["token"]
+        self.client.logout()
+        self.client.credentials(HTTP_AUTHORIZATION = f"Bearer {self.token}")
+        self.assertEqual(self.client.post("/logout/").status_code, 202)
+
+        # another process loads the revoked tokens from the database
+        user_cache.clear()
+        revoked_tokens.clear()
+        self.assertEqual(self.client.get("/contracts/").status_code, 403)
+        revoked = RevokedToken.objects.get()
+
+        RevokedToken.objects.update(expires = datetime(2022, 1, 1, tzinfo = timezone.utc))
+        self.client.credentials(HTTP_AUTHORIZATION = f"Bearer {other_token}")
+        self.assertEqual(self.client.post("/logout/").status_code, 202)
+        self.assertEqual(RevokedToken.objects.count(), 1)
+        self.assertNotEqual(RevokedToken.objects.get().token_id, revoked.token_id)
+
+    def test_token_out_of_date(self):
+        "Tokens issued before a change of the first day of the month are rejected"
+        self.client.credentials(HTTP_AUTHORIZATION = f"Bearer {self.token}")
+        self.assertEqual(self.client.get("/contracts/").status_code, 200)
+
+        self.user.first_day_of_the_month = 20
+        self.user.save()
+        self.assertEqual(self.client.get("/contracts/").status_code, 403)
+        self.assertEqual(self.client.get("/async/contracts/").status_code, 403)
+
+
+@override_settings(REPLICA_DATABASES = ['replica'])
+class ReplicaRoutingTestCase(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = PrimaryReplicaRouter()
+
+    def route(self, request, view, write = False):
+        "Returns the database of the reads of the request and the response"
+        databases = []
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            if write:
+                self.router.db_for_write(Contract)
+            databases.append(self.router.db_for_read(Contract))
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        response = middleware(request)
+        return databases[0], response
+
+    def test_read_only_requests(self):
+        "Safe methods and the replica methods of the view read from the replica"
+        contracts = ContractsList.as_view()
+        statistics = StatisticsView.as_view()
+        self.assertEqual(self.route(self.factory.get("/contracts/"), contracts)[0], 'replica')
+        self.assertEqual(self.route(self.factory.post("/contracts/"), contracts)[0], 'default')
+        self.assertEqual(self.route(self.factory.post("/statistics/"), statistics)[0], 'replica')
+        self.assertEqual(self.router.db_for_read(Contract), 'default')
+
+    def test_read_your_writes(self):
+        "Reads after a write and requests of the client that wrote recently read from the primary"
+        contracts = ContractsList.as_view()
+        database, response = self.route(self.factory.get("/contracts/"), contracts, write = True)
+        self.assertEqual(database, 'default')
+        self.assertIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+        request = self.factory.get("/contracts/")
+        request.COOKIES[REPLICA_STICKY_COOKIE] = response.cookies[REPLICA_STICKY_COOKIE].value
+        database, response = self.route(request, contracts)
+        self.assertEqual(database, 'default')
+        self.assertNotIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+        request = self.factory.get("/contracts/")
+        request.COOKIES[REPLICA_STICKY_COOKIE] = "0"
+        self.assertEqual(self.route(request, contracts)[0], 'replica')
+
+    def test_read_your_writes_with_bearer_token(self):
+        "Requests of a user with a bearer token read from the primary after a write of the user, without the cookie"
+        cache.clear()
+        contracts = ContractsList.as_view()
+
+        def authorization(user_id):
+            return f"Bearer {issue_token(User(pk = user_id, first_day_of_the_month = 1))}"
+
+        database, response = self.route(self.factory.post("/contracts/", HTTP_AUTHORIZATION = authorization(1)), contracts, write = True)
+        self.assertEqual(database, 'default')
+        self.assertNotIn(REPLICA_STICKY_COOKIE, response.cookies)
+
+        # another token of the same user, e.g. of another device
+        self.assertEqual(self.route(self.factory.get("/contracts/", HTTP_AUTHORIZATION = authorization(1)), contracts)[0], 'default')
+        self.assertEqual(self.route(self.factory.get("/contracts/", HTTP_AUTHORIZATION = authorization(2)), contracts)[0], 'replica')
+        self.assertEqual(self.route(self.factory.get("/contracts/"), contracts)[0], 'replica')
+
+        cache.clear()
+        self.assertEqual(self.route(self.factory.get("/contracts/", HTTP_AUTHORIZATION = authorization(1)), contracts)[0], 'replica')
+
+
+@override_settings(REPLICA_DATABASES = ['replica'])
+class ReplicaDatabaseTestCase(TransactionTestCase):
+    # the replica is a separate database without replication, a read of the replica does not see the rows of the primary;
+    # TestCase would keep the primary in a transaction, so all reads would go to the primary
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        revoked_tokens.clear()
+        self.user = User.objects.create(username = "Replica")
+        # authentication reads the user from the replica
+        self.user.save(using = 'replica')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION = f"Bearer {issue_token(self.user)}")
+
+    def test_reads_from_replica(self):
+        "Reads go to the replica until the user writes"
+        ContractTestCase.createSampleContract(1, self.user)
+        self.assertEqual(self.client.get("/contracts/").json(), [])
+
+        response = self.client.post("/contracts/", {
+            "name": "new",
+            "description": "new contract",
+            "amount": 10,
+            "first_billing_day": "2022-01-01",
+            "end_date": "",
+            "billing_frequency": Frequency.MONTHLY,
+        }, format = "json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.client.get("/contracts/").json()), 2)
+
+    def test_streamed_import_marks_user(self):
+        "Rows imported while the response is streamed are read from the primary"
+        content = CostImportTestCase.createSampleFile(3)
+        uploaded_file = SimpleUploadedFile("contracts.csv", content.encode(), content_type = "text/csv")
+        response = self.client.post("/contracts/import/", {"file": uploaded_file}, format = "multipart")
+        b"".join(response.streaming_content)
+        self.assertEqual(len(self.client.get("/contracts/").json()), 3)
@@ -5,15 +5,28 @@ from .views import (
     ProfileView,
     RegisterView,
     ContractsList,
+    ContractsBulk,
+    ContractsExport,
+    ContractsImport,
     SingleContract,
     StatisticsView,
-    #PrognoseView,
+    StatisticsBatchView,
+    StatisticsHistoryView,
+    PrognoseView,
+    EventsView,
     SavingsList,
+    SavingsBulk,
+    SavingsExport,
+    SavingsImport,
     SingleSaving,
     RecurringSavingsList,
+    RecurringSavingsBulk,
+    RecurringSavingsExport,
+    RecurringSavingsImport,
     SingleRecurringSaving
 )
 from rest_framework_swagger.views import get_swagger_view
+from . import async_views
 
 schema_view = get_swagger_view(title='Finance API')
 
@@ -25,11 +38,27 @@ urlpatterns = [
     path('', schema_view),
     path('contracts/', ContractsList.as_view()),
     path('contracts/<int:pk>/', SingleContract.as_view()),
+    path('contracts/bulk/', ContractsBulk.as_view()),
+    path('contracts/export/', ContractsExport.as_view()),
+    path('contracts/import/', ContractsImport.as_view()),
     path('savings/', SavingsList.as_view()),
     path('savings/<int:pk>/', SingleSaving.as_view()),
+    path('savings/bulk/', SavingsBulk.as_view()),
+    path('savings/export/', SavingsExport.as_view()),
+    path('savings/import/', SavingsImport.as_view()),
     path('recurring-savings/', RecurringSavingsList.as_view()),
     path('recurring-savings/<int:pk>/', SingleRecurringSaving.as_view()),
-    path('statistics/', StatisticsView.as_view())
-    #TODO: Needs to be implemented
-    #path('prognose/', PrognoseView.as_view()),
+    path('recurring-savings/bulk/', RecurringSavingsBulk.as_view()),
+    path('recurring-savings/export/', RecurringSavingsExport.as_view()),
+    path('recurring-savings/import/', RecurringSavingsImport.as_view()),
+    path('statistics/', StatisticsView.as_view()),
+    path('statistics/batch/', StatisticsBatchView.as_view()),
+    path('statistics/history/', StatisticsHistoryView.as_view()),
+    path('prognose/', PrognoseView.as_view()),
+    path('events/', EventsView.as_view()),
+    path('async/statistics/', async_views.statistics),
+    path('async/contracts/', async_views.contracts),
+    path('async/savings/', async_views.savings),
+    path('async/recurring-savings/', async_views.recurring_savings),
+    path('async/profile/', async_views.profile),
 ]
@@ -1,9 +1,17 @@
 from datetime import date
 from dataclasses import dataclass
+from functools import lru_cache
+from dateutil.relativedelta import relativedelta
+import calendar
+from .money import from_cents, to_cents
 
 
 @dataclass
 class Statistics:
+    """
+    Statistics for a specific balance.
+    balance is the amount disponible for the user.
+    """
     balance: float
     savings: list
     active_contracts: list
@@ -13,6 +21,55 @@ class Statistics:
         self.savings = savings
         self.active_contracts = active_contracts
 
+    def show(self):
+        commitments = Commitments(self.savings, self.active_contracts).show()
+        statistics_dict = {
+            "disponible": self.balance,
+            "savings": commitments["savings"],
+            "active_contracts": commitments["active_contracts"]
+        }
+        return statistics_dict
+
+
+@dataclass
+class Commitments:
+    """
+    Amounts committed for savings and contracts on a specific day.
+    They do not depend on the balance, so they can be applied to any number of balances.
+    The amounts are whole numbers of cents, so they are added up in cents (see money.py)
+    and the totals are exact.
+    """
+    savings: list
+    active_contracts: list
+
+    def __init__(self, savings, active_contracts):
+        self.savings = savings
+        self.active_contracts = active_contracts
+
+    def total(self):
+        """
+        Returns total amount committed: saved for all savings and stored for all contracts.
+        """
+        return from_cents(self.saved_cents() + self.stored_cents())
+
+    def saved_cents(self):
+        """
+        Returns total amount saved for all savings, in cents.
+        """
+        return sum(to_cents(saving.total_saved) for saving in self.savings)
+
+    def stored_cents(self):
+        """
+        Returns total amount stored for all contracts, in cents.
+        """
+        return sum(to_cents(contract.stored) for contract in self.active_contracts)
+
+    def statistics(self, balance):
+        """
+        Creates statistics for the given balance.
+        """
+        return Statistics(from_cents(to_cents(balance) - self.saved_cents() - self.stored_cents()), self.savings, self.active_contracts)
+
     def show(self):
         savings = []
         for saving in self.savings:
@@ -29,8 +86,21 @@ class Statistics:
                 }
             contracts.append(new_contract)
 
-        statistics_dict = {"disponible": self.balance, "savings": savings, "active_contracts": contracts}
-        return statistics_dict
+        commitments_dict = {"committed": self.total(), "savings": savings, "active_contracts": contracts}
+        return commitments_dict
+
+
+def apply_balance(commitments, balance):
+    """
+    Creates statistics in the format of Statistics.show()
+    from commitments in the format of Commitments.show() and the given balance (in cents).
+    """
+    return {
+        # the committed amount is a whole number of cents, so the conversion back to cents is exact
+        "disponible": from_cents(balance - to_cents(commitments["committed"])),
+        "savings": commitments["savings"],
+        "active_contracts": commitments["active_contracts"]
+    }
 
 
 @dataclass
@@ -57,3 +127,209 @@ class StatisticContract:
         self.amount = amount
         self.stored = stored
 
+
+def month_index(day):
+    """
+    Returns the number of months since the beginning of year 0.
+    Allows to shift and compare dates by full months in constant time.
+    """
+    return day.year * 12 + day.month - 1
+
+
+def date_from_month_index(index, day):
+    """
+    Creates a date in the month described by the month index.
+
+    If the day is bigger than the last day of the month,
+    the function returns last applicable day (like relativedelta).
+    """
+    year, month = divmod(index, 12)
+    last_day_of_month = calendar.monthrange(year, month + 1)[1]
+    return date(year, month + 1, min(day, last_day_of_month))
+
+
+@lru_cache(maxsize=None)
+def month_beginning(first_day_of_the_month, year, month):
+    """
+    Returns the beginning of the user month (see User.first_day_of_the_month) in the given calendar month.
+
+    If first_day_of_the_month is bigger than the last day of the month,
+    the function returns the last day of the month.
+    """
+    return date(year, month, min(first_day_of_the_month, calendar.monthrange(year, month)[1]))
+
+
+# number of months after which the clamping of a day by the shorter months is settled
+# (the months contain a February with 28 days)
+CLAMPING_MONTHS = 24
+
+
+@lru_cache(maxsize=None)
+def _kept_day(first_index, first_day, months):
+    # day reached with relativedelta(months=months) from the day in the month of the first_index
+    day = first_day
+    for month in range(1, months + 1):
+        if day <= 28:
+            break
+        year, month_of_year = divmod(first_index + month, 12)
+        day = min(day, calendar.monthrange(year, month_of_year + 1)[1])
+    return day
+
+
+class MonthBoundaries:
+    """
+    Beginnings of the user months (salary days) for the given first_day_of_the_month.
+
+    The first beginning is clamped by its own month, the following ones are reached
+    with relativedelta and keep the clamped day (31 -> 28.02 -> 28.03 -> ...).
+    The clamped days are memoized and shared by all users with the same first day
+    (see month_boundaries), so that the beginnings between two dates are counted in constant time.
+    """
+    def __init__(self, first_day_of_the_month):
+        self.first_day_of_the_month = first_day_of_the_month
+
+    def beginning(self, index):
+        """
+        Returns the beginning of the user month in the month described by the month index,
+        clamped by this month only.
+        """
+        year, month = divmod(index, 12)
+        return month_beginning(self.first_day_of_the_month, year, month + 1)
+
+    def current(self, reference_date):
+        """
+        Returns the last beginning of the month on or before the reference_date.
+        """
+        first_day = self.beginning(month_index(reference_date))
+        if first_day > reference_date:
+            first_day = first_day - relativedelta(months=1)
+        return first_day
+
+    def next(self, reference_date):
+        """
+        Returns the first beginning of the month after the reference_date.
+        """
+        first_day = self.beginning(month_index(reference_date))
+        if first_day <= reference_date:
+            first_day = first_day + relativedelta(months=1)
+        return first_day
+
+    def count_between(self, start_date, end_date):
+        """
+        Returns the number of beginnings of the months after the start_date and before the end_date,
+        the same as stepping from next(start_date) with relativedelta(months=1) until the end_date.
+        """
+        first_day = self.next(start_date)
+        if first_day >= end_date:
+            return 0
+        return count_kept_days(month_index(first_day), first_day.day, month_index(end_date), end_date.day)
+
+
+def count_kept_days(first_index, first_day, end_index, end_day):
+    """
+    Returns the number of the days reached with relativedelta(months=n), n >= 0,
+    from the first_day in the month of the first_index before the end_day in the month of the end_index.
+    The first day has to be before the end day.
+    """
+    # one day in every month from the first day until the end day,
+    # the one in the month of the end day only if it is before the end day
+    months = end_index - first_index
+    return months + (_kept_day(first_index, first_day, min(months, CLAMPING_MONTHS)) < end_day)
+
+
+@lru_cache(maxsize=None)
+def month_boundaries(first_day_of_the_month):
+    """
+    Returns MonthBoundaries shared by all users with the given first_day_of_the_month.
+    """
+    return MonthBoundaries(first_day_of_the_month)
+
+
+def shortest_month_in_cycle(first_day, period_in_months):
+    """
+    Returns the number of days of the shortest month
+    that a schedule starting on first_day and repeating every period_in_months months can reach.
+    February is always counted with 28 days.
+    """
+    return _shortest_month_in_cycle(first_day.month, period_in_months)
+
+
+@lru_cache(maxsize=None)
+def _shortest_month_in_cycle(first_month, period_in_months):
+    months = {(first_month - 1 + step * period_in_months) % 12 + 1 for step in range(12)}
+    return min(calendar.monthrange(2001, month)[1] for month in months)
+
+
+def follow_schedule(first_day, period_in_months, reference_date):
+    """
+    Follows the schedule that starts on first_day and repeats every period_in_months months
+    until the first day after the reference_date.
+
+    Returns a tuple:
+        number of days of the schedule until the reference_date (inclusive),
+        first day of the schedule after the reference_date.
+
+    The result is the same as adding relativedelta(months=period_in_months) to first_day
+    until the reference_date is passed, including the end-of-month clamping
+    that is kept for all following dates (31.01.2022 -> 28.02.2022 -> 28.03.2022).
+
+    Only the first periods, while the day can still be clamped by a shorter month,
+    are computed step by step (at most two years), the rest is computed in constant time.
+    """
+    occurrence = first_day
+    passed_occurrences = 0
+    shortest_month = shortest_month_in_cycle(first_day, period_in_months)
+
+    while occurrence <= reference_date and occurrence.day > shortest_month:
+        occurrence = occurrence + relativedelta(months=+period_in_months)
+        passed_occurrences += 1
+
+    if occurrence > reference_date:
+        return passed_occurrences, occurrence
+
+    full_periods = (month_index(reference_date) - month_index(occurrence)) // period_in_months
+    occurrence = date_from_month_index(month_index(occurrence) + full_periods * period_in_months, occurrence.day)
+    passed_occurrences += full_periods
+
+    if occurrence <= reference_date:
+        occurrence = date_from_month_index(month_index(occurrence) + period_in_months, occurrence.day)
+        passed_occurrences += 1
+
+    return passed_occurrences, occurrence
+
+
+def next_occurrence(first_day, period_in_months, reference_date):
+    """
+    Computes the first day of the schedule that comes after the reference_date.
+    See follow_schedule.
+    """
+    return follow_schedule(first_day, period_in_months, reference_date)[1]
+
+
+def count_occurrences(first_day, period_in_months, reference_date):
+    """
+    Computes how many days of the schedule come before or on the reference_date.
+    See follow_schedule.
+    """
+    return follow_schedule(first_day, period_in_months, reference_date)[0]
+
+
+def schedule_dates(first_day, period_in_months, reference_date):
+    """
+    Yields all days of the schedule after the reference_date (see follow_schedule).
+    The generator is infinite, the caller decides when to stop.
+    """
+    occurrence = next_occurrence(first_day, period_in_months, reference_date)
+    shortest_month = shortest_month_in_cycle(first_day, period_in_months)
+
+    # as long as the day can still be clamped by a shorter month, follow the schedule with relativedelta
+    while occurrence.day > shortest_month:
+        yield occurrence
+        occurrence = occurrence + relativedelta(months=+period_in_months)
+
+    # the day fits into every following month, so the dates are created without clamping
+    index = month_index(occurrence)
+    while True:
+        year, month = divmod(index, 12)
+        yield date(year, month + 1, occurrence.day)
+        index += period_in_months
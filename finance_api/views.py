@@ -1,17 +1,43 @@
 from django.contrib.auth import login, logout
+from django.db import transaction
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import etag
 from rest_framework import permissions
 from rest_framework import views
 from rest_framework import status
 from rest_framework import generics
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 import coreapi
 import coreschema
+import io
 from rest_framework.schemas import ManualSchema
+from django.conf import settings
 from .models import Contract, Saving, RecurringSaving
 from . import serializers
+from . import profiling
+from . import vectorized
+from .authentication import SignedTokenAuthentication, issue_token, revoke_token
+from .conditional import conditional_response, cost_etag, user_data_etag
+from .csv_import import import_costs, read_rows
+from .money import from_cents, to_cents
+from .export import FORMATS, export_chunks
+from .pagination import CostListMixin
+from .routers import mark_user_sticky
+from .parsers import NDJSONParser
+from .statistics_cache import cached_commitments, invalidate_statistics, invalidation_batch, statistics_version
+from .utils import apply_balance
 from datetime import date
 
 
+def token_response(user):
+    # bearer token for the clients that do not use the session (see authentication.py)
+    return {"token": issue_token(user), "expires_in": settings.AUTH_TOKEN_MAX_AGE}
+
+
 class LoginView(views.APIView):
     schema = ManualSchema(
         description="User login endpoint.",
@@ -42,7 +68,7 @@ class LoginView(views.APIView):
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
         login(request, user)
-        return Response(None, status=status.HTTP_202_ACCEPTED)
+        return Response(token_response(user), status=status.HTTP_202_ACCEPTED)
 
 class RegisterView(views.APIView):
 
@@ -89,7 +115,7 @@ class RegisterView(views.APIView):
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
         login(request, user)
-        return Response(None, status=status.HTTP_202_ACCEPTED)
+        return Response(token_response(user), status=status.HTTP_202_ACCEPTED)
 
 class ProfileView(generics.RetrieveAPIView):
     """
@@ -106,19 +132,25 @@ class LogoutView(views.APIView):
     User logout endpoint.
     """
     def post(self, request):
+        if isinstance(request.successful_authenticator, SignedTokenAuthentication):
+            revoke_token(request.auth)
         logout(request)
         return Response(None, status=status.HTTP_202_ACCEPTED)
 
-class ContractsList(views.APIView):
+class ContractsList(CostListMixin, views.APIView):
     """
     Manage contracts
     """
     serializer_class = serializers.ContractSerializer
+    cursor_orderings = ('id', 'first_billing_day')
 
+    @method_decorator(etag(user_data_etag))
     def get(self, request):
         all_contracts = Contract.objects.all().filter(user=self.request.user)
-        serializer = self.serializer_class(all_contracts, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        data, paginator = self.list_costs(request, all_contracts)
+        if paginator is not None:
+            return paginator.get_paginated_response(data)
+        return Response(data, status=status.HTTP_200_OK)
     
     def post(self, request):
         new_contract = {
@@ -146,6 +178,7 @@ class SingleContract(views.APIView):
     def get_object(self, pk):
         return Contract.objects.get(pk = pk)
 
+    @method_decorator(etag(cost_etag(Contract)))
     def get(self, request, pk):
         try:
             contract = self.get_object(pk)
@@ -181,18 +214,20 @@ class SingleContract(views.APIView):
             return Response({"message":"error"}, status=status.HTTP_404_NOT_FOUND)
 
 
-class RecurringSavingsList(views.APIView):
+class RecurringSavingsList(CostListMixin, views.APIView):
     """
     Manage recurring savings
     """
     serializer_class = serializers.RecurringSavingSerializer
+    cursor_orderings = ('id', 'start_date')
 
+    @method_decorator(etag(user_data_etag))
     def get(self, request):
         all_recurring_savings = RecurringSaving.objects.all().filter(user=self.request.user)
-        recurring_savings_serializer = self.serializer_class(all_recurring_savings, many=True)
-
-        return Response(recurring_savings_serializer.data, status=status.HTTP_200_OK
-        )
+        data, paginator = self.list_costs(request, all_recurring_savings)
+        if paginator is not None:
+            return paginator.get_paginated_response(data)
+        return Response(data, status=status.HTTP_200_OK)
     
     def post(self, request):
         new_saving = {
@@ -222,6 +257,7 @@ class SingleRecurringSaving(views.APIView):
     def get_object(self, pk):
         return RecurringSaving.objects.get(pk = pk)
 
+    @method_decorator(etag(cost_etag(RecurringSaving)))
     def get(self, request, pk):
         try:
             saving = self.get_object(pk)
@@ -258,18 +294,19 @@ class SingleRecurringSaving(views.APIView):
             return Response({"message":"error"}, status=status.HTTP_404_NOT_FOUND)
 
 
-class SavingsList(views.APIView):
+class SavingsList(CostListMixin, views.APIView):
     """
     Manage savings
     """
     serializer_class = serializers.SavingSerializer
 
+    @method_decorator(etag(user_data_etag))
     def get(self, request):
         all_savings = Saving.objects.all().filter(user=self.request.user)
-        savings_serializer = self.serializer_class(all_savings, many=True)
-
-        return Response(savings_serializer.data, status=status.HTTP_200_OK
-        )
+        data, paginator = self.list_costs(request, all_savings)
+        if paginator is not None:
+            return paginator.get_paginated_response(data)
+        return Response(data, status=status.HTTP_200_OK)
     
     def post(self, request):
         new_saving = {
@@ -297,6 +334,7 @@ class SingleSaving(views.APIView):
     def get_object(self, pk):
         return Saving.objects.get(pk = pk)
 
+    @method_decorator(etag(cost_etag(Saving)))
     def get(self, request, pk):
         try:
             saving = self.get_object(pk)
@@ -330,26 +368,368 @@ class SingleSaving(views.APIView):
             return Response({"message":"error"}, status=status.HTTP_404_NOT_FOUND)
 
     
+class BulkCostsView(views.APIView):
+    """
+    Create, update or delete many costs of the same type at once.
+
+    The body is a JSON array or newline delimited JSON (Content-Type: application/x-ndjson):
+        POST        costs to create
+        PUT         costs to update, each with its id
+        DELETE      ids of the costs to delete
+
+    All rows are validated first and written in a single transaction.
+    If any row is invalid, nothing is written and the errors are returned for every row
+    (empty for the valid rows).
+    """
+    parser_classes = (JSONParser, NDJSONParser)
+    model = None
+    serializer_class = None
+    # date fields, that are set to None if an empty string is given
+    nullable_fields = ()
+
+    def get_rows(self):
+        rows = self.request.data
+        if not isinstance(rows, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of items.']})
+        if len(rows) > settings.COST_BULK_MAX_ROWS:
+            raise ValidationError({'non_field_errors': [f'At most {settings.COST_BULK_MAX_ROWS} items can be sent at once.']})
+        for row in rows:
+            if isinstance(row, dict):
+                for field in self.nullable_fields:
+                    if row.get(field) == "":
+                        row[field] = None
+        return rows
+
+    def validate_ids(self, ids):
+        """
+        Raises ValidationError with the errors of every row
+        if any id is not an integer or is given more than once.
+        """
+        errors = []
+        seen = set()
+        for pk in ids:
+            if not isinstance(pk, int) or isinstance(pk, bool):
+                errors.append({'id': ['A valid integer is required.']})
+            elif pk in seen:
+                errors.append({'id': ['Duplicate id.']})
+            else:
+                errors.append({})
+                seen.add(pk)
+        if any(errors):
+            raise ValidationError({'errors': errors})
+
+    def validate_rows(self, rows):
+        serializer = self.serializer_class(data=rows, many=True)
+        if not serializer.is_valid():
+            raise ValidationError({'errors': serializer.errors})
+        return serializer.validated_data
+
+    def post(self, request):
+        validated_rows = self.validate_rows(self.get_rows())
+
+        new_costs = [self.model(user=self.request.user, **row) for row in validated_rows]
+        with transaction.atomic():
+            self.model.objects.bulk_create(new_costs, batch_size=1000)
+        invalidate_statistics(self.request.user.pk)
+
+        serializer = self.serializer_class(new_costs, many=True)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def put(self, request):
+        rows = self.get_rows()
+        validated_rows = self.validate_rows(rows)
+
+        ids = [row.get('id') if isinstance(row, dict) else None for row in rows]
+        self.validate_ids(ids)
+        costs = self.model.objects.filter(user=self.request.user).in_bulk(ids)
+        errors = [{} if pk in costs else {'id': ['Not found.']} for pk in ids]
+        if any(errors):
+            raise ValidationError({'errors': errors})
+
+        updated_costs = []
+        for pk, row in zip(ids, validated_rows):
+            cost = costs[pk]
+            for field, value in row.items():
+                setattr(cost, field, value)
+            updated_costs.append(cost)
+
+        # names of the model fields (e.g. amount_cents for amount)
+        fields = [field.source for name, field in self.serializer_class().fields.items() if name != 'id']
+        with transaction.atomic():
+            self.model.objects.bulk_update(updated_costs, fields, batch_size=1000)
+        invalidate_statistics(self.request.user.pk)
+
+        serializer = self.serializer_class(updated_costs, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        ids = self.get_rows()
+        self.validate_ids(ids)
+        costs = self.model.objects.filter(user=self.request.user, pk__in=ids)
+        existing_ids = set(costs.values_list('id', flat=True))
+        errors = [{} if pk in existing_ids else {'id': ['Not found.']} for pk in ids]
+        if any(errors):
+            raise ValidationError({'errors': errors})
+
+        # the signals of the deleted rows invalidate the statistics once
+        with invalidation_batch(), transaction.atomic():
+            deleted, _ = costs.delete()
+
+        return Response({"deleted": deleted}, status=status.HTTP_200_OK)
+
+
+class ContractsBulk(BulkCostsView):
+    """
+    Manage many contracts at once
+    """
+    model = Contract
+    serializer_class = serializers.ContractSerializer
+    nullable_fields = ('end_date',)
+
+
+class SavingsBulk(BulkCostsView):
+    """
+    Manage many savings at once
+    """
+    model = Saving
+    serializer_class = serializers.SavingSerializer
+    nullable_fields = ('pay_out_day',)
+
+
+class RecurringSavingsBulk(BulkCostsView):
+    """
+    Manage many recurring savings at once
+    """
+    model = RecurringSaving
+    serializer_class = serializers.RecurringSavingSerializer
+    nullable_fields = ('end_date', 'pay_out_day')
+
+
+class CostExportView(views.APIView):
+    """
+    Export all costs of the user as a file, streamed row by row (see export.py).
+
+    Query parameters:
+        type        csv (default) or ndjson
+    """
+    model = None
+    serializer_class = None
+    file_name = None
+
+    def get(self, request):
+        export_format = request.query_params.get('type', 'csv')
+        if export_format not in FORMATS:
+            raise ValidationError({'type': f"Type must be one of: {', '.join(FORMATS)}."})
+
+        queryset = self.model.objects.filter(user=self.request.user).order_by('id')
+        # the rows are read after the request (see routers.py), so the database is chosen now
+        queryset = queryset.using(queryset.db)
+        response = StreamingHttpResponse(
+            export_chunks(queryset, self.serializer_class(), export_format),
+            content_type=FORMATS[export_format][1]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{self.file_name}.{export_format}"'
+        return response
+
+
+class ContractsExport(CostExportView):
+    """
+    Export contracts
+    """
+    model = Contract
+    serializer_class = serializers.ContractSerializer
+    file_name = 'contracts'
+
+
+class SavingsExport(CostExportView):
+    """
+    Export savings
+    """
+    model = Saving
+    serializer_class = serializers.SavingSerializer
+    file_name = 'savings'
+
+
+class RecurringSavingsExport(CostExportView):
+    """
+    Export recurring savings
+    """
+    model = RecurringSaving
+    serializer_class = serializers.RecurringSavingSerializer
+    file_name = 'recurring-savings'
+
+
+class CostImportView(views.APIView):
+    """
+    Import costs from the uploaded CSV file (multipart field "file", see csv_import.py).
+
+    The progress is streamed as newline delimited JSON, one line after every imported chunk:
+        {"rows": ..., "created": ..., "failed": ..., "errors": [{"line": ..., "errors": {...}}, ...]}
+    """
+    parser_classes = (MultiPartParser,)
+    model = None
+    serializer_class = None
+
+    def post(self, request):
+        if 'file' not in request.FILES:
+            raise ValidationError({'file': ['No file was submitted.']})
+
+        lines = io.TextIOWrapper(request.FILES['file'], encoding='utf-8-sig', newline='')
+        reader = read_rows(lines, self.serializer_class)
+        return StreamingHttpResponse(self.progress(reader), content_type='application/x-ndjson')
+
+    def progress(self, reader):
+        encoder = DjangoJSONEncoder()
+        user = self.request.user
+        for chunk_progress in import_costs(reader, self.model, self.serializer_class, user):
+            if chunk_progress.created:
+                # the rows are written while the response is streamed, after ReplicaRoutingMiddleware
+                # returned, so the user reads the imported rows from the primary from now on
+                mark_user_sticky(user.pk)
+            yield encoder.encode(chunk_progress.show()) + '\n'
+
+
+class ContractsImport(CostImportView):
+    """
+    Import contracts
+    """
+    model = Contract
+    serializer_class = serializers.ContractSerializer
+
+
+class SavingsImport(CostImportView):
+    """
+    Import savings
+    """
+    model = Saving
+    serializer_class = serializers.SavingSerializer
+
+
+class RecurringSavingsImport(CostImportView):
+    """
+    Import recurring savings
+    """
+    model = RecurringSaving
+    serializer_class = serializers.RecurringSavingSerializer
+
+
 class StatisticsView(views.APIView):
     """
-    See statistics based on the current account balance
+    See statistics based on the current account balance:
+    POST - balance in the body, GET - balance as query parameter (cacheable, with ETag)
+    """
+    # the statistics are computed without any write
+    replica_methods = ('GET', 'POST')
+
+    def get(self, request):
+        balance = self.balance(self.request.query_params)
+        user = self.request.user
+        # the version is read once, for the ETag and for the cached statistics
+        version = statistics_version(user.pk)
+        statistics_etag, not_modified = conditional_response(request, user.pk, version, date.today().isoformat())
+        if not_modified is not None:
+            return not_modified
+        response = Response(self.statistics(balance, version), status=status.HTTP_200_OK)
+        response['ETag'] = statistics_etag
+        return response
+
+    @staticmethod
+    def compute_commitments(user, reference_date):
+        contracts, savings, recurring_savings = [list(values) for values in user.commitment_values(reference_date)]
+        # users with many costs are computed with the vectorized engine,
+        # chosen by the number of the fetched rows, so that the choice needs no query
+        if vectorized.use_for(contracts, savings, recurring_savings):
+            with profiling.phase('statistics.vectorized'):
+                return vectorized.create_commitments(user, reference_date, (contracts, savings, recurring_savings))
+        return user.commitments_from_values(contracts, savings, recurring_savings, reference_date).show()
+
+    @staticmethod
+    def balance(data):
+        serializer = serializers.BalanceSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['balance']
+
+    def statistics(self, total_account_balance, version = None):
+        user = self.request.user
+        commitments = cached_commitments(user, date.today(), self.compute_commitments, version)
+        return apply_balance(commitments, total_account_balance)
+
+    def post(self, request):
+        return Response(self.statistics(self.balance(self.request.data)), status=status.HTTP_202_ACCEPTED)
+
+
+class StatisticsHistoryView(views.APIView):
+    """
+    See statistics for every day from the day "from" until the day "to":
+    POST - compute and store them for the given balances, GET - read the stored statistics
     """
     def get(self, request):
-        return Response(None, status=status.HTTP_200_OK)
+        serializer = serializers.HistoryRangeSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        user = self.request.user
+        snapshots = user.statistics_snapshots.of_version(statistics_version(user.pk)).between(
+            serializer.validated_data['from'],
+            serializer.validated_data['to']
+        ).order_by('date')
+        return Response([snapshot.show() for snapshot in snapshots], status=status.HTTP_200_OK)
+
+    def post(self, request):
+        serializer = serializers.HistorySerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        user = self.request.user
+        history = user.create_history(
+            [(day, from_cents(balance)) for day, balance in serializer.validated_data['balances']],
+            serializer.validated_data['from'],
+            serializer.validated_data['to']
+        )
+        user.store_history(history)
+        return Response([snapshot.show() for snapshot in history], status=status.HTTP_202_ACCEPTED)
+
+
+class StatisticsBatchView(views.APIView):
+    """
+    See disponible amounts for many account balances at once
+    """
+    replica_methods = ('GET', 'POST')
 
     def post(self, request):
-        serializer = serializers.BalanceSerializer(data=self.request.data)
+        serializer = serializers.BalancesSerializer(data=self.request.data)
         serializer.is_valid(raise_exception=True)
-        total_account_balance = serializer.data['balance']
         user = self.request.user
-        statistics = user.create_statistics(total_account_balance, date.today())
-        return Response(statistics.show(), status=status.HTTP_202_ACCEPTED)
+        commitments = cached_commitments(user, date.today(), StatisticsView.compute_commitments)
+        committed = to_cents(commitments["committed"])
+        disponible = [from_cents(balance - committed) for balance in serializer.validated_data['balances']]
+        return Response({**commitments, "disponible": disponible}, status=status.HTTP_202_ACCEPTED)
+
 
+class PrognoseView(views.APIView):
+    """
+    See prognose of the balance and disponible amount
+    for the beginnings of the next months
+    """
+    replica_methods = ('GET', 'POST')
 
-#TODO: Needs to be implemented
-# class PrognoseView(views.APIView):
-#     """
-#     See prognose.
-#     """
-#     def get(self, request):
-#         return Response(None, status=status.HTTP_200_OK)
\ No newline at end of file
+    def post(self, request):
+        serializer = serializers.PrognoseSerializer(data=self.request.data)
+        serializer.is_valid(raise_exception=True)
+        user = self.request.user
+        prognose = user.create_prognose(
+            from_cents(serializer.validated_data['balance']),
+            date.today(),
+            serializer.validated_data['months'],
+            from_cents(serializer.validated_data['monthly_income'])
+        )
+        return Response(prognose, status=status.HTTP_202_ACCEPTED)
+
+
+class EventsView(views.APIView):
+    """
+    See billing days of the contracts and saving and pay out days of the savings
+    from the day "from" until the day "to"
+    """
+    def get(self, request):
+        serializer = serializers.DateRangeSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        user = self.request.user
+        events = user.create_events(serializer.validated_data['from'], serializer.validated_data['to'])
+        return Response(events, status=status.HTTP_200_OK)